@@ -1,138 +1,92 @@
 # ---------------------------
-# Script to Add Institute Metadata to Qdrant
+# Script to Sync Institute Metadata to Qdrant
 # ---------------------------
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
-from openai import OpenAI
+# Reads institute records from a CSV or JSONL file (data/institutes.jsonl by
+# default) and syncs them incrementally: only new or changed institutes are
+# embedded and upserted, and institutes removed from the file are deleted.
+import argparse
 import os
-from dotenv import load_dotenv
-import uuid
+import sys
+from admission import BACKGROUND
+from clients import ClientConfig, create_clients
+from collection_profiles import PROFILES, collection_settings, create_collection
+from embedding_cache import model_key
+from ingestion import IngestionEngine, openai_embedder
+from institute_sync import DEFAULT_SOURCE_PATH, format_plan, read_records, sync_institutes
+from query_router import ensure_payload_indexes
+from rag_core import EMBEDDING_MODEL
+from telemetry import Telemetry
 
-# Load environment variables
-load_dotenv()
+# Initialize pooled clients from environment variables / .env; embeddings share the app's
+# rate limits at background priority, so a backfill never starves live chat
+clients = create_clients(ClientConfig.from_env(), async_clients=False, priority=BACKGROUND)
+client, qdrant = clients.openai, clients.qdrant
 
-# Initialize clients
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-qdrant = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY")
-)
+METRICS_PATH = os.path.join(".cache", "ingestion_metrics.prom")
 
-# Institute metadata
-institutes_data = [
-    {
-        "name": "Sivananda Yoga Vedanta Tapaswini Ashram",
-        "code": "YC25120",
-        "certification": "Indian Yoga Association: IYA/S-II/010",
-        "city": "Nellore",
-        "state": "Andhra Pradesh",
-        "country": "India",
-        "website": "https://sivananda.org.in/gudur/",
-        "validity": "N/A"
-    },
-    {
-        "name": "Athayog",
-        "code": "YC24108",
-        "certification": "YC2400000118",
-        "validity": "Jul 2024 - 17 Jul 2027",
-        "city": "Bengaluru Urban",
-        "state": "Karnataka",
-        "country": "India",
-        "website": "www.athayogliving.com"
-    },
-    {
-        "name": "Yogmaya Institute Of Yoga Training",
-        "code": "YC24114",
-        "certification": "YC2400000918",
-        "validity": "Jul 2024 - 17 Jul 2027",
-        "city": "Jaipur",
-        "state": "Rajasthan",
-        "country": "India",
-        "website": "www.yogmaya.org"
-    },
-    {
-        "name": "Niramaya",
-        "code": "YC23099",
-        "certification": "1008/21",
-        "validity": "May, 2026",
-        "city": "Cachar",
-        "state": "Assam",
-        "country": "India",
-        "website": "www.niramayayoga.org"
-    },
-    {
-        "name": "Manappuram Yoga Centre",
-        "code": "YC23077",
-        "certification": "YAI/IND/KER/24MY2205",
-        "validity": "27 Jun 2023 - 26 Jun 2026",
-        "city": "Thrissur",
-        "state": "Kerala",
-        "country": "India",
-        "website": "www.manappuramyogacenter.com"
-    }
-]
-
-def create_embedding(text):
-    """Create embedding for text"""
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
+def add_institute_metadata(source_path=DEFAULT_SOURCE_PATH, batch_size=64, concurrency=4, upsert_batch_size=256,
+                           metrics_path=METRICS_PATH, trace_path=None, profile="full", delete_missing=True,
+                           dry_run=False):
+    """Sync institute metadata from source_path to Qdrant"""
+    records = read_records(source_path)
+    # A missing collection is created from the profile; an existing one sets the embedding size
+    if not qdrant.collection_exists("Institutes"):
+        create_collection(qdrant, PROFILES[profile], "Institutes")
+    dimensions = collection_settings(qdrant.get_collection("Institutes"))["dimensions"]
+    telemetry = Telemetry(enabled=bool(metrics_path or trace_path), trace_path=trace_path,
+                          prometheus_path=metrics_path)
+    engine = IngestionEngine(
+        qdrant,
+        openai_embedder(client, EMBEDDING_MODEL, dimensions),
+        collection_name="Institutes",
+        embed_batch_size=batch_size,
+        max_concurrent_batches=concurrency,
+        upsert_batch_size=upsert_batch_size,
+        on_progress=lambda r: print(f"✓ Upserted {r.documents} documents"),
+        telemetry=telemetry,
     )
-    return response.data[0].embedding
-
-def add_institute_metadata():
-    """Add institute metadata to Qdrant"""
-    points = []
     
-    for institute in institutes_data:
-        # Create a comprehensive text for embedding
-        text_for_embedding = f"""
-        Institute Name: {institute['name']}
-        Code: {institute['code']}
-        Location: {institute['city']}, {institute['state']}, {institute['country']}
-        Certification: {institute['certification']}
-        Validity: {institute.get('validity', 'N/A')}
-        Website: {institute['website']}
-        
-        This is a certified yoga institute located in {institute['city']}, {institute['state']}.
-        """
-        
-        # Generate embedding
-        embedding = create_embedding(text_for_embedding)
-        
-        # Create point with metadata
-        point = PointStruct(
-            id=str(uuid.uuid4()),
-            vector=embedding,
-            payload={
-                "institute_name": institute['name'],
-                "code": institute['code'],
-                "certification": institute['certification'],
-                "validity": institute.get('validity', 'N/A'),
-                "city": institute['city'],
-                "state": institute['state'],
-                "country": institute['country'],
-                "website": institute['website'],
-                "content": text_for_embedding.strip(),
-                "type": "institute_metadata"
-            }
-        )
-        points.append(point)
-        print(f"✓ Prepared: {institute['name']}")
-    
-    # Upload to Qdrant
     try:
-        qdrant.upsert(
-            collection_name="Institutes",
-            points=points
-        )
-        print(f"\n✅ Successfully added {len(points)} institutes to Qdrant!")
-        print("\nInstitutes added:")
-        for institute in institutes_data:
-            print(f"  • {institute['name']} - {institute['city']}, {institute['state']}")
+        # Content hashes make the sync resumable: an interrupted run redoes only what it had not written
+        plan, report = sync_institutes(qdrant, engine, records, model_key(EMBEDDING_MODEL, dimensions),
+                                       delete_missing=delete_missing, dry_run=dry_run)
+        # Keyword indexes keep entity-filtered searches and the directory scroll fast
+        if not dry_run:
+            ensure_payload_indexes(qdrant, "Institutes")
+        print(format_plan(plan))
+        if dry_run:
+            print("\nDry run: nothing was embedded, upserted or deleted.")
+        elif report is None:
+            print(f"\n✅ {len(records)} institutes already up to date; nothing to embed.")
+        else:
+            print(f"\n✅ Synced {len(records)} institutes: embedded {report.documents}, "
+                  f"deleted {len(plan.removed)}")
+            print(f"⏱️ {report.seconds:.2f}s ({report.docs_per_sec:.1f} docs/sec, "
+                  f"{report.embed_batches} embedding batches, {report.upsert_batches} upsert batches)")
     except Exception as e:
-        print(f"\n❌ Error adding institutes: {e}")
+        print(f"\n❌ Error syncing institutes: {e}")
+        print("Rerun to finish: institutes already written are skipped.")
+        # A non-zero exit lets cron and CI notice the failed sync
+        sys.exit(1)
+    finally:
+        telemetry.write_prometheus()
 
 if __name__ == "__main__":
-    print("Adding institute metadata to Qdrant...\n")
-    add_institute_metadata()
+    parser = argparse.ArgumentParser(description="Sync institute metadata to Qdrant")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE_PATH,
+                        help="CSV or JSONL file of institutes (name, code, certification, validity, city, state, country, website)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per embeddings request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding batches in flight")
+    parser.add_argument("--upsert-batch-size", type=int, default=256, help="Points per upsert request")
+    parser.add_argument("--metrics", default=METRICS_PATH, help="Prometheus text file for stage latencies ('' to disable)")
+    parser.add_argument("--trace", help="Append one JSON line per embedding/upsert batch to this file")
+    parser.add_argument("--profile", choices=PROFILES, default="full",
+                        help="Collection profile used if the collection does not exist yet")
+    parser.add_argument("--keep-missing", action="store_true",
+                        help="Keep institutes that are no longer in the source")
+    parser.add_argument("--dry-run", action="store_true", help="Print the diff without writing anything")
+    args = parser.parse_args()
+    
+    print(f"Syncing institutes from {args.source} to Qdrant...\n")
+    add_institute_metadata(args.source, args.batch_size, args.concurrency, args.upsert_batch_size, args.metrics,
+                           args.trace, args.profile, not args.keep_missing, args.dry_run)
@@ -0,0 +1,370 @@
+# ---------------------------
+# Admission Control for OpenAI Calls
+# ---------------------------
+# Every embeddings and chat request passes a pair of token buckets per endpoint
+# (requests and estimated tokens per minute) before it is sent, so load spikes
+# queue here instead of turning into 429s. The buckets live in a SQLite file
+# that the app, inference.py and the ingestion scripts share, so their combined
+# rate stays under the provider limits. Requests that cannot go right away wait
+# in a queue served round-robin across callers (chat sessions), interactive
+# before background. Background callers (ingestion, bulk answering) also leave
+# a reserve of every bucket to live chat. An interactive request that would
+# wait longer than max_wait is rejected at once with RateLimited.
+import asyncio
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+DEFAULT_ADMISSION_PATH = os.path.join(".cache", "admission.sqlite3")
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Completion tokens assumed for chat requests without max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+# The session (or script) a request is made for; the queue is fair across these
+CALLER = contextvars.ContextVar("admission_caller", default="default")
+
+
+def set_caller(key):
+    """Attribute this thread's (and its coroutines') OpenAI calls to a caller, e.g. a chat session"""
+    CALLER.set(key)
+
+
+class RateLimited(Exception):
+    """A request was not admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"{endpoint} rate limit reached, retry in {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+@dataclass
+class Limits:
+    """Provider limits of one endpoint"""
+    requests_per_minute: float
+    tokens_per_minute: float
+
+
+@dataclass
+class Bucket:
+    name: str
+    capacity: float
+    rate: float  # per second
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) for admission, not billing"""
+    return len(text) // 4 + 1
+
+
+def request_tokens(endpoint, kwargs):
+    """Estimated tokens a request counts against the provider's TPM limit"""
+    if endpoint == "embeddings":
+        inputs = kwargs.get("input", "")
+        return sum(estimate_tokens(text) for text in ([inputs] if isinstance(inputs, str) else inputs))
+    prompt = sum(estimate_tokens(str(message.get("content") or "")) for message in kwargs.get("messages", ()))
+    return prompt + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class BucketStore:
+    """Token bucket levels in SQLite, refilled and debited in one transaction per attempt"""
+
+    def __init__(self, path=DEFAULT_ADMISSION_PATH):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=5.0,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS buckets (
+                   name TEXT PRIMARY KEY,
+                   level REAL NOT NULL,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+        self._lock = threading.Lock()
+
+    def _levels(self, buckets, now):
+        rows = dict(
+            (name, (level, updated_at)) for name, level, updated_at in self._db.execute(
+                f"SELECT name, level, updated_at FROM buckets WHERE name IN ({','.join('?' * len(buckets))})",
+                [bucket.name for bucket in buckets],
+            )
+        )
+        levels = []
+        for bucket in buckets:
+            level, updated_at = rows.get(bucket.name, (bucket.capacity, now))
+            levels.append(min(bucket.capacity, level + max(0.0, now - updated_at) * bucket.rate))
+        return levels
+
+    def take(self, buckets, costs, reserves):
+        """Debit every bucket if each keeps its reserve; returns 0.0 when taken, else seconds until it could be"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                levels = self._levels(buckets, now)
+                wait = max(
+                    (cost + reserve - level) / bucket.rate
+                    for bucket, cost, reserve, level in zip(buckets, costs, reserves, levels)
+                )
+                if wait <= 0:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                        [(bucket.name, level - cost, now) for bucket, cost, level in zip(buckets, costs, levels)],
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return max(wait, 0.0)
+
+    def levels(self, buckets):
+        """Current levels without debiting"""
+        with self._lock:
+            return self._levels(buckets, time.time())
+
+
+class Waiter:
+    def __init__(self, endpoint, costs, caller, priority, notify):
+        self.endpoint = endpoint
+        self.costs = costs
+        self.caller = caller
+        self.priority = priority
+        self.notify = notify
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+
+
+class AdmissionController:
+    """Process-wide admission for OpenAI requests, with buckets shared through a SQLite file.
+
+    limits maps an endpoint ("chat", "embeddings") to its Limits. Buckets hold
+    burst_seconds worth of the per-minute limit.
+    """
+
+    def __init__(self, limits, path=DEFAULT_ADMISSION_PATH, max_wait=10.0, max_queue=64, burst_seconds=10.0,
+                 background_reserve=0.25):
+        self.buckets = {
+            endpoint: (
+                Bucket(f"{endpoint}:requests", max(1.0, limit.requests_per_minute * burst_seconds / 60),
+                       limit.requests_per_minute / 60),
+                Bucket(f"{endpoint}:tokens", limit.tokens_per_minute * burst_seconds / 60,
+                       limit.tokens_per_minute / 60),
+            )
+            for endpoint, limit in limits.items()
+        }
+        self.store = BucketStore(path)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.background_reserve = background_reserve
+        self._cond = threading.Condition()
+        # priority -> caller -> FIFO of waiters; callers rotate to the back once served
+        self._queues = {INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()}
+        self._dispatcher = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=500)
+
+    def _costs(self, endpoint, tokens):
+        token_bucket = self.buckets[endpoint][1]
+        # A request larger than a whole bucket still goes through, it just drains it
+        return (1.0, min(float(tokens), token_bucket.capacity))
+
+    def _take(self, waiter):
+        buckets = self.buckets[waiter.endpoint]
+        reserves = (0.0, 0.0)
+        if waiter.priority == BACKGROUND:
+            reserves = tuple(min(bucket.capacity * self.background_reserve, bucket.capacity - cost)
+                             for bucket, cost in zip(buckets, waiter.costs))
+        return self.store.take(buckets, waiter.costs, reserves)
+
+    def _depth(self, priority):
+        return sum(len(queue) for queue in self._queues[priority].values())
+
+    def _estimated_wait(self, waiter):
+        """Seconds until the requests served before this one (round-robin) and it fit in the buckets"""
+        endpoint, queues = waiter.endpoint, self._queues[INTERACTIVE]
+        # With n of its own requests queued, the caller is served after n + 1 turns of every other caller
+        turns = len(queues.get(waiter.caller, ())) + 1
+        queued = [waiter.costs]
+        for caller, queue in queues.items():
+            ahead = queue if caller == waiter.caller else list(queue)[:turns]
+            queued.extend(other.costs for other in ahead if other.endpoint == endpoint)
+        levels = self.store.levels(self.buckets[endpoint])
+        return max(
+            (sum(cost[i] for cost in queued) - level) / bucket.rate
+            for i, (bucket, level) in enumerate(zip(self.buckets[endpoint], levels))
+        )
+
+    def _enqueue(self, endpoint, tokens, priority, notify):
+        """Admit at once (returns None) or queue a waiter (returns it); raises RateLimited"""
+        if endpoint not in self.buckets:
+            return None
+        waiter = Waiter(endpoint, self._costs(endpoint, tokens), CALLER.get(), priority, notify)
+        with self._cond:
+            # Nobody queued ahead (for background: no live chat waiting either): try the buckets directly
+            ahead = self._depth(priority) + (self._depth(INTERACTIVE) if priority == BACKGROUND else 0)
+            if not ahead and self._take(waiter) == 0:
+                self.admitted += 1
+                self.waits.append(0.0)
+                return None
+            if priority == INTERACTIVE:
+                wait = self._estimated_wait(waiter)
+                if self._depth(INTERACTIVE) >= self.max_queue or wait > self.max_wait:
+                    self.rejected += 1
+                    raise RateLimited(endpoint, max(wait, 1.0))
+            self._queues[priority].setdefault(waiter.caller, deque()).append(waiter)
+            self.queued += 1
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="admission", daemon=True)
+                self._dispatcher.start()
+            self._cond.notify()
+        return waiter
+
+    def _withdraw(self, waiter, rejected=True):
+        """Remove a waiter that gave up; returns True if it was admitted meanwhile"""
+        with self._cond:
+            if waiter.granted:
+                return True
+            queue = self._queues[waiter.priority].get(waiter.caller)
+            if queue and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.priority][waiter.caller]
+            self.rejected += rejected
+            return False
+
+    def _dispatch(self):
+        """Grant queued requests round-robin across callers as the buckets refill"""
+        with self._cond:
+            while True:
+                if not self._depth(INTERACTIVE) and not self._depth(BACKGROUND):
+                    self._cond.wait()
+                    continue
+                next_check = 0.5  # other processes share the buckets; look again at least this often
+                granted = False
+                for priority in (INTERACTIVE, BACKGROUND):
+                    if priority == BACKGROUND and self._depth(INTERACTIVE):
+                        break
+                    queues = self._queues[priority]
+                    for caller in list(queues):
+                        waiter = queues[caller][0]
+                        wait = self._take(waiter)
+                        if wait > 0:
+                            next_check = min(next_check, wait)
+                            continue
+                        queues[caller].popleft()
+                        if queues[caller]:
+                            queues.move_to_end(caller)
+                        else:
+                            del queues[caller]
+                        waiter.granted = granted = True
+                        self.admitted += 1
+                        self.waits.append(time.perf_counter() - waiter.enqueued_at)
+                        waiter.notify()
+                if not granted:
+                    self._cond.wait(timeout=max(next_check, 0.005))
+
+    def acquire(self, endpoint, tokens, priority=INTERACTIVE):
+        """Block until a request of about `tokens` tokens may be sent; raises RateLimited"""
+        event = threading.Event()
+        waiter = self._enqueue(endpoint, tokens, priority, event.set)
+        if waiter is None:
+            return
+        timeout = self.max_wait if priority == INTERACTIVE else None
+        if not event.wait(timeout) and not self._withdraw(waiter):
+            raise RateLimited(endpoint, self.max_wait)
+
+    async def acquire_async(self, endpoint, tokens, priority=INTERACTIVE):
+        """acquire() for coroutines; a cancelled caller leaves the queue"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+        waiter = self._enqueue(endpoint, tokens, priority, notify)
+        if waiter is None:
+            return
+        timeout = self.max_wait if priority == INTERACTIVE else None
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            if not self._withdraw(waiter):
+                raise RateLimited(endpoint, self.max_wait) from None
+        except asyncio.CancelledError:
+            # A deadline or a hedge that lost: not a rejection
+            self._withdraw(waiter, rejected=False)
+            raise
+
+    def stats(self):
+        """Queue depth, wait times and bucket levels for the Statistics panel"""
+        with self._cond:
+            waits = sorted(self.waits)
+            depth = {priority: self._depth(priority) for priority in self._queues}
+        levels = {
+            endpoint: min(level / bucket.capacity for bucket, level in zip(buckets, self.store.levels(buckets)))
+            for endpoint, buckets in self.buckets.items()
+        }
+
+        def percentile(p):
+            return waits[min(len(waits) - 1, int(p / 100 * len(waits)))] if waits else 0.0
+
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "depth": depth,
+            "wait_p50": percentile(50),
+            "wait_p95": percentile(95),
+            "levels": levels,
+        }
+
+
+class _Endpoint:
+    def __init__(self, target, endpoint, controller, priority):
+        self._target = target
+        self._endpoint = endpoint
+        self._controller = controller
+        self._priority = priority
+
+    def create(self, **kwargs):
+        self._controller.acquire(self._endpoint, request_tokens(self._endpoint, kwargs), self._priority)
+        return self._target.create(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class _AsyncEndpoint(_Endpoint):
+    async def create(self, **kwargs):
+        await self._controller.acquire_async(self._endpoint, request_tokens(self._endpoint, kwargs), self._priority)
+        return await self._target.create(**kwargs)
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class AdmittedOpenAI:
+    """OpenAI or AsyncOpenAI client whose embeddings and chat completions pass admission first"""
+
+    def __init__(self, client, controller, priority=INTERACTIVE, is_async=False):
+        endpoint = _AsyncEndpoint if is_async else _Endpoint
+        self._client = client
+        self.admission = controller
+        self.embeddings = endpoint(client.embeddings, "embeddings", controller, priority)
+        self.chat = _Chat(endpoint(client.chat.completions, "chat", controller, priority))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
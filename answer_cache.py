@@ -0,0 +1,132 @@
+# ---------------------------
+# Semantic Answer Cache
+# ---------------------------
+# Reuses a stored answer when a new question embeds close enough to an earlier
+# one AND retrieval returned exactly the same chunks (ids and content). Entries
+# are evicted by LRU/TTL and dropped per institute when ingestion updates it.
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from institute_directory import INSTITUTE_UPDATES_PATH, read_institute_updates
+
+# Words that point back into the conversation ("how much is it?", "what about there?")
+ANAPHORA_PATTERN = re.compile(
+    r"\b(it|its|they|them|their|this|that|these|those|there|same|above|previous|earlier|"
+    r"he|she|him|her|one|ones)\b",
+    re.IGNORECASE,
+)
+
+
+def is_history_independent(query, chat_history):
+    """True for first-turn questions and for follow-ups that do not refer back to the conversation"""
+    if not chat_history:
+        return True
+    return len(query.split()) >= 4 and not ANAPHORA_PATTERN.search(query)
+
+
+def context_fingerprint(points):
+    """Order-insensitive key over retrieved chunk ids and their content"""
+    parts = sorted(
+        f"{point.id}:{hashlib.sha1((point.payload or {}).get('content', '').encode()).hexdigest()}"
+        for point in points
+    )
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """Thread-safe LRU/TTL cache of answers keyed on query embedding + retrieved context"""
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl_seconds=6 * 3600,
+                 updates_path=INSTITUTE_UPDATES_PATH):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.updates_path = updates_path
+        self._updates_offset = None
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    def _sync_updates(self):
+        """Apply institute updates written by ingestion since the last check"""
+        institutes, self._updates_offset = read_institute_updates(self.updates_path, self._updates_offset)
+        if institutes:
+            self._drop(lambda entry: entry["institutes"] & institutes)
+
+    def _drop(self, predicate):
+        for key in [key for key, entry in self._entries.items() if predicate(entry)]:
+            del self._entries[key]
+
+    def lookup(self, query_vector, points):
+        """Return the cached entry ({"answer", "usage"}) for a near-identical question, or None"""
+        fingerprint = context_fingerprint(points)
+        query = _unit(query_vector)
+        now = time.time()
+        with self._lock:
+            self._sync_updates()
+            self._drop(lambda entry: now - entry["created_at"] > self.ttl_seconds)
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                # Answers cached before a switch to another embedding size cannot be compared
+                if entry["fingerprint"] != fingerprint or len(entry["vector"]) != len(query):
+                    continue
+                score = float(np.dot(entry["vector"], query))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            self.hits += 1
+            self.saved_tokens += entry["usage"]["total_tokens"] if entry["usage"] else 0
+            return entry
+
+    def store(self, query_vector, points, answer, usage_info):
+        """Remember an answer for the question and the context it was generated from"""
+        institutes = {
+            (point.payload or {}).get(field)
+            for point in points
+            for field in ("institute_name", "code")
+        }
+        institutes.discard(None)
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": _unit(query_vector),
+                "fingerprint": context_fingerprint(points),
+                "institutes": institutes,
+                "answer": answer,
+                "usage": usage_info,
+                "created_at": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_institute(self, institute):
+        """Drop every answer built from chunks of the given institute (name or code)"""
+        with self._lock:
+            self._drop(lambda entry: institute in entry["institutes"])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "saved_tokens": self.saved_tokens,
+                "entries": len(self._entries),
+            }
@@ -1,6 +1,27 @@
+import time
+# Start of the cold-start clock: the imports below are part of a cold start
+STARTED_AT = time.perf_counter()
+from collections import OrderedDict
 import streamlit as st
-from qdrant_client import QdrantClient
-from openai import OpenAI
+from admission import set_caller
+from answer_cache import SemanticAnswerCache, is_history_independent
+from clients import ClientConfig, StartupReport, create_clients, flag_value, warm_up
+from collection_profiles import CollectionSettings
+from conversation_memory import ConversationMemory, new_memory_state
+from embedding_cache import EmbeddingCache
+from institute_directory import InstituteDirectory
+from ingestion import openai_embedder
+from intent_router import DIRECTORY, GREETING, INSTITUTE_FACT, IntentRouter, fact_answer
+from parent_chunks import parent_collection_name
+from prompt_assembly import SYSTEM_INSTRUCTIONS, PromptBudget, TokenCounter, assemble_prompt, chunks_from_points
+from query_router import EntityRouter
+from sparse_index import SparseIndex
+from rag_core import BackgroundLoop, RagCore, StageError, directory_context
+from rerank import RerankConfig
+from single_flight import SingleFlight
+from session_store import DEFAULT_SESSION_DB_PATH, SQLiteSessionStore, identity_owner, new_session_id
+from telemetry import Telemetry
+from vector_snapshot import LocalVectorIndex
 
 # ---------------------------
 # Page Configuration
@@ -17,102 +38,206 @@ st.set_page_config(
 # ---------------------------
 @st.cache_resource
 def init_clients():
-    # Get API keys from Streamlit secrets
-    openai_api_key = st.secrets.get("OPENAI_API_KEY")
-    qdrant_url = st.secrets.get("QDRANT_URL")
-    qdrant_api_key = st.secrets.get("QDRANT_API_KEY")
+    # Get API keys and transport settings (QDRANT_PREFER_GRPC, HTTP_* pool sizes) from Streamlit secrets
+    config = ClientConfig.from_mapping(st.secrets)
     
-    if not openai_api_key or not qdrant_url or not qdrant_api_key:
+    if not config.is_complete():
         st.error("⚠️ API keys not configured. Please set up secrets in Streamlit Cloud or .streamlit/secrets.toml")
         st.stop()
     
-    client = OpenAI(api_key=openai_api_key)
-    qdrant = QdrantClient(
-        url=qdrant_url,
-        api_key=qdrant_api_key
+    # Pooled keep-alive clients, plus the async twins used by the RAG core's event loop
+    report = StartupReport(started_at=STARTED_AT)
+    created_at = time.perf_counter()
+    clients = create_clients(config)
+    report.record("create_clients", time.perf_counter() - created_at)
+    return clients, report
+
+clients, startup_report = init_clients()
+client, qdrant, async_client, async_qdrant = clients.openai, clients.qdrant, clients.async_openai, clients.async_qdrant
+
+@st.cache_resource
+def init_telemetry():
+    # Shared per-stage latency histograms; TELEMETRY_ENABLED = false turns every span into a no-op
+    return Telemetry(
+        enabled=flag_value(st.secrets, "TELEMETRY_ENABLED", True),
+        trace_path=st.secrets.get("TRACE_LOG"),
+        prometheus_path=st.secrets.get("METRICS_PATH", ".cache/metrics.prom")
     )
-    return client, qdrant
 
-client, qdrant = init_clients()
+telemetry = init_telemetry()
+
+@st.cache_resource
+def init_embedding_cache():
+    # Shared across all sessions; the SQLite tier survives restarts
+    return EmbeddingCache()
+
+embedding_cache = init_embedding_cache()
+
+@st.cache_resource
+def init_institute_directory():
+    # Shared, versioned cache of institute payloads; reloaded after ingestion writes
+    return InstituteDirectory(qdrant)
+
+institute_directory = init_institute_directory()
+
+@st.cache_resource
+def init_single_flight():
+    # Identical requests in flight across all sessions share one upstream call
+    return SingleFlight()
+
+single_flight = init_single_flight()
+
+@st.cache_resource
+def init_rag_core():
+    # One event loop thread shared by every session; the async clients live on it
+    background_loop = BackgroundLoop()
+    # Optional in-process vector search over a float16/int8 snapshot of the collection
+    local_index_dtype = st.secrets.get("LOCAL_INDEX", "off")
+    local_index = LocalVectorIndex(qdrant, dtype=local_index_dtype) if local_index_dtype != "off" else None
+    # MMR over an over-fetched candidate pool; RERANK_POOL_SIZE = 0 returns the plain top-k
+    rerank_pool = int(st.secrets.get("RERANK_POOL_SIZE", RerankConfig.pool_size))
+    rerank = RerankConfig(pool_size=rerank_pool, mmr_lambda=float(st.secrets.get("MMR_LAMBDA", RerankConfig.mmr_lambda))) if rerank_pool else None
+    core = RagCore(
+        async_client,
+        async_qdrant,
+        embedding_cache=embedding_cache,
+        directory=institute_directory,
+        router=EntityRouter(institute_directory),
+        # BM25 over content payloads; "hybrid" fuses it with dense search, "dense" disables it
+        sparse_index=SparseIndex(qdrant),
+        retrieval_mode=st.secrets.get("RETRIEVAL_MODE", "hybrid"),
+        telemetry=telemetry,
+        local_index=local_index,
+        single_flight=single_flight,
+        # Embedding size and quantization search params follow the collection's profile
+        collection_settings=CollectionSettings(qdrant),
+        rerank=rerank,
+        # Chunks of long documents are answered with their whole parent section
+        parent_collection=parent_collection_name("Institutes")
+    )
+    return background_loop, core
+
+background_loop, rag_core = init_rag_core()
+
+@st.cache_resource
+def init_intent_router():
+    # Greetings, directory requests and single-institute facts skip retrieval and the LLM.
+    # Example utterances are embedded once through the embedding cache; queries reuse
+    # the core's cached, deadline-guarded embedding that retrieval would compute anyway,
+    # and the classifier is skipped when retrieval would not embed (sparse mode, no budget)
+    def embed_examples(texts):
+        embedder = openai_embedder(client, rag_core.embedding_model, rag_core.embedding_dimensions())
+        return embedding_cache.get_or_create_many(texts, rag_core.embedding_key(), embedder)
+    return IntentRouter(
+        rag_core.router,
+        embed_texts=embed_examples,
+        embed_query=lambda text: background_loop.run(rag_core.embed(text)),
+        thresholds=st.secrets.get("INTENT_THRESHOLDS"),
+        refresh_entities=lambda: background_loop.run(rag_core.refresh_router()),
+        use_classifier=rag_core.will_embed
+    )
+
+intent_router = init_intent_router()
+
+@st.cache_resource
+def init_answer_cache():
+    # Shared semantic answer cache; entries are dropped when ingestion updates their institute
+    return SemanticAnswerCache()
+
+answer_cache = init_answer_cache()
+
+@st.cache_resource
+def init_token_counter():
+    return TokenCounter("gpt-4o-mini")
+
+token_counter = init_token_counter()
+
+@st.cache_resource
+def init_warm_up():
+    # Runs once per process on the first page load: opens the pooled connections and
+    # primes the shared caches so the first question does not pay for them
+    if not flag_value(st.secrets, "WARM_UP", True):
+        return startup_report.finish()
+    report = warm_up(clients, startup_report, run_async=background_loop.run, primers=[
+        ("institute_directory", rag_core.router.refresh),
+        ("sparse_index", rag_core.sparse_index.refresh),
+        ("intent_centroids", intent_router.fit),
+        ("token_counter", lambda: token_counter.count("warm up")),
+    ])
+    telemetry.observe("cold_start", report.total_seconds)
+    return report
+
+warm_up_report = init_warm_up()
 
 # ---------------------------
 # RAG Functions
 # ---------------------------
+GENERATION_FAILED_MESSAGE = "I'm sorry, the assistant is taking too long to respond right now. Please try again in a moment."
+BUSY_MESSAGE = "I'm getting a lot of questions right now. Please try again in about {seconds} seconds."
+
+def generation_failed_message(error):
+    """Reply for a failed generation: a rejection by admission control says when to retry"""
+    if error.retry_after is not None:
+        return BUSY_MESSAGE.format(seconds=max(1, round(error.retry_after)))
+    return GENERATION_FAILED_MESSAGE
+
+# Token budgets for retrieved context and conversation history in each prompt
+PROMPT_BUDGET = PromptBudget(context_tokens=1500, history_tokens=1200)
+
+
 def retrieve_chunks(query: str, top_k=4):
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=query
-    )
-    query_vector = resp.data[0].embedding
-    
-    results = qdrant.query_points(
-        collection_name="Institutes",
-        query=query_vector,
-        limit=top_k
-    )
-    return results.points
-
-def build_context(results):
-    context = ""
-    for r in results:
-        if "content" in r.payload:
-            context += r.payload["content"] + "\n"
-    return context
-
-def is_greeting_or_general(query):
-    """Check if the query is a greeting or general conversation"""
-    greetings = ["hello", "hi", "hey", "good morning", "good afternoon", "good evening", 
-                 "greetings", "howdy", "what's up", "whats up", "sup"]
-    query_lower = query.lower().strip()
-    
-    # Check for exact greetings or very short queries
-    if query_lower in greetings or len(query.split()) <= 2 and any(g in query_lower for g in greetings):
-        return True
-    return False
-
-def is_asking_for_institutes_list(query):
-    """Check if user is asking for list of institutes"""
-    keywords = ["list", "all institutes", "certified", "verified", "which institutes", 
-                "show institutes", "available institutes", "what institutes"]
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in keywords)
-
-def get_all_institutes():
-    """Retrieve all unique institutes with their locations from the database"""
-    # Query with a generic embedding to get diverse results
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input="list all certified yoga institutes with locations"
-    )
-    query_vector = resp.data[0].embedding
-    
-    results = qdrant.query_points(
-        collection_name="Institutes",
-        query=query_vector,
-        limit=100  # Get more results to find all institutes
-    )
-    
-    # Use dict to store unique institutes with their info
-    institutes_dict = {}
-    
-    for r in results.points:
-        payload = r.payload
-        if "institute_name" in payload and payload["institute_name"] not in institutes_dict:
-            institutes_dict[payload["institute_name"]] = {
-                "name": payload["institute_name"],
-                "city": payload.get("city", "N/A"),
-                "state": payload.get("state", "N/A"),
-                "code": payload.get("code", "N/A"),
-                "website": payload.get("website", "N/A")
-            }
-    
-    return list(institutes_dict.values())
+    """Retrieve chunks via the async core; the result is degraded to the directory on failure"""
+    return background_loop.run(rag_core.retrieve(query, top_k))
 
-def ask_rag(query, chat_history):
+def get_all_institutes(state=None, city=None):
+    """Retrieve all unique institutes with their locations from the directory cache"""
+    with telemetry.span("directory"):
+        institutes, _ = single_flight.call(
+            ("directory", state, city), lambda: institute_directory.list(state=state, city=city)
+        )
+        return institutes
+
+def stream_chat_completion(messages, usage_info, on_complete=None):
+    """Yield answer deltas; usage_info is filled from the final chunk of the stream
+    and on_complete(answer) runs once the full answer has arrived"""
+    deltas = []
+    try:
+        for delta in background_loop.iterate(rag_core.stream(messages, usage_info)):
+            deltas.append(delta)
+            yield delta
+    except StageError as e:
+        yield generation_failed_message(e)
+        return
+    if usage_info.pop("coalesced", False):
+        # Another session's identical request paid for this answer
+        usage_info.update(cached_answer_usage(dict(usage_info)))
+    elif on_complete:
+        on_complete("".join(deltas))
+
+def cached_answer_usage(usage):
+    """Usage info for an answer served from the semantic cache or another session's identical request: nothing spent, tokens saved"""
+    saved_cost = calculate_cost(usage)
+    return {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "saved_tokens": usage["total_tokens"] if usage else 0,
+        "saved_cost": saved_cost["total_cost"] if saved_cost else 0.0
+    }
+
+def ask_rag(query, chat_history, stream=False, memory_state=None, history_offset=0):
+    """Answer a query; with stream=True the LLM answer is returned as a generator of deltas
+    and usage_info is filled once the generator is exhausted. memory_state is the session's
+    rolling summary; turns it covers are replaced by the summary in the prompt. chat_history
+    may be the loaded window of the session, starting at message index history_offset"""
     usage_info = None
     
+    with telemetry.span("intent") as span:
+        intent = intent_router.route(query)
+        span.set(intent=intent.name, source=intent.source)
+    
     # Handle greetings (only if it's the first message or no context)
-    if is_greeting_or_general(query) and len(chat_history) == 0:
+    if intent.name == GREETING and len(chat_history) == 0:
         return """Welcome to the Yoga AI Assistant! 🧘
 
 I'm here to help you find information about yoga institutes, their classes, subscriptions, schedules, and more. 
@@ -128,9 +253,13 @@ Feel free to ask me anything about our certified yoga institutes, or simply ask
 
 How may I assist you today?""", None
     
-    # Handle request for institutes list
-    if is_asking_for_institutes_list(query):
-        institutes = get_all_institutes()
+    # Handle request for institutes list, narrowed to a named city or state
+    if intent.name == DIRECTORY:
+        state = intent.states[0] if len(intent.states) == 1 else None
+        city = intent.cities[0] if len(intent.cities) == 1 else None
+        institutes = get_all_institutes(state=state, city=city) if state or city else []
+        where = f" in {city or state}" if institutes else ""
+        institutes = institutes or get_all_institutes()
         if institutes:
             institutes_list = ""
             for inst in institutes:
@@ -139,7 +268,7 @@ How may I assist you today?""", None
                 institutes_list += f"  🔖 Code: {inst['code']}\n"
                 institutes_list += f"  🌐 Website: {inst['website']}\n"
             
-            return f"""Here are the certified and verified yoga institutes in our database:
+            return f"""Here are the certified and verified yoga institutes{where} in our database:
 {institutes_list}
 
 These institutes are verified and offer professional yoga instruction. You can ask me specific questions about any of these institutes, such as their class schedules, subscription plans, or special programs.
@@ -148,12 +277,33 @@ Which institute would you like to know more about?""", None
         else:
             return "I'm currently updating our institute database. Please try again in a moment, or ask me about a specific institute you're interested in.", None
     
+    # Answer website/validity/certification/code/location questions about one institute from its directory entry
+    if intent.name == INSTITUTE_FACT:
+        return fact_answer(intent.institute, intent.fields), None
+    
     # Handle specific queries with RAG
-    results = retrieve_chunks(query)
-    context = build_context(results)
+    retrieval = retrieve_chunks(query)
+    if retrieval.degraded:
+        # Retrieval timed out; answer from the cached institute directory instead
+        chunks = [directory_context(retrieval.institutes)] if retrieval.institutes else []
+    else:
+        chunks = chunks_from_points(retrieval.points)
+    
+    # Serve near-identical questions over unchanged context from the answer cache
+    cacheable = (
+        not retrieval.degraded
+        and retrieval.query_vector is not None
+        and is_history_independent(query, chat_history)
+    )
+    if cacheable:
+        with telemetry.span("answer_cache") as span:
+            cached = answer_cache.lookup(retrieval.query_vector, retrieval.points)
+            span.set(hit=bool(cached))
+        if cached:
+            return cached["answer"], cached_answer_usage(cached["usage"])
     
     # Check if we have relevant context
-    if not context.strip():
+    if not any(chunk.strip() for chunk in chunks):
         return """I don't have specific information about that in my database. 
 
 I can help you with information about our certified yoga institutes, including:
@@ -164,48 +314,34 @@ I can help you with information about our certified yoga institutes, including:
 
 You can ask "What institutes are available?" to see all certified institutes, or ask me about a specific institute you're interested in.""", None
     
-    # Build system message with context
-    system_message = f"""You are a professional Yoga AI Assistant for certified yoga institutes. Your role is to provide accurate, helpful, and professional information.
-
-IMPORTANT INSTRUCTIONS:
-1. Answer questions ONLY about the specific institute mentioned in the user's query
-2. Use ONLY the information provided in the context below
-3. Be professional, clear, and concise
-4. If the context doesn't contain information about the specific institute asked, politely say so
-5. Format pricing and schedules clearly
-6. Always maintain a helpful and welcoming tone
-7. Remember the conversation history and provide contextual responses
-
-Context from database:
-{context}"""
-    
-    # Build messages array with conversation history
-    messages = [{"role": "system", "content": system_message}]
-    
-    # Add chat history (limit to last 10 messages to avoid token limits)
-    for msg in chat_history[-10:]:
-        messages.append({
-            "role": msg["role"],
-            "content": msg["content"]
-        })
-    
-    # Add current query
-    messages.append({"role": "user", "content": query})
-    
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
+    # Build messages within the token budget: instructions, history, context, question
+    summary, recent_history = conversation_memory.prompt_inputs(
+        memory_state or new_memory_state(), chat_history, history_offset
     )
+    with telemetry.span("assemble"):
+        messages, budget_report = assemble_prompt(
+            SYSTEM_INSTRUCTIONS, chunks, recent_history, query, token_counter, PROMPT_BUDGET, summary=summary
+        )
     
-    # Extract usage information
-    usage = response.usage
-    usage_info = {
-        "prompt_tokens": usage.prompt_tokens,
-        "completion_tokens": usage.completion_tokens,
-        "total_tokens": usage.total_tokens
-    }
+    def remember(answer, usage):
+        if cacheable:
+            answer_cache.store(retrieval.query_vector, retrieval.points, answer, usage)
+    
+    if stream:
+        usage_info = {"budget": budget_report}
+        return stream_chat_completion(messages, usage_info, lambda answer: remember(answer, usage_info)), usage_info
     
-    return response.choices[0].message.content, usage_info
+    try:
+        answer, usage_info = background_loop.run(rag_core.complete(messages))
+    except StageError as e:
+        return generation_failed_message(e), None
+    if usage_info.pop("coalesced", False):
+        # Another session's identical request paid for this answer
+        usage_info = cached_answer_usage(usage_info)
+    else:
+        remember(answer, usage_info)
+    usage_info["budget"] = budget_report
+    return answer, usage_info
 
 def calculate_cost(usage_info):
     """Calculate cost based on GPT-4o-mini pricing"""
@@ -225,57 +361,199 @@ def calculate_cost(usage_info):
         "total_cost": total_cost
     }
 
+def format_budget(budget):
+    """One-line summary of how much of the prompt budget a request used"""
+    return (
+        f"Prompt budget: context {budget['context_tokens']:,}/{budget['context_budget']:,} tokens "
+        f"({budget['chunks_used']} chunks, {budget['duplicates_removed']} duplicates removed) · "
+        f"history {budget['history_tokens']:,}/{budget['history_budget']:,} tokens "
+        f"({budget['history_messages']} messages)"
+    )
+
+@st.cache_resource
+def init_render_cache():
+    # Usage blocks per stored message ID, shared across sessions; stored messages never change
+    return OrderedDict()
+
+render_cache = init_render_cache()
+RENDER_CACHE_SIZE = 4096
+
+def format_usage_block(usage, cost=None, ttft=None):
+    """Markdown body of a message's Token Usage expander"""
+    lines = [
+        f"**Input:** {usage['prompt_tokens']:,} · **Output:** {usage['completion_tokens']:,} · "
+        f"**Total:** {usage['total_tokens']:,}"
+    ]
+    if cost:
+        lines.append(f"Cost: ${cost['total_cost']:.6f}")
+    if usage.get("saved_tokens"):
+        lines.append(f"♻️ Answered from cache, saved {usage['saved_tokens']:,} tokens (${usage['saved_cost']:.6f})")
+    if ttft is not None:
+        lines.append(f"Time to first token: {ttft:.2f}s")
+    if "budget" in usage:
+        lines.append(format_budget(usage["budget"]))
+    return "  \n".join(lines)
+
+def usage_block(session_id, message):
+    """Cached usage block of a stored message"""
+    key = f"{session_id}:{message['seq']}"
+    block = render_cache.get(key)
+    if block is None:
+        block = render_cache[key] = format_usage_block(message["usage"], message.get("cost"), message.get("ttft"))
+        if len(render_cache) > RENDER_CACHE_SIZE:
+            render_cache.popitem(last=False)
+    return block
+
+@st.cache_resource
+def init_conversation_memory():
+    # Older turns are folded into a rolling summary in the background once they pass the threshold
+    return ConversationMemory(
+        rag_core, background_loop, token_counter,
+        recent_tokens=500, fold_threshold_tokens=600, cost_fn=calculate_cost
+    )
+
+conversation_memory = init_conversation_memory()
+
+def format_stage_latency(stage, summary):
+    """One sidebar line of a stage's latency histogram"""
+    return (
+        f"{stage}: p50 {summary['p50'] * 1000:,.0f} ms · p95 {summary['p95'] * 1000:,.0f} ms · "
+        f"max {summary['max'] * 1000:,.0f} ms ({summary['count']})"
+    )
+
+# ---------------------------
+# Streaming Helpers
+# ---------------------------
+def record_first_token(deltas, started_at, timing):
+    """Pass deltas through, recording time-to-first-token in timing["ttft"]"""
+    for delta in deltas:
+        if "ttft" not in timing:
+            timing["ttft"] = time.perf_counter() - started_at
+        yield delta
+
 # ---------------------------
 # Session Management Functions
 # ---------------------------
-def create_new_session(session_count=1):
+# Messages rendered (and loaded) per page of the active session; 0 renders the whole history
+RENDER_WINDOW = int(st.secrets.get("RENDER_WINDOW", 20))
+# Sessions listed per sidebar page
+SESSIONS_PER_PAGE = 10
+
+@st.cache_resource
+def init_session_store():
+    # Signed-in users' chat sessions persist across restarts; browsers only hold the active session's loaded messages
+    return SQLiteSessionStore(st.secrets.get("SESSION_DB_PATH", DEFAULT_SESSION_DB_PATH))
+
+def signed_in_identity():
+    """Subject or email of the signed-in user when Streamlit authentication is configured, else None"""
+    user = getattr(st, "user", None)  # Streamlit >= 1.42
+    if user is None or not user.get("is_logged_in"):
+        return None
+    return user.get("sub") or user.get("email")
+
+def get_owner_id():
+    """Owner of this browser's chat sessions.
+
+    A signed-in user owns the sessions of their identity (hashed, so the
+    database holds no emails). Without sign-in the owner is a random ID held
+    only in this browser session: nothing in a shareable URL grants access to
+    the chats, and they cannot be reopened after a reload.
+    """
+    identity = signed_in_identity()
+    return identity_owner(identity) if identity else new_session_id()
+
+def create_new_session(owner_id):
     """Create a new chat session"""
-    import time
-    session_id = f"session_{int(time.time())}"
-    session_name = f"Chat {session_count}"
-    return {
-        "id": session_id,
-        "name": session_name,
-        "messages": [],
-        "created_at": time.time(),
-        "total_tokens": 0,
-        "total_cost": 0.0
-    }
+    return session_store.create_session(owner_id)
 
-def get_session_preview(messages):
+def get_session_preview(session):
     """Get preview text for a session"""
-    if not messages:
-        return "New chat"
-    first_user_msg = next((msg["content"] for msg in messages if msg["role"] == "user"), "New chat")
-    return first_user_msg[:40] + "..." if len(first_user_msg) > 40 else first_user_msg
+    return session["preview"] or "New chat"
+
+def load_active_session(session):
+    """Load the newest page of a session's messages, reaching back at least to its summarized point.
+
+    Only messages from "visible_from" on are rendered.
+    """
+    memory = dict(session["memory"] or new_memory_state(), pending=False)
+    visible_from = max(0, session["message_count"] - RENDER_WINDOW) if RENDER_WINDOW else 0
+    since = min(visible_from, memory["summarized_count"])
+    messages = session_store.load_messages(session["id"], since=since)
+    return {"id": session["id"], "messages": messages, "offset": since, "visible_from": visible_from,
+            "expanded": False, "memory": memory}
+
+def load_earlier_messages(active):
+    """Show the previous page of messages, loading it from the store if needed"""
+    active["visible_from"] = max(0, active["visible_from"] - RENDER_WINDOW)
+    active["expanded"] = True
+    if active["visible_from"] < active["offset"]:
+        earlier = session_store.load_messages(active["id"], since=active["visible_from"], before=active["offset"])
+        active["messages"][:0] = earlier
+        active["offset"] = active["visible_from"]
+
+def visible_messages(active):
+    """The loaded messages inside the render window"""
+    start = max(0, active["visible_from"] - active["offset"])
+    return active["messages"][start:]
+
+def store_message(active, message):
+    """Persist a message of the active session and keep it in the loaded window"""
+    message["seq"] = session_store.append_message(active["id"], message)
+    active["messages"].append(message)
+    if RENDER_WINDOW and not active["expanded"]:
+        # Slide the window and drop loaded messages that are neither visible nor awaiting the summary
+        active["visible_from"] = max(active["visible_from"], message["seq"] + 1 - RENDER_WINDOW)
+        keep_from = min(active["visible_from"], active["memory"]["summarized_count"])
+        if keep_from > active["offset"]:
+            del active["messages"][:keep_from - active["offset"]]
+            active["offset"] = keep_from
 
 # ---------------------------
 # Initialize Session State
 # ---------------------------
-if "chat_sessions" not in st.session_state:
-    st.session_state.chat_sessions = [create_new_session(1)]
+if "owner_id" not in st.session_state:
+    st.session_state.owner_id = get_owner_id()
+    # Anonymous chats cannot be reopened after a reload, so they stay in this browser session's
+    # memory and are freed with it instead of piling up in the database
+    st.session_state.session_store = (init_session_store() if signed_in_identity()
+                                      else SQLiteSessionStore(":memory:"))
+owner_id = st.session_state.owner_id
+session_store = st.session_state.session_store
+# OpenAI calls made for this browser queue fairly against other users' under load
+set_caller(owner_id)
 if "current_session_id" not in st.session_state:
-    st.session_state.current_session_id = st.session_state.chat_sessions[0]["id"]
+    newest = session_store.list_sessions(owner_id, limit=1)
+    st.session_state.current_session_id = (newest[0] if newest else create_new_session(owner_id))["id"]
 if "show_stats" not in st.session_state:
     st.session_state.show_stats = False
+if "stream_responses" not in st.session_state:
+    st.session_state.stream_responses = True
+if "session_page" not in st.session_state:
+    st.session_state.session_page = 0
 
-# Get current session
-current_session = next(
-    (s for s in st.session_state.chat_sessions if s["id"] == st.session_state.current_session_id),
-    st.session_state.chat_sessions[0]
-)
+# Get current session (summary row) and its loaded messages
+current_session = session_store.get_session(st.session_state.current_session_id)
+if current_session is None:
+    current_session = create_new_session(owner_id)
+    st.session_state.current_session_id = current_session["id"]
+active = st.session_state.get("active_session")
+if active is None or active["id"] != current_session["id"]:
+    active = st.session_state.active_session = load_active_session(current_session)
 
 # ---------------------------
 # Sidebar - Chat Sessions
 # ---------------------------
 with st.sidebar:
     st.title("🧘 Yoga AI")
+    # With [auth] configured in secrets, signing in makes chat history reopenable after a reload
+    if "auth" in st.secrets and not signed_in_identity():
+        st.button("🔑 Sign in to keep your chats", use_container_width=True, on_click=st.login)
     
     # New Chat Button
     if st.button("➕ New Chat", use_container_width=True, type="primary"):
-        new_session = create_new_session(len(st.session_state.chat_sessions) + 1)
-        st.session_state.chat_sessions.insert(0, new_session)
+        new_session = create_new_session(owner_id)
         st.session_state.current_session_id = new_session["id"]
+        st.session_state.session_page = 0
         st.rerun()
     
     st.divider()
@@ -283,7 +561,14 @@ with st.sidebar:
     # Chat Sessions List
     st.subheader("💬 Chat History")
     
-    for idx, session in enumerate(st.session_state.chat_sessions):
+    # Only one page of sessions is fetched and rendered
+    session_count = session_store.count_sessions(owner_id)
+    page_count = max(1, -(-session_count // SESSIONS_PER_PAGE))
+    st.session_state.session_page = min(st.session_state.session_page, page_count - 1)
+    sessions = session_store.list_sessions(
+        owner_id, limit=SESSIONS_PER_PAGE, offset=st.session_state.session_page * SESSIONS_PER_PAGE
+    )
+    for session in sessions:
         is_current = session["id"] == st.session_state.current_session_id
         
         col1, col2 = st.columns([4, 1])
@@ -291,7 +576,7 @@ with st.sidebar:
         with col1:
             button_type = "primary" if is_current else "secondary"
             if st.button(
-                get_session_preview(session["messages"]),
+                get_session_preview(session),
                 key=f"session_{session['id']}",
                 use_container_width=True,
                 type=button_type if is_current else "secondary"
@@ -300,15 +585,28 @@ with st.sidebar:
                 st.rerun()
         
         with col2:
-            if len(st.session_state.chat_sessions) > 1:
+            if session_count > 1:
                 if st.button("🗑️", key=f"delete_{session['id']}", help="Delete chat"):
-                    st.session_state.chat_sessions.pop(idx)
+                    session_store.delete_session(session["id"])
                     if session["id"] == st.session_state.current_session_id:
-                        st.session_state.current_session_id = st.session_state.chat_sessions[0]["id"]
+                        st.session_state.current_session_id = session_store.list_sessions(owner_id, limit=1)[0]["id"]
                     st.rerun()
     
+    if page_count > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        if col1.button("◀", disabled=st.session_state.session_page == 0, help="Newer chats"):
+            st.session_state.session_page -= 1
+            st.rerun()
+        col2.caption(f"Page {st.session_state.session_page + 1} of {page_count}")
+        if col3.button("▶", disabled=st.session_state.session_page >= page_count - 1, help="Older chats"):
+            st.session_state.session_page += 1
+            st.rerun()
+    
     st.divider()
     
+    # Streaming Toggle
+    st.toggle("⚡ Stream responses", key="stream_responses")
+    
     # Statistics Toggle
     if st.button("📊 Statistics", use_container_width=True):
         st.session_state.show_stats = not st.session_state.show_stats
@@ -316,35 +614,95 @@ with st.sidebar:
     if st.session_state.show_stats:
         st.metric("Session Tokens", f"{current_session['total_tokens']:,}")
         st.metric("Session Cost", f"${current_session['total_cost']:.6f}")
+        st.caption(f"Saved by answer cache: {current_session['saved_tokens']:,} tokens (${current_session['saved_cost']:.6f})")
+        memory_state = active["memory"]
+        st.caption(f"Conversation summary: {memory_state['summary_calls']} calls, {memory_state['summary_tokens']:,} tokens (${memory_state['summary_cost']:.6f})")
         
-        # Total across all sessions
-        total_tokens = sum(s['total_tokens'] for s in st.session_state.chat_sessions)
-        total_cost = sum(s['total_cost'] for s in st.session_state.chat_sessions)
+        # Total across all sessions, kept up to date by the session store
+        totals = session_store.owner_totals(owner_id)
         
         st.caption("**All Sessions:**")
-        st.caption(f"Tokens: {total_tokens:,}")
-        st.caption(f"Cost: ${total_cost:.6f}")
+        st.caption(f"Tokens: {totals['total_tokens']:,}")
+        st.caption(f"Cost: ${totals['total_cost']:.6f}")
         st.caption("GPT-4o-mini: $0.150/1M input, $0.600/1M output")
+        
+        # Embedding cache effectiveness (shared across all sessions)
+        cache_stats = embedding_cache.stats()
+        st.caption("**Embedding Cache:**")
+        st.caption(f"Hits: {cache_stats['memory_hits']} memory, {cache_stats['disk_hits']} disk")
+        st.caption(f"Misses: {cache_stats['misses']} ({cache_stats['hit_rate']:.0%} hit rate)")
+        
+        # Semantic answer cache (shared across all sessions)
+        answer_stats = answer_cache.stats()
+        st.caption("**Answer Cache:**")
+        st.caption(f"Hits: {answer_stats['hits']} · Misses: {answer_stats['misses']} · Saved tokens: {answer_stats['saved_tokens']:,}")
+        
+        # Tail-latency protection in the async core
+        core_stats = rag_core.stats()
+        st.caption("**Pipeline:**")
+        st.caption(f"Hedged requests: {core_stats['hedges']} · Timeouts: {core_stats['timeouts']}")
+        st.caption(f"Directory fallbacks: {core_stats['degraded']} · Sparse-only: {core_stats['sparse_only']}")
+        collection = rag_core.collection_settings.current()
+        st.caption(f"Collection: {collection['size'] or '?'} dimensions · "
+                   f"{collection['quantization'] or 'no'} quantization")
+        if rag_core.local_index is not None:
+            local_stats = rag_core.local_index.stats()
+            st.caption(f"Local snapshot: {local_stats['points']:,} points ({local_stats['dtype']}, "
+                       f"{'fresh' if local_stats['fresh'] else 'stale'}) · Local searches: {core_stats['local_searches']}")
+        if clients.admission is not None:
+            admission_stats = clients.admission.stats()
+            st.caption(f"Admission: {admission_stats['depth']['interactive']} queued "
+                       f"({admission_stats['depth']['background']} background) · "
+                       f"wait p50 {admission_stats['wait_p50'] * 1000:,.0f} ms / p95 {admission_stats['wait_p95'] * 1000:,.0f} ms · "
+                       f"rejected {admission_stats['rejected']}")
+            st.caption("Rate budget left: " + " · ".join(
+                f"{endpoint} {level:.0%}" for endpoint, level in admission_stats["levels"].items()
+            ))
+        coalesced = single_flight.stats()
+        if coalesced:
+            st.caption("Coalesced requests: " + " · ".join(
+                f"{kind} {counts['coalesced']}/{counts['calls']}" for kind, counts in sorted(coalesced.items())
+            ))
+        router_stats = rag_core.router.stats()
+        st.caption(f"Entity-boosted searches: {router_stats['routed']} of {router_stats['routed'] + router_stats['unrouted']}")
+        intent_stats = intent_router.stats()
+        st.caption(f"Answered without retrieval: {intent_stats['fast_paths']} of {intent_stats['total']} messages")
+        if intent_stats["routes"]:
+            st.caption("Intents: " + " · ".join(f"{route} {count}" for route, count in intent_stats["routes"].items()))
+        
+        st.caption(f"Cold start: {warm_up_report.total_seconds:.2f}s (" + " · ".join(
+            f"{step} {seconds * 1000:,.0f} ms" + (" ✗" if step in warm_up_report.errors else "")
+            for step, seconds in warm_up_report.steps.items()
+        ) + ")" + (" · Qdrant over gRPC" if clients.config.prefer_grpc else ""))
+        
+        # Per-stage latency histograms (shared across all sessions)
+        if telemetry.enabled:
+            st.caption("**Stage Latency:**")
+            for stage, summary in telemetry.snapshot().items():
+                st.caption(format_stage_latency(stage, summary))
 
 # ---------------------------
 # Main Chat Interface
 # ---------------------------
 st.title("🧘 Yoga Institute Assistant")
-st.caption(f"💬 {get_session_preview(current_session['messages'])}")
+st.caption(f"💬 {get_session_preview(current_session)}")
+
+# Only the newest RENDER_WINDOW messages are rendered; older ones on demand
+if active["visible_from"] > 0:
+    if st.button(f"⬆️ Load earlier messages ({active['visible_from']} more)"):
+        load_earlier_messages(active)
+        st.rerun()
 
 # Display chat history
-for message in current_session["messages"]:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-        # Show usage info if available
-        if message["role"] == "assistant" and "usage" in message and message["usage"]:
-            with st.expander("📈 Token Usage"):
-                col1, col2, col3 = st.columns(3)
-                col1.metric("Input", message["usage"]["prompt_tokens"])
-                col2.metric("Output", message["usage"]["completion_tokens"])
-                col3.metric("Total", message["usage"]["total_tokens"])
-                if "cost" in message:
-                    st.caption(f"Cost: ${message['cost']['total_cost']:.6f}")
+history = visible_messages(active)
+with telemetry.span("render_history", messages=len(history)):
+    for message in history:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            # Show usage info if available
+            if message["role"] == "assistant" and message.get("usage"):
+                with st.expander("📈 Token Usage"):
+                    st.markdown(usage_block(active["id"], message))
 
 # Chat input
 if prompt := st.chat_input("Ask me about yoga institutes..."):
@@ -353,37 +711,55 @@ if prompt := st.chat_input("Ask me about yoga institutes..."):
         st.markdown(prompt)
     
     # Add user message to current session
-    current_session["messages"].append({"role": "user", "content": prompt})
+    store_message(active, {"role": "user", "content": prompt})
     
     # Get assistant response with full chat history
     with st.chat_message("assistant"):
+        started_at = time.perf_counter()
+        timing = {}
         with st.spinner("Thinking..."):
             # Pass chat history (excluding the current message we just added)
-            response, usage_info = ask_rag(prompt, current_session["messages"][:-1])
-            st.markdown(response)
-            
-            # Display and store usage info
-            if usage_info:
-                cost_info = calculate_cost(usage_info)
-                
-                # Update session totals
-                current_session["total_tokens"] += usage_info["total_tokens"]
-                current_session["total_cost"] += cost_info["total_cost"]
-                
-                with st.expander("📈 Token Usage"):
-                    col1, col2, col3 = st.columns(3)
-                    col1.metric("Input", usage_info["prompt_tokens"])
-                    col2.metric("Output", usage_info["completion_tokens"])
-                    col3.metric("Total", usage_info["total_tokens"])
-                    st.caption(f"Cost: ${cost_info['total_cost']:.6f}")
-                
-                # Add to chat history with usage info
-                current_session["messages"].append({
-                    "role": "assistant", 
-                    "content": response,
-                    "usage": usage_info,
-                    "cost": cost_info
-                })
+            response, usage_info = ask_rag(
+                prompt,
+                active["messages"][:-1],
+                stream=st.session_state.stream_responses,
+                memory_state=active["memory"],
+                history_offset=active["offset"]
+            )
+        
+        with telemetry.span("render", streamed=not isinstance(response, str)):
+            if isinstance(response, str):
+                timing["ttft"] = time.perf_counter() - started_at
+                st.markdown(response)
             else:
-                # Add to chat history without usage info
-                current_session["messages"].append({"role": "assistant", "content": response})
+                # Render deltas as they arrive; write_stream returns the full text
+                response = st.write_stream(record_first_token(response, started_at, timing))
+        
+        # Display and store usage info (a failed stream never reports token counts)
+        if usage_info and "total_tokens" in usage_info:
+            cost_info = calculate_cost(usage_info)
+            
+            with st.expander("📈 Token Usage"):
+                st.markdown(format_usage_block(usage_info, cost_info, timing.get("ttft")))
+            
+            # Add to chat history with usage info; the store updates session and all-session totals
+            store_message(active, {
+                "role": "assistant", 
+                "content": response,
+                "usage": usage_info,
+                "cost": cost_info,
+                **timing
+            })
+        else:
+            # Add to chat history without usage info
+            store_message(active, {"role": "assistant", "content": response, **timing})
+    
+    telemetry.observe("turn", time.perf_counter() - started_at)
+    telemetry.write_prometheus()
+    
+    # Fold older turns into the session's rolling summary once they cross the token threshold
+    session_id = active["id"]
+    conversation_memory.maybe_summarize(
+        active["memory"], active["messages"], active["offset"],
+        on_update=lambda state: session_store.update_memory(session_id, state)
+    )
@@ -0,0 +1,47 @@
+# ---------------------------
+# Compare Two Benchmark Reports
+# ---------------------------
+#   python -m benchmarks.compare bench/baseline.json bench/candidate.json
+import argparse
+import json
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def delta(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(baseline, candidate):
+    print(f"baseline {baseline.get('revision')}  vs  candidate {candidate.get('revision')}")
+    print(f"{'metric':<28} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    rows = []
+    for stage, summary in baseline["stages"].items():
+        other = candidate["stages"].get(stage, {})
+        if not summary.get("count") or not other.get("count"):
+            continue
+        rows.extend((f"{stage} {metric}", summary[metric], other[metric]) for metric in METRICS)
+    rows.append(("throughput qps", baseline["throughput_qps"], candidate["throughput_qps"]))
+    rows.append(("prompt tokens mean", baseline["prompt_tokens"]["mean"], candidate["prompt_tokens"]["mean"]))
+    rows.append(("ingestion docs/sec", baseline["ingestion"]["docs_per_sec"], candidate["ingestion"]["docs_per_sec"]))
+    if baseline["memory"]["peak_rss_mb"] is not None and candidate["memory"]["peak_rss_mb"] is not None:
+        rows.append(("peak RSS MB", baseline["memory"]["peak_rss_mb"], candidate["memory"]["peak_rss_mb"]))
+    if baseline.get("recall_at_k") is not None and candidate.get("recall_at_k") is not None:
+        rows.append(("recall@k", baseline["recall_at_k"], candidate["recall_at_k"]))
+    for name, before, after in rows:
+        print(f"{name:<28} {before:>12.2f} {after:>12.2f} {delta(before, after):>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    compare(load(args.baseline), load(args.candidate))
@@ -0,0 +1,184 @@
+# ---------------------------
+# Synthetic Institute Corpus and Query Workloads
+# ---------------------------
+# Generates institute metadata and schedule/pricing chunks with the payload
+# schema used by add_institute_metadata.py, plus long per-branch handbooks for
+# hierarchical chunking, seeds them into a Qdrant collection and derives
+# labelled queries ({"query", "expected"}) from them.
+import json
+import random
+
+from qdrant_client import QdrantClient, models
+
+from ingestion import IngestionEngine
+
+PREFIXES = ["Sivananda", "Atha", "Yogmaya", "Niramaya", "Manappuram", "Prana", "Shanti", "Surya",
+            "Chandra", "Ananda", "Kaivalya", "Satya", "Ishvara", "Moksha", "Tapas", "Vinyasa"]
+SUFFIXES = ["Yoga Centre", "Yoga Institute", "Ashram", "Yoga Shala", "Wellness Studio", "Yoga Academy"]
+LOCATIONS = [("Nellore", "Andhra Pradesh"), ("Bengaluru Urban", "Karnataka"), ("Jaipur", "Rajasthan"),
+             ("Cachar", "Assam"), ("Thrissur", "Kerala"), ("Pune", "Maharashtra"), ("Rishikesh", "Uttarakhand"),
+             ("Mysuru", "Karnataka"), ("Chennai", "Tamil Nadu"), ("Kolkata", "West Bengal")]
+BRANCHES = ["Indiranagar", "Koramangala", "Jayanagar", "Whitefield", "Old Town", "Lake Road", "Main Campus"]
+STYLES = ["Hatha", "Ashtanga", "Iyengar", "Vinyasa", "Yin", "Prenatal", "Pranayama", "Meditation"]
+PLANS = ["Group Classes Subscription", "Private Session Pack", "Drop-in Class", "Teacher Training Course"]
+DAYS = ["Mon/Wed/Fri", "Tue/Thu", "Sat/Sun", "Daily"]
+
+
+def generate_institutes(count, seed=7):
+    rng = random.Random(seed)
+    institutes = []
+    for i in range(count):
+        city, state = rng.choice(LOCATIONS)
+        name = f"{rng.choice(PREFIXES)} {rng.choice(SUFFIXES)} {i}"
+        institutes.append({
+            "name": name,
+            "code": f"YC{20000 + i:05d}",
+            "certification": f"YAI/IND/{state[:3].upper()}/{rng.randint(10, 99)}MY{rng.randint(1000, 9999)}",
+            "validity": f"Jul {rng.randint(2023, 2025)} - Jul {rng.randint(2026, 2028)}",
+            "city": city,
+            "state": state,
+            "country": "India",
+            "website": f"www.{name.split()[0].lower()}{i}.org",
+        })
+    return institutes
+
+
+def metadata_document(institute, point_id):
+    text = (
+        f"Institute Name: {institute['name']}\n"
+        f"Code: {institute['code']}\n"
+        f"Location: {institute['city']}, {institute['state']}, {institute['country']}\n"
+        f"Certification: {institute['certification']}\n"
+        f"Validity: {institute['validity']}\n"
+        f"Website: {institute['website']}\n\n"
+        f"This is a certified yoga institute located in {institute['city']}, {institute['state']}."
+    )
+    payload = {
+        "institute_name": institute["name"],
+        "code": institute["code"],
+        "certification": institute["certification"],
+        "validity": institute["validity"],
+        "city": institute["city"],
+        "state": institute["state"],
+        "country": institute["country"],
+        "website": institute["website"],
+        "content": text,
+        "type": "institute_metadata",
+    }
+    return {"id": point_id, "text": text, "payload": payload}
+
+
+def schedule_document(institute, point_id, rng):
+    branch = rng.choice(BRANCHES)
+    plan = rng.choice(PLANS)
+    lines = [f"Institute Name: {institute['name']} ({institute['code']})", f"Branch: {branch}, {institute['city']}"]
+    for _ in range(rng.randint(2, 5)):
+        hour = rng.randint(5, 19)
+        lines.append(f"{rng.choice(STYLES)} Yoga: {rng.choice(DAYS)} {hour}:00-{hour + 1}:00")
+    lines.append(f"{plan} for {branch}: Rs {rng.randrange(1500, 20000, 500)} per month")
+    text = "\n".join(lines)
+    payload = {
+        "institute_name": institute["name"],
+        "code": institute["code"],
+        "city": institute["city"],
+        "state": institute["state"],
+        "branch": branch,
+        "plan": plan,
+        "content": text,
+        "type": "schedule",
+    }
+    return {"id": point_id, "text": text, "payload": payload}
+
+
+def handbook_document(institute, rng, branches=4):
+    """A long schedule and fee handbook with one blank-line separated section per branch.
+
+    Returns (document, facts); each fact is {"branch", "plan", "answer"}, the answer being the fee line.
+    """
+    sections, facts = [], []
+    for branch in rng.sample(BRANCHES, branches):
+        lines = [f"Branch: {branch}, {institute['city']}"]
+        for _ in range(rng.randint(4, 7)):
+            hour = rng.randint(5, 19)
+            lines.append(f"{rng.choice(STYLES)} Yoga: {rng.choice(DAYS)} {hour}:00-{hour + 1}:00")
+        for plan in rng.sample(PLANS, rng.randint(2, 3)):
+            answer = f"{plan} at {branch}: Rs {rng.randrange(1500, 20000, 500)} per month"
+            lines.append(answer)
+            facts.append({"branch": branch, "plan": plan, "answer": answer})
+        lines.append(f"Mats are provided at the {branch} studio; please arrive ten minutes before class.")
+        sections.append("\n".join(lines))
+    text = f"Institute Name: {institute['name']} ({institute['code']}) - Class Schedules and Fees\n\n" + \
+        "\n\n".join(sections)
+    payload = {
+        "institute_name": institute["name"],
+        "code": institute["code"],
+        "city": institute["city"],
+        "state": institute["state"],
+        "content": text,
+        "type": "handbook",
+    }
+    return {"key": f"{institute['code']}-handbook", "text": text, "payload": payload}, facts
+
+
+def generate_documents(chunks, chunks_per_institute=5, seed=7):
+    """About chunks documents: one metadata chunk plus schedule/pricing chunks per institute"""
+    rng = random.Random(seed)
+    institutes = generate_institutes(max(1, chunks // chunks_per_institute), seed)
+    documents = []
+    for institute in institutes:
+        documents.append(metadata_document(institute, len(documents)))
+        for _ in range(chunks_per_institute - 1):
+            if len(documents) >= chunks:
+                break
+            documents.append(schedule_document(institute, len(documents), rng))
+    return institutes, documents[:chunks]
+
+
+def seed_collection(documents, embed_texts, dim, client=None, collection_name="Institutes", batch_size=256):
+    """Create the collection in an in-memory Qdrant (unless a client is given) and ingest documents.
+
+    Returns (client, IngestionReport).
+    """
+    client = client or QdrantClient(":memory:")
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(
+        collection_name,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+    )
+    engine = IngestionEngine(client, embed_texts, collection_name=collection_name,
+                             embed_batch_size=batch_size, upsert_batch_size=batch_size)
+    report = engine.run(documents)
+    return client, report
+
+
+def generate_queries(documents, count, seed=11):
+    """Labelled queries about random documents; "expected" is the institute code"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        payload = rng.choice(documents)["payload"]
+        if payload["type"] == "schedule":
+            query = f"What is the {payload['plan']} for {payload['branch']} of {payload['institute_name']}?"
+        else:
+            query = rng.choice([
+                f"Which institute has the code {payload['code']}?",
+                f"What is the certification of {payload['institute_name']}?",
+                f"What is the website of {payload['institute_name']}?",
+            ])
+        queries.append({"query": query, "expected": payload["code"]})
+    return queries
+
+
+def load_workload(path):
+    """Read a JSONL workload; each record needs a "query" (or "question") and may carry "expected" """
+    queries = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            query = record.get("query") or record.get("question")
+            if query:
+                queries.append({"query": query, "expected": record.get("expected")})
+    return queries
@@ -0,0 +1,163 @@
+# ---------------------------
+# Deterministic Stand-ins for OpenAI and Async Qdrant
+# ---------------------------
+# Embeddings are a signed feature hash of the text's words, so similar texts get
+# similar vectors and retrieval quality stays meaningful offline. Chat answers
+# are built from the prompt and report usage. Every call can inject latency.
+import asyncio
+import hashlib
+import math
+import re
+import time
+from types import SimpleNamespace
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def hash_embedding(text, dim=256):
+    """Unit vector from hashed word unigrams and bigrams"""
+    vector = [0.0] * dim
+    words = WORD_PATTERN.findall(text.lower())
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _count_tokens(text):
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def _answer_for(messages, max_words=60):
+    """A deterministic answer echoing the start of the retrieved context"""
+    context = next((m["content"] for m in reversed(messages) if m["content"].startswith("Context from database:")), "")
+    words = context.split()[3:3 + max_words] or ["I", "don't", "know."]
+    return "Based on our records, " + " ".join(words)
+
+
+def _usage(messages, answer):
+    prompt_tokens = sum(3 + _count_tokens(m["content"]) for m in messages) + 3
+    completion_tokens = _count_tokens(answer)
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+
+
+class _Latency:
+    def __init__(self, embed_ms=0.0, chat_ms=0.0, token_ms=0.0):
+        self.embed = embed_ms / 1000
+        self.chat = chat_ms / 1000
+        self.token = token_ms / 1000
+
+
+def _embedding_response(input, dim):
+    texts = [input] if isinstance(input, str) else list(input)
+    data = [SimpleNamespace(index=i, embedding=hash_embedding(t, dim)) for i, t in enumerate(texts)]
+    return SimpleNamespace(data=data, usage=SimpleNamespace(total_tokens=sum(map(_count_tokens, texts))))
+
+
+def _chat_response(messages):
+    answer = _answer_for(messages)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=answer))],
+        usage=_usage(messages, answer),
+    )
+
+
+def _chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeOpenAI:
+    """Synchronous client exposing embeddings.create and chat.completions.create"""
+
+    def __init__(self, dim=256, embed_ms=0.0, chat_ms=0.0, token_ms=0.0):
+        latency = _Latency(embed_ms, chat_ms, token_ms)
+        self.calls = {"embeddings": 0, "chat": 0}
+
+        def create_embedding(model, input, **kwargs):
+            self.calls["embeddings"] += 1
+            time.sleep(latency.embed)
+            return _embedding_response(input, kwargs.get("dimensions") or dim)
+
+        def create_chat(model, messages, stream=False, **kwargs):
+            self.calls["chat"] += 1
+            time.sleep(latency.chat)
+            if not stream:
+                return _chat_response(messages)
+            answer = _answer_for(messages)
+
+            def chunks():
+                for word in answer.split(" "):
+                    time.sleep(latency.token)
+                    yield _chunk(word + " ")
+                yield _chunk(usage=_usage(messages, answer))
+            return chunks()
+
+        self.embeddings = SimpleNamespace(create=create_embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create_chat))
+
+
+class _AsyncStream:
+    def __init__(self, messages, token_delay):
+        self.messages = messages
+        self.token_delay = token_delay
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        answer = _answer_for(self.messages)
+        for word in answer.split(" "):
+            await asyncio.sleep(self.token_delay)
+            yield _chunk(word + " ")
+        yield _chunk(usage=_usage(self.messages, answer))
+
+    async def close(self):
+        pass
+
+
+class FakeAsyncOpenAI:
+    """AsyncOpenAI stand-in with the same behaviour as FakeOpenAI"""
+
+    def __init__(self, dim=256, embed_ms=0.0, chat_ms=0.0, token_ms=0.0):
+        latency = _Latency(embed_ms, chat_ms, token_ms)
+        self.calls = {"embeddings": 0, "chat": 0}
+
+        async def create_embedding(model, input, **kwargs):
+            self.calls["embeddings"] += 1
+            await asyncio.sleep(latency.embed)
+            return _embedding_response(input, kwargs.get("dimensions") or dim)
+
+        async def create_chat(model, messages, stream=False, **kwargs):
+            self.calls["chat"] += 1
+            await asyncio.sleep(latency.chat)
+            if stream:
+                return _AsyncStream(messages, latency.token)
+            return _chat_response(messages)
+
+        self.embeddings = SimpleNamespace(create=create_embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create_chat))
+
+
+class AsyncLocalQdrant:
+    """Async facade over a synchronous (e.g. ":memory:") QdrantClient, so the async core
+    and the sync directory/sparse index can share one seeded collection"""
+
+    def __init__(self, client, latency_ms=0.0):
+        self.client = client
+        self.latency = latency_ms / 1000
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        async def call(*args, **kwargs):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return method(*args, **kwargs)
+        return call
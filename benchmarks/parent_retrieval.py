@@ -0,0 +1,133 @@
+# ---------------------------
+# Parent-document Retrieval vs Whole-document Indexing
+# ---------------------------
+# Indexes the same long schedule/fee handbooks (plus short metadata chunks) in
+# two in-memory collections: once with every document embedded whole, once
+# split into parent sections and child chunks (parent_chunks.py). It then asks
+# each one for specific fees through the RAG core. Reported per setup:
+#   precision@1 / precision@k  share of the top 1 / top-k contexts containing the fee line
+#   hit@k                      the fee line is in some retrieved context
+#   hit in prompt              ... and survives the prompt's context token budget
+#   context tokens             tokens of the retrieved contexts per query
+#
+#   python -m benchmarks.parent_retrieval --institutes 200 --queries 300 --output bench/parents.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from qdrant_client import QdrantClient, models
+
+from benchmarks.corpus import generate_institutes, handbook_document, metadata_document, seed_collection
+from benchmarks.fakes import AsyncLocalQdrant, FakeAsyncOpenAI, FakeOpenAI
+from benchmarks.stats import git_revision, summarize_latencies
+from ingestion import IngestionEngine, openai_embedder
+from parent_chunks import ChunkingConfig, ingest_documents, parent_collection_name
+from prompt_assembly import PromptBudget, TokenCounter, chunks_from_points, select_context
+from rag_core import RagCore
+from rerank import RerankConfig
+
+
+def build_corpus(args):
+    """Metadata documents and handbooks for each institute, and fee queries about random handbooks"""
+    rng = random.Random(args.seed)
+    documents, queries = [], []
+    for institute in generate_institutes(args.institutes, args.seed):
+        documents.append(dict(metadata_document(institute, len(documents)), key=institute["code"]))
+        handbook, facts = handbook_document(institute, rng, args.branches)
+        documents.append(dict(handbook, id=len(documents)))
+        queries.extend({"query": f"What is the {fact['plan']} fee at the {fact['branch']} branch of "
+                                 f"{institute['name']}?", "answer": fact["answer"]} for fact in facts)
+    return documents, rng.sample(queries, min(args.queries, len(queries)))
+
+
+def whole_documents(documents, embed_texts, dim):
+    qdrant, report = seed_collection(documents, embed_texts, dim)
+    return qdrant, {"points": report.documents, "parents": 0}
+
+
+def hierarchical(documents, embed_texts, dim, config, counter):
+    qdrant = QdrantClient(":memory:")
+    qdrant.create_collection("Institutes", vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE))
+    engine = IngestionEngine(qdrant, embed_texts, embed_batch_size=256, upsert_batch_size=256)
+    report, stats = ingest_documents(qdrant, engine, documents, config, counter)
+    return qdrant, {"points": report.documents, "parents": stats["parents"]}
+
+
+async def evaluate(core, queries, top_k, counter, budget):
+    totals = {"precision_at_1": 0, "precision_at_k": 0, "hit_at_k": 0, "hit_in_prompt": 0, "context_tokens": 0,
+              "prompt_context_tokens": 0}
+    latencies = []
+    for record in queries:
+        start = time.perf_counter()
+        retrieval = await core.retrieve(record["query"], top_k)
+        latencies.append(time.perf_counter() - start)
+        contexts = chunks_from_points(retrieval.points)
+        relevant = [record["answer"] in context for context in contexts]
+        selected, report = select_context(contexts, budget.context_tokens, counter, budget.near_duplicate_threshold)
+        totals["precision_at_1"] += bool(relevant and relevant[0])
+        totals["precision_at_k"] += sum(relevant) / top_k
+        totals["hit_at_k"] += any(relevant)
+        totals["hit_in_prompt"] += any(record["answer"] in context for context in selected)
+        totals["context_tokens"] += sum(counter.count(context) for context in contexts)
+        totals["prompt_context_tokens"] += report["context_tokens"]
+    result = {name: value / len(queries) for name, value in totals.items()}
+    result["latency"] = summarize_latencies(latencies)
+    return result
+
+
+def main(args):
+    counter = TokenCounter("gpt-4o-mini")
+    config = ChunkingConfig(child_tokens=args.child_tokens, parent_tokens=args.parent_tokens,
+                            min_section_tokens=args.min_section_tokens)
+    documents, queries = build_corpus(args)
+    embed_texts = openai_embedder(FakeOpenAI(dim=args.dim))
+    rerank = RerankConfig(pool_size=args.rerank_pool) if args.rerank_pool else None
+
+    results = {}
+    for name, (qdrant, stats) in {
+        "whole": whole_documents(documents, embed_texts, args.dim),
+        "parent": hierarchical(documents, embed_texts, args.dim, config, counter),
+    }.items():
+        core = RagCore(FakeAsyncOpenAI(dim=args.dim), AsyncLocalQdrant(qdrant), rerank=rerank,
+                       parent_collection=parent_collection_name() if name == "parent" else None)
+        results[name] = dict(stats, **asyncio.run(evaluate(core, queries, args.top_k, counter, PromptBudget())))
+
+    print(f"{len(documents)} documents, {len(queries)} fee queries, top-{args.top_k}, "
+          f"children of {config.child_tokens} tokens, {'exact' if counter.exact else 'approximate'} token counts")
+    print(f"{'setup':<7} {'points':>7} {'parents':>8} {'P@1':>6} {'P@k':>6} {'hit@k':>6} {'in prompt':>10} "
+          f"{'ctx tokens':>11} {'prompt ctx':>11} {'p50 ms':>7}")
+    for name, result in results.items():
+        print(f"{name:<7} {result['points']:>7} {result['parents']:>8} {result['precision_at_1']:>6.3f} "
+              f"{result['precision_at_k']:>6.3f} {result['hit_at_k']:>6.3f} {result['hit_in_prompt']:>10.3f} "
+              f"{result['context_tokens']:>11.0f} {result['prompt_context_tokens']:>11.0f} "
+              f"{result['latency']['p50_ms']:>7.2f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"revision": git_revision(), "config": vars(args), "results": results}, f, indent=2)
+        print(f"report written to {args.output}")
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Parent-document retrieval vs whole-document indexing")
+    parser.add_argument("--institutes", type=int, default=200)
+    parser.add_argument("--branches", type=int, default=4, help="Handbook sections per institute")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--child-tokens", type=int, default=ChunkingConfig.child_tokens)
+    parser.add_argument("--parent-tokens", type=int, default=ChunkingConfig.parent_tokens)
+    parser.add_argument("--min-section-tokens", type=int, default=ChunkingConfig.min_section_tokens)
+    parser.add_argument("--rerank-pool", type=int, default=0, help="MMR candidate pool size (0 disables re-ranking)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,211 @@
+# ---------------------------
+# Offline RAG Pipeline Benchmark
+# ---------------------------
+# Seeds an in-memory Qdrant with a synthetic corpus (timing ingestion), then
+# replays a query workload through the same stages as ask_rag in app.py —
+# retrieve, prompt assembly, generation — against deterministic OpenAI
+# stand-ins at a configurable concurrency. Writes a machine-readable report.
+#
+#   python -m benchmarks.rag_pipeline --chunks 10000 --queries 500 --concurrency 16 \
+#       --embed-latency-ms 40 --chat-latency-ms 300 --output bench/baseline.json
+#   python -m benchmarks.compare bench/baseline.json bench/candidate.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+
+from answer_cache import SemanticAnswerCache
+from benchmarks.corpus import generate_documents, generate_queries, load_workload, seed_collection
+from benchmarks.fakes import AsyncLocalQdrant, FakeAsyncOpenAI, FakeOpenAI
+from benchmarks.stats import git_revision, peak_rss_mb, percentile, print_stage_table, summarize_latencies
+from institute_directory import InstituteDirectory
+from ingestion import openai_embedder
+from prompt_assembly import SYSTEM_INSTRUCTIONS, PromptBudget, TokenCounter, assemble_prompt, chunks_from_points
+from query_router import EntityRouter
+from rag_core import RagCore
+from rerank import RerankConfig
+from sparse_index import SparseIndex
+from vector_snapshot import LocalVectorIndex, export_snapshot
+
+
+def build_environment(args, workdir):
+    """Seed the corpus and wire a RagCore over fakes; returns (core, ingestion report, queries)"""
+    sync_openai = FakeOpenAI(dim=args.dim)
+    _, documents = generate_documents(args.chunks, seed=args.seed)
+    qdrant, ingestion = seed_collection(documents, openai_embedder(sync_openai), args.dim)
+
+    version_path = os.path.join(workdir, "institutes.version")
+    directory = InstituteDirectory(qdrant, version_path=version_path)
+    local_index = None
+    if args.local_index != "off":
+        root = os.path.join(workdir, "snapshots")
+        export_snapshot(qdrant, root=root, dtype=args.local_index, version_path=version_path)
+        local_index = LocalVectorIndex(qdrant, root=root, dtype=args.local_index, version_path=version_path)
+    core = RagCore(
+        FakeAsyncOpenAI(dim=args.dim, embed_ms=args.embed_latency_ms, chat_ms=args.chat_latency_ms,
+                        token_ms=args.token_latency_ms),
+        AsyncLocalQdrant(qdrant, latency_ms=args.qdrant_latency_ms),
+        directory=directory,
+        router=EntityRouter(directory) if args.router else None,
+        sparse_index=SparseIndex(qdrant, version_path=version_path) if args.mode != "dense" else None,
+        retrieval_mode=args.mode,
+        local_index=local_index,
+        rerank=RerankConfig(pool_size=args.rerank_pool, mmr_lambda=args.mmr_lambda) if args.rerank_pool else None,
+    )
+    if args.workload:
+        queries = load_workload(args.workload)
+    else:
+        queries = generate_queries(documents, args.queries, seed=args.seed + 1)
+    return core, ingestion, queries
+
+
+async def run_query(core, record, args, counter, answer_cache, samples):
+    """One ask_rag-equivalent RAG turn, timing each stage"""
+    start = time.perf_counter()
+    retrieval = await core.retrieve(record["query"], args.top_k)
+    retrieved = time.perf_counter()
+
+    if record.get("expected"):
+        samples["hits"].append(any((p.payload or {}).get("code") == record["expected"] for p in retrieval.points))
+
+    if answer_cache is not None and retrieval.query_vector is not None:
+        cached = answer_cache.lookup(retrieval.query_vector, retrieval.points)
+        if cached:
+            samples["retrieve"].append(retrieved - start)
+            samples["total"].append(time.perf_counter() - start)
+            samples["cache_hits"] += 1
+            return
+
+    messages, report = assemble_prompt(
+        SYSTEM_INSTRUCTIONS, chunks_from_points(retrieval.points), [], record["query"], counter, PromptBudget()
+    )
+    assembled = time.perf_counter()
+
+    if args.stream:
+        usage_info, parts = {}, []
+        async for delta in core.stream(messages, usage_info):
+            if not parts:
+                samples["ttft"].append(time.perf_counter() - start)
+            parts.append(delta)
+        answer = "".join(parts)
+    else:
+        answer, usage_info = await core.complete(messages)
+    generated = time.perf_counter()
+
+    if answer_cache is not None and retrieval.query_vector is not None:
+        answer_cache.store(retrieval.query_vector, retrieval.points, answer, usage_info)
+
+    samples["retrieve"].append(retrieved - start)
+    samples["assemble"].append(assembled - retrieved)
+    samples["generate"].append(generated - assembled)
+    samples["total"].append(generated - start)
+    samples["prompt_tokens"].append(usage_info["prompt_tokens"])
+    samples["context_tokens"].append(report["context_tokens"])
+
+
+async def replay(core, queries, args):
+    counter = TokenCounter("gpt-4o-mini")
+    answer_cache = SemanticAnswerCache(updates_path=os.devnull) if args.answer_cache else None
+    samples = {"retrieve": [], "assemble": [], "generate": [], "total": [], "ttft": [],
+               "prompt_tokens": [], "context_tokens": [], "hits": [], "cache_hits": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(record):
+        async with semaphore:
+            await run_query(core, record, args, counter, answer_cache, samples)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(record) for record in queries))
+    return samples, time.perf_counter() - start
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        rss_start = peak_rss_mb()
+        build_start = time.perf_counter()
+        core, ingestion, queries = build_environment(args, workdir)
+        build_seconds = time.perf_counter() - build_start
+        rss_seeded = peak_rss_mb()
+        samples, wall_seconds = asyncio.run(replay(core, queries, args))
+
+    stages = {stage: summarize_latencies(samples[stage])
+              for stage in ("retrieve", "assemble", "generate", "ttft", "total")}
+    prompt_tokens = samples["prompt_tokens"]
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "ingestion": {
+            "documents": ingestion.documents,
+            "seconds": ingestion.seconds,
+            "docs_per_sec": ingestion.docs_per_sec,
+            "setup_seconds": build_seconds,
+        },
+        "queries": len(queries),
+        "wall_seconds": wall_seconds,
+        "throughput_qps": len(queries) / wall_seconds if wall_seconds else 0.0,
+        "stages": stages,
+        "prompt_tokens": {
+            "mean": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else 0.0,
+            "p95": percentile(prompt_tokens, 95),
+        },
+        "context_tokens_mean": (sum(samples["context_tokens"]) / len(samples["context_tokens"])
+                                if samples["context_tokens"] else 0.0),
+        "recall_at_k": sum(samples["hits"]) / len(samples["hits"]) if samples["hits"] else None,
+        "answer_cache_hits": samples["cache_hits"],
+        "core": core.stats(),
+        "memory": {
+            "peak_rss_mb": peak_rss_mb(),
+            "seeding_rss_mb": rss_seeded - rss_start if rss_start is not None else None,
+        },
+    }
+
+    print(f"ingestion: {ingestion.documents} docs at {ingestion.docs_per_sec:,.0f} docs/sec")
+    print(f"replay: {len(queries)} queries at concurrency {args.concurrency}: "
+          f"{report['throughput_qps']:.1f} queries/sec")
+    print_stage_table(stages)
+    print(f"prompt tokens/query: mean {report['prompt_tokens']['mean']:.0f}, p95 {report['prompt_tokens']['p95']}")
+    if report["recall_at_k"] is not None:
+        print(f"recall@{args.top_k}: {report['recall_at_k']:.3f}")
+    if report["memory"]["peak_rss_mb"] is not None:
+        print(f"peak RSS: {report['memory']['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.output}")
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the RAG pipeline")
+    parser.add_argument("--chunks", type=int, default=1000, help="Synthetic corpus size (10 to 100k)")
+    parser.add_argument("--queries", type=int, default=200, help="Generated queries when no --workload is given")
+    parser.add_argument("--workload", help="JSONL of {\"query\"[, \"expected\"]} records to replay")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=("dense", "hybrid", "sparse"), default="hybrid")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=256, help="Embedding size of the stand-in embedder")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--qdrant-latency-ms", type=float, default=0.0)
+    parser.add_argument("--local-index", choices=("off", "float16", "int8"), default="off",
+                        help="Serve vector search from a local snapshot of the collection")
+    parser.add_argument("--rerank-pool", type=int, default=0, help="MMR candidate pool size (0 disables re-ranking)")
+    parser.add_argument("--mmr-lambda", type=float, default=0.7)
+    parser.add_argument("--stream", action="store_true", help="Generate with streaming and record TTFT")
+    parser.add_argument("--no-router", dest="router", action="store_false", help="Disable entity routing")
+    parser.add_argument("--answer-cache", action="store_true", help="Enable the semantic answer cache")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,132 @@
+# ---------------------------
+# Streamlit Rerun Benchmark
+# ---------------------------
+# Seeds the session store with one long chat (plus many other sessions) and
+# times reruns of app.py under Streamlit's AppTest, for growing history sizes,
+# with the render window on and off (RENDER_WINDOW = 0 renders everything).
+# OpenAI and Qdrant are replaced by the offline stand-ins; no request is sent,
+# and st.user is faked so the app opens the seeded owner's stored chats.
+#
+#   python -m benchmarks.render --histories 10 100 1000 --sessions 200 --windows 20 0
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import openai
+import qdrant_client
+import streamlit
+from qdrant_client import models
+
+from benchmarks.fakes import AsyncLocalQdrant, FakeAsyncOpenAI, FakeOpenAI
+from benchmarks.stats import git_revision, summarize_latencies
+from session_store import SQLiteSessionStore, identity_owner
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def patch_clients(dim=256):
+    """Make app.py's client constructors return the offline stand-ins"""
+    local = qdrant_client.QdrantClient(":memory:")
+    local.create_collection("Institutes", vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE))
+    openai.OpenAI = lambda *args, **kwargs: FakeOpenAI(dim=dim)
+    openai.AsyncOpenAI = lambda *args, **kwargs: FakeAsyncOpenAI(dim=dim)
+    qdrant_client.QdrantClient = lambda *args, **kwargs: local
+    qdrant_client.AsyncQdrantClient = lambda *args, **kwargs: AsyncLocalQdrant(local)
+
+
+def sign_in(identity):
+    """Make st.user report a signed-in user, so app.py opens the persistent store under identity's owner"""
+    streamlit.user = {"is_logged_in": True, "sub": identity}
+
+
+def seed_owner(store, owner, history, sessions):
+    """One chat with `history` messages, created last so it opens first, after sessions - 1 short ones"""
+    for _ in range(sessions - 1):
+        session = store.create_session(owner)
+        store.append_message(session["id"], {"role": "user", "content": "What are the timings at Athayog?"})
+    session = store.create_session(owner)
+    usage = {"prompt_tokens": 900, "completion_tokens": 120, "total_tokens": 1020,
+             "budget": {"context_tokens": 600, "context_budget": 1500, "chunks_used": 4, "duplicates_removed": 0,
+                        "history_tokens": 400, "history_budget": 1200, "history_messages": 6}}
+    for i in range(history // 2):
+        store.append_message(session["id"], {"role": "user", "content": f"Question {i}: what are the **Hatha** timings?"})
+        store.append_message(session["id"], {
+            "role": "assistant",
+            "content": f"Answer {i}:\n\n- Hatha Yoga: Mon/Wed/Fri 7:00-8:00\n- Group Classes: Rs 3,000 per month",
+            "usage": usage,
+            "cost": {"total_cost": 0.0002},
+            "ttft": 0.4,
+        })
+    # Long chats are folded into the rolling summary, so only the recent turns are loaded
+    store.update_memory(session["id"], {"summary": "Earlier questions about Hatha timings.",
+                                        "summarized_count": max(0, history - 6), "summary_calls": 1,
+                                        "summary_tokens": 0, "summary_cost": 0.0})
+
+
+def time_reruns(db_path, identity, window, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    app.secrets["OPENAI_API_KEY"] = "offline"
+    app.secrets["QDRANT_URL"] = "http://offline"
+    app.secrets["QDRANT_API_KEY"] = "offline"
+    app.secrets["SESSION_DB_PATH"] = db_path
+    app.secrets["RENDER_WINDOW"] = window
+    app.secrets["TELEMETRY_ENABLED"] = False
+    sign_in(identity)
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception)
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - start)
+    return samples, len(app.chat_message)
+
+
+def expected_messages(history, window):
+    """Messages of the seeded chat the app should render"""
+    return min(history, window) if window else history
+
+
+def main(args):
+    patch_clients()
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "sessions.sqlite3")
+    # app.py keeps one store per process, so every configuration shares the file under its own owner
+    store = SQLiteSessionStore(db_path)
+    results = []
+    print(f"{'history':>8} {'window':>7} {'rendered':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for history in args.histories:
+        identity = f"bench-{history}"
+        seed_owner(store, identity_owner(identity), history, args.sessions)
+        for window in args.windows:
+            samples, rendered = time_reruns(db_path, identity, window, args.reruns)
+            # An empty chat here means the app opened another owner's sessions and timed nothing
+            if rendered != expected_messages(history, window):
+                raise RuntimeError(f"rendered {rendered} messages of a {history}-message history "
+                                   f"(window {window or 'all'})")
+            summary = summarize_latencies(samples)
+            results.append({"history": history, "sessions": args.sessions, "window": window,
+                            "rendered_messages": rendered, **summary})
+            print(f"{history:>8} {window or 'all':>7} {rendered:>9} {summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"revision": git_revision(), "config": vars(args), "results": results}, f, indent=2)
+        print(f"report written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rerun time of app.py versus chat history size")
+    parser.add_argument("--histories", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--sessions", type=int, default=100, help="Sessions in the sidebar list")
+    parser.add_argument("--windows", type=int, nargs="+", default=[20, 0], help="RENDER_WINDOW values; 0 renders all")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--output", help="Write the JSON report here")
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+# ---------------------------
+# MMR Re-ranking Micro-benchmark
+# ---------------------------
+# Times rerank_points (building the candidate matrix from the ScoredPoints'
+# vector prefixes, the pairwise similarities and the greedy MMR selection) for each candidate pool
+# size and embedding size, on pools where every candidate has near-copies,
+# and counts how many distinct documents end up in the top-k with and
+# without re-ranking.
+#
+#   python -m benchmarks.rerank --pools 8 12 16 32 64 --dims 256 512 1536 --output bench/rerank.json
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from qdrant_client import models
+
+from benchmarks.stats import git_revision, summarize_latencies
+from rerank import RerankConfig, rerank_points
+
+
+def candidate_pool(size, dim, copies, rng):
+    """ScoredPoints sorted by score: size // copies documents, each returned `copies` times with tiny noise"""
+    query = rng.standard_normal(dim).astype(np.float32)
+    documents = max(1, size // copies)
+    bases = rng.standard_normal((documents, dim)).astype(np.float32) + 0.3 * query
+    points = []
+    for i in range(size):
+        vector = bases[i % documents] + 0.01 * rng.standard_normal(dim).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        points.append(models.ScoredPoint(id=i, version=0, score=float(vector @ query / np.linalg.norm(query)),
+                                         payload={"document": i % documents}, vector=vector.tolist()))
+    points.sort(key=lambda point: point.score, reverse=True)
+    return points
+
+
+def distinct(points):
+    return len({point.payload["document"] for point in points})
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    config = RerankConfig(mmr_lambda=args.mmr_lambda, similarity_dimensions=args.similarity_dims)
+    results = []
+    for dim in args.dims:
+        for pool in args.pools:
+            pools = [candidate_pool(pool, dim, args.copies, rng) for _ in range(20)]
+            for points in pools[:3]:
+                rerank_points(points, args.top_k, config)  # warm up
+            samples, plain, reranked = [], 0, 0
+            for i in range(args.iterations):
+                points = pools[i % len(pools)]
+                start = time.perf_counter()
+                chosen = rerank_points(points, args.top_k, config)
+                samples.append(time.perf_counter() - start)
+                plain += distinct(points[:args.top_k])
+                reranked += distinct(chosen)
+            results.append({
+                "dim": dim,
+                "pool": pool,
+                "latency": summarize_latencies(samples),
+                "distinct_plain": plain / args.iterations,
+                "distinct_mmr": reranked / args.iterations,
+            })
+
+    print(f"top-{args.top_k}, lambda {args.mmr_lambda}, {args.similarity_dims or 'all'} dimensions compared, "
+          f"{args.copies} near-copies per document")
+    print(f"{'dim':>5} {'pool':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'distinct plain':>15} {'distinct MMR':>13}")
+    for result in results:
+        latency = result["latency"]
+        print(f"{result['dim']:>5} {result['pool']:>5} {latency['p50_ms']:>8.3f} {latency['p95_ms']:>8.3f} "
+              f"{latency['p99_ms']:>8.3f} {result['distinct_plain']:>15.2f} {result['distinct_mmr']:>13.2f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"revision": git_revision(), "config": vars(args), "results": results}, f, indent=2)
+        print(f"report written to {args.output}")
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Latency and diversity of MMR re-ranking")
+    parser.add_argument("--pools", type=int, nargs="+", default=[8, 12, 16, 32, 64])
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1536])
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--mmr-lambda", type=float, default=0.7)
+    parser.add_argument("--similarity-dims", type=int, default=RerankConfig.similarity_dimensions,
+                        help="Leading dimensions compared (0 for whole vectors)")
+    parser.add_argument("--copies", type=int, default=3, help="Near-identical copies of each candidate document")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,226 @@
+# ---------------------------
+# Shared Client Factory and Startup Warm-up
+# ---------------------------
+# app.py, inference.py and add_institute_metadata.py build their OpenAI and
+# Qdrant clients here, with one connection pool policy: enough keep-alive
+# connections for concurrent sessions or batches, and an idle expiry long
+# enough that a quiet minute does not cost a new TLS handshake (httpx drops
+# idle connections after 5 s by default). Qdrant can opt into gRPC.
+# The OpenAI clients are wrapped in the shared admission controller, so every
+# entry point draws from the same request and token budgets.
+# warm_up() opens those connections and primes caches before the first
+# request, and records every step in a cold-start report.
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from admission import DEFAULT_ADMISSION_PATH, INTERACTIVE, AdmissionController, AdmittedOpenAI, Limits
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+# Looked up (not used) by the warm-up to open the OpenAI connection
+WARM_UP_MODEL = "text-embedding-3-small"
+
+
+def flag_value(values, key, default=False):
+    """On/off setting of a mapping; strings such as "false" or "0" count as off, like a TOML boolean"""
+    return str(values.get(key, default)).lower() in TRUE_VALUES
+
+
+@dataclass
+class ClientConfig:
+    """Credentials and transport settings shared by every entry point"""
+    openai_api_key: str = None
+    qdrant_url: str = None
+    qdrant_api_key: str = None
+    # Qdrant over gRPC (port 6334): lower per-request overhead for searches and bulk upserts
+    prefer_grpc: bool = False
+    max_connections: int = 32
+    max_keepalive_connections: int = 16
+    keepalive_expiry: float = 120.0
+    qdrant_timeout: int = 30
+    # Provider limits (defaults: usage tier 1 for gpt-4o-mini and text-embedding-3-small)
+    admission: bool = True
+    chat_rpm: float = 500
+    chat_tpm: float = 200_000
+    embedding_rpm: float = 3000
+    embedding_tpm: float = 1_000_000
+    # Interactive requests that would queue longer than this are rejected at once
+    admission_max_wait: float = 10.0
+    admission_max_queue: int = 64
+    admission_path: str = DEFAULT_ADMISSION_PATH
+
+    @classmethod
+    def from_mapping(cls, values):
+        """Read settings from st.secrets, os.environ or any mapping with the same key names"""
+        return cls(
+            openai_api_key=values.get("OPENAI_API_KEY"),
+            qdrant_url=values.get("QDRANT_URL"),
+            qdrant_api_key=values.get("QDRANT_API_KEY"),
+            prefer_grpc=flag_value(values, "QDRANT_PREFER_GRPC"),
+            max_connections=int(values.get("HTTP_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive_connections=int(values.get("HTTP_MAX_KEEPALIVE", cls.max_keepalive_connections)),
+            keepalive_expiry=float(values.get("HTTP_KEEPALIVE_SECONDS", cls.keepalive_expiry)),
+            admission=flag_value(values, "ADMISSION_ENABLED", True),
+            chat_rpm=float(values.get("OPENAI_CHAT_RPM", cls.chat_rpm)),
+            chat_tpm=float(values.get("OPENAI_CHAT_TPM", cls.chat_tpm)),
+            embedding_rpm=float(values.get("OPENAI_EMBEDDING_RPM", cls.embedding_rpm)),
+            embedding_tpm=float(values.get("OPENAI_EMBEDDING_TPM", cls.embedding_tpm)),
+            admission_max_wait=float(values.get("ADMISSION_MAX_WAIT", cls.admission_max_wait)),
+            admission_max_queue=int(values.get("ADMISSION_MAX_QUEUE", cls.admission_max_queue)),
+        )
+
+    @classmethod
+    def from_env(cls):
+        """Settings from the environment, after loading .env"""
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        return cls.from_mapping(os.environ)
+
+    def is_complete(self):
+        return bool(self.openai_api_key and self.qdrant_url and self.qdrant_api_key)
+
+    def limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def qdrant_kwargs(self):
+        kwargs = {"url": self.qdrant_url, "api_key": self.qdrant_api_key, "timeout": self.qdrant_timeout,
+                  "prefer_grpc": self.prefer_grpc}
+        if self.prefer_grpc:
+            # Keep the HTTP/2 channel alive across idle periods instead of reconnecting
+            kwargs["grpc_options"] = {
+                "grpc.keepalive_time_ms": 30_000,
+                "grpc.keepalive_timeout_ms": 10_000,
+                "grpc.keepalive_permit_without_calls": 1,
+            }
+        else:
+            kwargs["limits"] = self.limits()
+        return kwargs
+
+    def admission_controller(self):
+        """The admission controller for these limits, or None when admission is off"""
+        if not self.admission:
+            return None
+        return AdmissionController(
+            {"chat": Limits(self.chat_rpm, self.chat_tpm), "embeddings": Limits(self.embedding_rpm, self.embedding_tpm)},
+            path=self.admission_path,
+            max_wait=self.admission_max_wait,
+            max_queue=self.admission_max_queue,
+        )
+
+
+def create_clients(config, sync_clients=True, async_clients=True, priority=INTERACTIVE):
+    """Build the pooled clients; returns a namespace with openai, qdrant, async_openai, async_qdrant
+    (None for the kinds not requested) and admission.
+
+    priority is "interactive" for the app and "background" for ingestion and bulk
+    runs, which queue behind live chat and leave it a reserve of every limit.
+    """
+    clients = SimpleNamespace(openai=None, qdrant=None, async_openai=None, async_qdrant=None, config=config,
+                              admission=config.admission_controller())
+
+    def admitted(client, is_async=False):
+        if clients.admission is None:
+            return client
+        return AdmittedOpenAI(client, clients.admission, priority, is_async)
+
+    if sync_clients:
+        clients.openai = admitted(
+            OpenAI(api_key=config.openai_api_key, http_client=DefaultHttpxClient(limits=config.limits()))
+        )
+        clients.qdrant = QdrantClient(**config.qdrant_kwargs())
+    if async_clients:
+        # Async pools belong to the event loop that first uses them (the RAG core's)
+        clients.async_openai = admitted(AsyncOpenAI(
+            api_key=config.openai_api_key, http_client=DefaultAsyncHttpxClient(limits=config.limits())
+        ), is_async=True)
+        clients.async_qdrant = AsyncQdrantClient(**config.qdrant_kwargs())
+    return clients
+
+
+class StartupReport:
+    """Wall time of each cold-start step; a failed step is recorded and skipped, never raised"""
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.steps = {}
+        self.errors = {}
+        self.finished_at = None
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+        finally:
+            self.steps[name] = time.perf_counter() - start
+
+    def record(self, name, seconds):
+        self.steps[name] = seconds
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+        return self
+
+    @property
+    def total_seconds(self):
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def as_dict(self):
+        return {"total_seconds": self.total_seconds, "steps": dict(self.steps), "errors": dict(self.errors)}
+
+    def format(self):
+        """Multi-line, human-readable report"""
+        lines = [f"Cold start: {self.total_seconds:.2f}s"]
+        for name, seconds in self.steps.items():
+            failed = f" (failed: {self.errors[name]})" if name in self.errors else ""
+            lines.append(f"  {name:<24} {seconds * 1000:8.0f} ms{failed}")
+        return "\n".join(lines)
+
+
+def warm_up(clients, report=None, collection_name="Institutes", run_async=None, primers=()):
+    """Open every client's connections and run cache primers before the first request.
+
+    run_async(coro) runs a coroutine on the loop that owns the async clients (e.g.
+    BackgroundLoop.run); primers are (name, fn) pairs such as loading the institute
+    directory. Returns the finished report.
+    """
+    report = report or StartupReport()
+    if clients.qdrant is not None:
+        with report.step("qdrant_connect"):
+            clients.qdrant.get_collection(collection_name)
+    if clients.openai is not None:
+        # Model lookups are free: they only pay for DNS, TCP and TLS
+        with report.step("openai_connect"):
+            clients.openai.models.retrieve(WARM_UP_MODEL)
+    if run_async is not None:
+        run_async(warm_up_async(clients, report, collection_name))
+    for name, prime in primers:
+        with report.step(name):
+            prime()
+    return report.finish()
+
+
+async def warm_up_async(clients, report=None, collection_name="Institutes"):
+    """Open the async clients' connections from the event loop that will use them"""
+    report = report or StartupReport()
+    if clients.async_qdrant is not None:
+        with report.step("async_qdrant_connect"):
+            await clients.async_qdrant.get_collection(collection_name)
+    if clients.async_openai is not None:
+        with report.step("async_openai_connect"):
+            await clients.async_openai.models.retrieve(WARM_UP_MODEL)
+    return report
@@ -0,0 +1,398 @@
+# ---------------------------
+# Collection Profiles: Embedding Size, Quantization and Storage
+# ---------------------------
+# A profile fixes how the Institutes collection stores its vectors: the
+# embedding size requested from the API (`dimensions`), int8 scalar or binary
+# quantization (searched with oversampling and full-precision rescoring), HNSW
+# parameters, and whether vectors and payloads live on disk. The collection's
+# own config is the source of truth at runtime: CollectionSettings reads its
+# vector size and quantization, so queries and ingestion always embed at the
+# dimension the collection expects, and re-reads them after a migration.
+#
+#   python collection_profiles.py describe
+#   python collection_profiles.py create --profile compact
+#   python collection_profiles.py migrate --profile compact --replace
+#   python collection_profiles.py evaluate --profiles full int8 compact binary --output profiles.json
+import argparse
+import json
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from qdrant_client import models
+
+from institute_directory import DIRECTORY_VERSION_PATH, bump_directory_version, read_directory_version
+from query_router import ensure_payload_indexes
+
+# Native size of text-embedding-3-small; smaller sizes are requested with `dimensions`
+FULL_DIMENSIONS = 1536
+
+# Candidates fetched from the quantized index per result before rescoring with the original vectors
+OVERSAMPLING = {"int8": 2.0, "binary": 3.0}
+
+
+@dataclass
+class CollectionProfile:
+    name: str
+    dimensions: int = FULL_DIMENSIONS
+    quantization: str = None  # None, "int8" or "binary"
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    # Full-precision vectors and payloads on disk; quantized vectors and the HNSW graph stay in RAM
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+
+    def quantization_config(self):
+        if self.quantization == "int8":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True))
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def estimate_memory(self, points):
+        """Approximate RAM and disk bytes of the vectors and the HNSW graph"""
+        full = points * self.dimensions * 4
+        quantized = {"int8": points * self.dimensions, "binary": points * self.dimensions // 8}.get(self.quantization, 0)
+        graph = points * self.hnsw_m * 2 * 4
+        ram = quantized + graph + (0 if self.on_disk_vectors else full)
+        return {"ram_bytes": ram, "disk_bytes": full if self.on_disk_vectors else 0}
+
+
+PROFILES = {
+    # Today's collection: full-size float32 vectors in RAM
+    "full": CollectionProfile("full"),
+    "int8": CollectionProfile("int8", quantization="int8", on_disk_vectors=True),
+    "compact": CollectionProfile("compact", dimensions=512, quantization="int8", on_disk_vectors=True,
+                                 on_disk_payload=True),
+    "binary": CollectionProfile("binary", quantization="binary", on_disk_vectors=True),
+    "tiny": CollectionProfile("tiny", dimensions=256, quantization="int8", hnsw_m=8, on_disk_vectors=True,
+                              on_disk_payload=True),
+}
+
+
+def truncate_embedding(vector, dimensions):
+    """Shorten a text-embedding-3 vector the way the API's `dimensions` parameter does: cut and renormalize"""
+    vector = np.asarray(vector[:dimensions], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def collection_settings(info):
+    """Embedding dimensions (None for the native size) and search params from a get_collection() result"""
+    vectors = info.config.params.vectors
+    size = vectors.size if isinstance(vectors, models.VectorParams) else None
+    quantization_config = (getattr(vectors, "quantization_config", None)
+                           or getattr(info.config, "quantization_config", None))
+    quantization = None
+    if isinstance(quantization_config, models.ScalarQuantization):
+        quantization = "int8"
+    elif isinstance(quantization_config, models.BinaryQuantization):
+        quantization = "binary"
+    search_params = None
+    if quantization:
+        search_params = models.SearchParams(quantization=models.QuantizationSearchParams(
+            rescore=True, oversampling=OVERSAMPLING[quantization]))
+    return {
+        "size": size,
+        "dimensions": size if size and size != FULL_DIMENSIONS else None,
+        "quantization": quantization,
+        "search_params": search_params,
+    }
+
+
+DEFAULT_SETTINGS = {"size": None, "dimensions": None, "quantization": None, "search_params": None}
+
+
+class CollectionSettings:
+    """Live settings of a collection, re-read when ingestion or a migration bumps the directory version"""
+
+    def __init__(self, qdrant, collection_name="Institutes", version_path=DIRECTORY_VERSION_PATH,
+                 check_interval=5.0):
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.version_path = version_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._settings = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def current(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._settings is None or now - self._checked_at > self.check_interval:
+                self._checked_at = now
+                version = read_directory_version(self.version_path)
+                if self._settings is None or version != self._version:
+                    try:
+                        self._settings = collection_settings(self.qdrant.get_collection(self.collection_name))
+                    except Exception:
+                        # Keep the last known settings; before the first read, embed at the native size
+                        self._settings = self._settings or dict(DEFAULT_SETTINGS)
+                    self._version = version
+            return self._settings
+
+
+def create_collection(qdrant, profile, collection_name="Institutes"):
+    """Create an empty collection laid out by the profile, with the routed payload indexes"""
+    qdrant.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=profile.dimensions, distance=models.Distance.COSINE,
+                                           on_disk=profile.on_disk_vectors),
+        hnsw_config=models.HnswConfigDiff(m=profile.hnsw_m, ef_construct=profile.hnsw_ef_construct),
+        quantization_config=profile.quantization_config(),
+        on_disk_payload=profile.on_disk_payload,
+    )
+    ensure_payload_indexes(qdrant, collection_name)
+
+
+def alias_target(qdrant, alias_name):
+    """The collection an alias points to, or None if alias_name is not an alias"""
+    for alias in qdrant.get_aliases().aliases:
+        if alias.alias_name == alias_name:
+            return alias.collection_name
+    return None
+
+
+def copy_points(qdrant, source, target, dimensions, embed_texts=None, batch_size=256):
+    """Copy every point of source into target at the target size; returns the number copied.
+
+    Longer vectors are truncated (no API calls); shorter ones are re-embedded
+    from their "content" payload with embed_texts.
+    """
+    copied, offset = 0, None
+    while True:
+        points, offset = qdrant.scroll(collection_name=source, limit=batch_size, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        if points:
+            short = [point for point in points if len(point.vector) < dimensions]
+            if short and embed_texts is None:
+                raise ValueError(f"{source} has {len(short[0].vector)}-dimension vectors; "
+                                 f"re-embedding to {dimensions} needs an embedder")
+            fresh = dict(zip((point.id for point in short),
+                             embed_texts([(point.payload or {}).get("content", "") for point in short]) if short else []))
+            qdrant.upsert(collection_name=target, wait=True, points=[
+                models.PointStruct(id=point.id, payload=point.payload,
+                                   vector=fresh.get(point.id) or truncate_embedding(point.vector, dimensions))
+                for point in points
+            ])
+            copied += len(points)
+        if offset is None:
+            return copied
+
+
+def migrate_collection(qdrant, profile, collection_name="Institutes", embed_texts=None, replace=False,
+                       batch_size=256):
+    """Copy collection_name into a new collection laid out by profile and point the name at it.
+
+    collection_name becomes an alias of the new collection. If it is still a real
+    collection, it is only deleted (and aliased) with replace=True. The previous
+    collection behind an alias is kept for rollback.
+    """
+    start = time.perf_counter()
+    target = f"{collection_name}_{profile.name}_{int(time.time() * 1000)}"
+    create_collection(qdrant, profile, target)
+    copied = copy_points(qdrant, collection_name, target, profile.dimensions, embed_texts, batch_size)
+
+    previous = alias_target(qdrant, collection_name)
+    swapped = True
+    if previous is not None:
+        # Atomic switch: readers see either the old or the new collection
+        qdrant.update_collection_aliases(change_aliases_operations=[
+            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=collection_name)),
+            models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target,
+                                                                        alias_name=collection_name)),
+        ])
+    elif replace:
+        qdrant.delete_collection(collection_name)
+        qdrant.update_collection_aliases(change_aliases_operations=[
+            models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target,
+                                                                        alias_name=collection_name)),
+        ])
+    else:
+        swapped = False
+    if swapped:
+        # Running apps re-read the vector size and reload their directory, indexes and snapshots
+        bump_directory_version()
+    return {"target": target, "points": copied, "swapped": swapped, "previous": previous,
+            "seconds": time.perf_counter() - start}
+
+
+# ---------------------------
+# Profile Evaluation
+# ---------------------------
+def load_source(qdrant, collection_name, batch_size=256):
+    """All point ids, full-size vectors and payloads of the source collection"""
+    ids, vectors, payloads, offset = [], [], [], None
+    while True:
+        points, offset = qdrant.scroll(collection_name=collection_name, limit=batch_size, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        for point in points:
+            ids.append(point.id)
+            vectors.append(point.vector)
+            payloads.append(point.payload or {})
+        if offset is None:
+            return ids, vectors, payloads
+
+
+def evaluate_profile(qdrant, profile, source, query_vectors, queries, baseline, top_k, collection_name):
+    """Load the source into a scratch collection laid out by profile and measure search quality and speed"""
+    from evaluate_retrieval import is_hit, percentile
+
+    ids, vectors, payloads = source
+    scratch = f"{collection_name}_eval_{profile.name}"
+    if qdrant.collection_exists(scratch):
+        qdrant.delete_collection(scratch)
+    create_collection(qdrant, profile, scratch)
+    try:
+        load_start = time.perf_counter()
+        for start in range(0, len(ids), 256):
+            qdrant.upsert(collection_name=scratch, wait=True, points=[
+                models.PointStruct(id=ids[i], vector=truncate_embedding(vectors[i], profile.dimensions),
+                                   payload=payloads[i])
+                for i in range(start, min(start + 256, len(ids)))
+            ])
+        load_seconds = time.perf_counter() - load_start
+        search_params = collection_settings(qdrant.get_collection(scratch))["search_params"]
+
+        latencies, overlap, hits = [], 0, 0
+        for vector, record, expected_ids in zip(query_vectors, queries, baseline):
+            query = truncate_embedding(vector, profile.dimensions)
+            search_start = time.perf_counter()
+            points = qdrant.query_points(collection_name=scratch, query=query, limit=top_k,
+                                         search_params=search_params, with_payload=True).points
+            latencies.append(time.perf_counter() - search_start)
+            overlap += len({point.id for point in points} & expected_ids)
+            if record.get("expected"):
+                hits += is_hit(points, record["expected"])
+        labelled = sum(1 for record in queries if record.get("expected"))
+        memory = profile.estimate_memory(len(ids))
+        return {
+            "dimensions": profile.dimensions,
+            "quantization": profile.quantization,
+            # Agreement with exact full-size search: what the profile gives up
+            "recall_vs_exact": overlap / (len(queries) * top_k) if queries else 0.0,
+            "hit_rate": hits / labelled if labelled else None,
+            "latency_p50_ms": percentile(latencies, 50) * 1000,
+            "latency_p95_ms": percentile(latencies, 95) * 1000,
+            "load_seconds": load_seconds,
+            "ram_mb": memory["ram_bytes"] / 1e6,
+            "disk_mb": memory["disk_bytes"] / 1e6,
+        }
+    finally:
+        qdrant.delete_collection(scratch)
+
+
+def evaluate_profiles(qdrant, profiles, queries, embed_queries, top_k=4, collection_name="Institutes"):
+    """Compare profiles on the source collection's data; returns {profile name: result}"""
+    source = load_source(qdrant, collection_name)
+    query_vectors = embed_queries([record["query"] for record in queries])
+    baseline = [
+        {point.id for point in qdrant.query_points(collection_name=collection_name, query=vector, limit=top_k,
+                                                   search_params=models.SearchParams(exact=True)).points}
+        for vector in query_vectors
+    ]
+    return {
+        profile.name: evaluate_profile(qdrant, profile, source, query_vectors, queries, baseline, top_k,
+                                       collection_name)
+        for profile in profiles
+    }
+
+
+def print_evaluation(points, results, top_k):
+    print(f"{points} points, top-{top_k}")
+    print(f"{'profile':<9} {'dims':>5} {'quant':>7} {'recall':>7} {'hits':>6} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'RAM MB':>8} {'disk MB':>8}")
+    for name, result in results.items():
+        hits = f"{result['hit_rate']:.3f}" if result["hit_rate"] is not None else "-"
+        print(f"{name:<9} {result['dimensions']:>5} {result['quantization'] or '-':>7} "
+              f"{result['recall_vs_exact']:>7.3f} {hits:>6} {result['latency_p50_ms']:>8.2f} "
+              f"{result['latency_p95_ms']:>8.2f} {result['ram_mb']:>8.2f} {result['disk_mb']:>8.2f}")
+
+
+def offline_environment(chunks, dim=FULL_DIMENSIONS):
+    """Synthetic corpus in a local collection with hashed embeddings (quantization and HNSW are not
+    simulated locally, so only recall and the memory estimates are meaningful)"""
+    from benchmarks.corpus import generate_documents, generate_queries, seed_collection
+    from benchmarks.fakes import hash_embedding
+
+    def embed_texts(texts):
+        return [hash_embedding(text, dim) for text in texts]
+
+    _, documents = generate_documents(chunks)
+    qdrant, _ = seed_collection(documents, embed_texts, dim)
+    return qdrant, embed_texts, list(generate_queries(documents, 200))
+
+
+def main(args):
+    if args.command == "evaluate" and args.offline:
+        qdrant, embed_texts, queries = offline_environment(args.chunks)
+    else:
+        from admission import BACKGROUND
+        from clients import ClientConfig, create_clients
+        from ingestion import openai_embedder
+
+        clients = create_clients(ClientConfig.from_env(), async_clients=False, priority=BACKGROUND)
+        qdrant = clients.qdrant
+        embed_texts = openai_embedder(clients.openai)
+
+    if args.command == "describe":
+        info = qdrant.get_collection(args.collection)
+        settings = collection_settings(info)
+        print(f"{args.collection}: {info.points_count} points, {settings['size']} dimensions, "
+              f"quantization {settings['quantization'] or 'none'}, on-disk vectors "
+              f"{bool(getattr(info.config.params.vectors, 'on_disk', False))}, "
+              f"on-disk payload {bool(info.config.params.on_disk_payload)}")
+        if alias_target(qdrant, args.collection):
+            print(f"alias of {alias_target(qdrant, args.collection)}")
+    elif args.command == "create":
+        create_collection(qdrant, PROFILES[args.profile], args.collection)
+        print(f"✅ Created {args.collection} with the {args.profile} profile")
+    elif args.command == "migrate":
+        profile = PROFILES[args.profile]
+        report = migrate_collection(qdrant, profile, args.collection,
+                                    embed_texts=openai_embedder(clients.openai, dimensions=profile.dimensions),
+                                    replace=args.replace)
+        print(f"✅ Copied {report['points']} points into {report['target']} in {report['seconds']:.1f}s")
+        if report["swapped"]:
+            print(f"{args.collection} now points to {report['target']}"
+                  + (f" (previous: {report['previous']})" if report["previous"] else ""))
+        else:
+            print(f"{args.collection} is a collection, not an alias; rerun with --replace to delete it "
+                  f"and alias {args.collection} to {report['target']}")
+    else:
+        if not args.offline:
+            from evaluate_retrieval import generated_queries, load_queries
+            from institute_directory import InstituteDirectory
+
+            queries = (load_queries(args.queries) if args.queries
+                       else list(generated_queries(InstituteDirectory(qdrant, args.collection).list())))
+        results = evaluate_profiles(qdrant, [PROFILES[name] for name in args.profiles], queries, embed_texts,
+                                    args.top_k, args.collection)
+        print_evaluation(qdrant.count(args.collection).count, results, args.top_k)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"top_k": args.top_k, "queries": len(queries), "profiles": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create, migrate and compare collection profiles")
+    parser.add_argument("--collection", default="Institutes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("describe", help="Show the collection's vector size, quantization and storage")
+    create = commands.add_parser("create", help="Create an empty collection from a profile")
+    create.add_argument("--profile", choices=PROFILES, default="full")
+    migrate = commands.add_parser("migrate", help="Copy the collection into a new profile and switch to it")
+    migrate.add_argument("--profile", choices=PROFILES, required=True)
+    migrate.add_argument("--replace", action="store_true",
+                         help="Delete a real (non-alias) collection after copying and alias its name")
+    evaluate = commands.add_parser("evaluate", help="Recall, latency and memory of each profile on this data")
+    evaluate.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    evaluate.add_argument("--queries", help="JSONL of {\"query\", \"expected\"}; generated from payloads if omitted")
+    evaluate.add_argument("--top-k", type=int, default=4)
+    evaluate.add_argument("--offline", action="store_true", help="Synthetic corpus in a local collection")
+    evaluate.add_argument("--chunks", type=int, default=2000, help="Synthetic corpus size with --offline")
+    evaluate.add_argument("--output", help="Write the report as JSON")
+    main(parser.parse_args())
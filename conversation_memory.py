@@ -0,0 +1,91 @@
+# ---------------------------
+# Rolling Conversation Summary
+# ---------------------------
+# Keeps the most recent turns of a session verbatim and folds older turns into
+# a rolling summary. The summary is only updated, in the background, once the
+# unsummarized older turns cross a token threshold. State lives on the session
+# under "memory"; history may be a window of the session's messages starting at
+# message index `offset`, as long as it reaches back to the summarized point.
+import asyncio
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of a conversation between a user and a yoga institute assistant.
+Merge the new messages into the current summary. Keep institute names, codes, locations, prices, schedules, the user's preferences and any open questions. Drop greetings and small talk.
+Reply with the updated summary only, in under 150 words."""
+
+
+def new_memory_state():
+    """Fresh memory state for a session"""
+    return {
+        "summary": "",
+        "summarized_count": 0,  # messages[:summarized_count] are folded into the summary
+        "pending": False,
+        "summary_calls": 0,
+        "summary_tokens": 0,
+        "summary_cost": 0.0,
+    }
+
+
+class ConversationMemory:
+    """Decides when to fold old turns into the summary and runs the update on the core's loop"""
+
+    def __init__(self, rag_core, background_loop, counter, recent_tokens=500,
+                 fold_threshold_tokens=600, cost_fn=None):
+        self.rag_core = rag_core
+        self.background_loop = background_loop
+        self.counter = counter
+        self.recent_tokens = recent_tokens
+        self.fold_threshold_tokens = fold_threshold_tokens
+        self.cost_fn = cost_fn
+
+    def prompt_inputs(self, state, history, offset=0):
+        """Return (summary, messages not yet folded into it) for prompt assembly"""
+        return state["summary"], history[max(0, state["summarized_count"] - offset):]
+
+    def _fold_end(self, history):
+        """Index where the verbatim recent window starts"""
+        used = 0
+        for index in range(len(history) - 1, -1, -1):
+            used += self.counter.count_message(history[index])
+            if used > self.recent_tokens:
+                return index + 1
+        return 0
+
+    def maybe_summarize(self, state, history, offset=0, on_update=None):
+        """Schedule a background summary update if enough old turns have piled up; returns True if scheduled.
+
+        on_update(state) runs after the summary has been updated, e.g. to persist it.
+        """
+        if state["pending"]:
+            return False
+        start, end = max(0, state["summarized_count"] - offset), self._fold_end(history)
+        to_fold = history[start:end]
+        if not to_fold or sum(self.counter.count_message(m) for m in to_fold) < self.fold_threshold_tokens:
+            return False
+        state["pending"] = True
+
+        def done(future):
+            state["pending"] = False
+            if on_update and future.exception() is None:
+                on_update(state)
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._summarize(state, to_fold, offset + end), self.background_loop.loop
+        )
+        future.add_done_callback(done)
+        return True
+
+    async def _summarize(self, state, to_fold, end):
+        transcript = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in to_fold)
+        messages = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": f"Current summary:\n{state['summary'] or '(none)'}\n\nNew messages:\n{transcript}"},
+        ]
+        summary, usage_info = await self.rag_core.complete(messages)
+        cost = self.cost_fn(usage_info)["total_cost"] if self.cost_fn else 0.0
+        state.update(
+            summary=summary.strip(),
+            summarized_count=end,
+            summary_calls=state["summary_calls"] + 1,
+            summary_tokens=state["summary_tokens"] + usage_info["total_tokens"],
+            summary_cost=state["summary_cost"] + cost,
+        )
@@ -0,0 +1,134 @@
+# ---------------------------
+# Two-tier Query Embedding Cache
+# ---------------------------
+# Tier 1 is an in-process LRU with TTL eviction, tier 2 is a SQLite file that
+# survives restarts. Both are keyed on normalized query text plus model name
+# (with the requested size for shortened embeddings, see model_key).
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "embeddings.sqlite3")
+
+
+def normalize_query(text):
+    """Lowercase and collapse whitespace so trivially different queries share a key"""
+    return " ".join(text.lower().split())
+
+
+def model_key(model, dimensions=None):
+    """Cache key for a model's embeddings at a requested size; vectors of different sizes never mix"""
+    return f"{model}@{dimensions}" if dimensions else model
+
+
+class EmbeddingCache:
+    """Thread-safe LRU + SQLite cache for query embeddings"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=2048, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                       model TEXT NOT NULL,
+                       query TEXT NOT NULL,
+                       vector BLOB NOT NULL,
+                       created_at REAL NOT NULL,
+                       PRIMARY KEY (model, query)
+                   )"""
+            )
+            self._db.commit()
+
+    def _is_fresh(self, created_at, now):
+        return self.ttl_seconds is None or now - created_at < self.ttl_seconds
+
+    def _remember(self, key, vector, created_at):
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, text, model):
+        """Return a cached embedding or None"""
+        key = (model, normalize_query(text))
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._is_fresh(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, created_at FROM embeddings WHERE model = ? AND query = ?",
+                    key,
+                ).fetchone()
+                if row is not None and self._is_fresh(row[1], now):
+                    vector = array("f", row[0]).tolist()
+                    self._remember(key, vector, row[1])
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text, model, vector):
+        """Store an embedding in both tiers"""
+        key = (model, normalize_query(text))
+        now = time.time()
+        with self._lock:
+            self._remember(key, list(vector), now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, query, vector, created_at) VALUES (?, ?, ?, ?)",
+                    (key[0], key[1], array("f", vector).tobytes(), now),
+                )
+                self._db.commit()
+
+    def get_or_create(self, text, model, create_fn):
+        """Return the cached embedding, calling create_fn(text) on a miss"""
+        vector = self.get(text, model)
+        if vector is None:
+            vector = create_fn(text)
+            self.put(text, model, vector)
+        return vector
+
+    def get_or_create_many(self, texts, model, embed_texts):
+        """Return embeddings for texts in order, embedding all misses with one embed_texts(list) call"""
+        vectors = [self.get(text, model) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, embed_texts([texts[i] for i in missing])):
+                self.put(texts[i], model, vector)
+                vectors[i] = vector
+        return vectors
+
+    def stats(self):
+        """Hit/miss counters for the Statistics panel"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+            }
@@ -0,0 +1,158 @@
+# ---------------------------
+# Intent Router Evaluation
+# ---------------------------
+# Runs a labelled set of messages through the intent router and reports
+# accuracy, per-intent precision/recall, the confusion matrix, how many
+# messages would skip retrieval and the LLM, and routing latency, with the
+# classifier on and keywords only. Templates in the set ({institute}, {code},
+# {city}, {state}) are filled in from the institute directory.
+#
+#   python evaluate_intents.py --output intent_eval.json
+#   python evaluate_intents.py --offline   # synthetic directory, hashed embeddings, no API calls
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+
+from clients import ClientConfig, create_clients
+from embedding_cache import EmbeddingCache
+from evaluate_retrieval import percentile
+from ingestion import openai_embedder
+from institute_directory import InstituteDirectory
+from intent_router import INTENTS, IntentRouter
+from query_router import EntityRouter
+
+EVAL_SET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "intents.jsonl")
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def load_eval_set(path, institutes, per_template=3):
+    """Expand {"query", "intent"[, "fields"]} templates over up to per_template institutes"""
+    with open(path) as f:
+        templates = [json.loads(line) for line in f if line.strip()]
+    records = []
+    cycle = itertools.cycle(institutes)
+    for template in templates:
+        placeholders = any(key in template["query"] for key in ("{institute}", "{code}", "{city}", "{state}"))
+        for _ in range(per_template if placeholders else 1):
+            inst = next(cycle)
+            query = template["query"].format(institute=inst["name"], code=inst["code"],
+                                             city=inst["city"], state=inst["state"])
+            records.append(dict(template, query=query))
+    return records
+
+
+def evaluate(router, records):
+    confusion = {expected: {predicted: 0 for predicted in INTENTS} for expected in INTENTS}
+    latencies = {"keywords": [], "classifier": []}
+    field_hits = field_total = 0
+    for record in records:
+        start = time.perf_counter()
+        intent = router.route(record["query"])
+        latencies[intent.source].append(time.perf_counter() - start)
+        confusion[record["intent"]][intent.name] += 1
+        if record.get("fields") and intent.name == record["intent"]:
+            field_total += 1
+            field_hits += sorted(intent.fields) == sorted(record["fields"])
+
+    correct = sum(confusion[intent][intent] for intent in INTENTS)
+    per_intent = {}
+    for intent in INTENTS:
+        predicted = sum(confusion[expected][intent] for expected in INTENTS)
+        actual = sum(confusion[intent].values())
+        per_intent[intent] = {
+            "precision": confusion[intent][intent] / predicted if predicted else 0.0,
+            "recall": confusion[intent][intent] / actual if actual else 0.0,
+            "support": actual,
+        }
+    all_latencies = latencies["keywords"] + latencies["classifier"]
+    return {
+        "accuracy": correct / len(records) if records else 0.0,
+        "per_intent": per_intent,
+        "confusion": confusion,
+        "field_accuracy": field_hits / field_total if field_total else None,
+        # Fast paths taken for messages that really are greetings, directory or fact requests
+        "fast_path_rate": sum(confusion[intent][intent] for intent in INTENTS[:3]) / len(records) if records else 0.0,
+        # Open questions wrongly answered from a fast path: the costly error
+        "open_misrouted": sum(confusion["open"][intent] for intent in INTENTS[:3]),
+        "by_source": {source: len(samples) for source, samples in latencies.items()},
+        "latency_p50_ms": percentile(all_latencies, 50) * 1000,
+        "latency_p95_ms": percentile(all_latencies, 95) * 1000,
+        "keyword_p50_ms": percentile(latencies["keywords"], 50) * 1000,
+        "classifier_p50_ms": percentile(latencies["classifier"], 50) * 1000,
+        "classifier_p95_ms": percentile(latencies["classifier"], 95) * 1000,
+    }
+
+
+def offline_environment(workdir, embed_latency_ms):
+    """A synthetic directory in an in-memory collection and a hashed embedder"""
+    from benchmarks.corpus import generate_documents, seed_collection
+    from benchmarks.fakes import FakeOpenAI, hash_embedding
+
+    _, documents = generate_documents(60)
+    qdrant, _ = seed_collection(documents, lambda texts: [hash_embedding(text) for text in texts], 256)
+    directory = InstituteDirectory(qdrant, version_path=os.path.join(workdir, "institutes.version"))
+
+    def embed_query(text):
+        time.sleep(embed_latency_ms / 1000)
+        return hash_embedding(text)
+    return directory, openai_embedder(FakeOpenAI()), embed_query
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.offline:
+            directory, embed_texts, embed_query = offline_environment(workdir, args.embed_latency_ms)
+        else:
+            clients = create_clients(ClientConfig.from_env(), async_clients=False)
+            directory = InstituteDirectory(clients.qdrant)
+            embedding_cache = EmbeddingCache()
+            embedder = openai_embedder(clients.openai, EMBEDDING_MODEL)
+
+            def embed_texts(texts):
+                return embedding_cache.get_or_create_many(texts, EMBEDDING_MODEL, embedder)
+
+            def embed_query(text):
+                return embed_texts([text])[0]
+
+        entity_router = EntityRouter(directory)
+        records = load_eval_set(args.eval_set, directory.list(), args.per_template)
+        thresholds = dict.fromkeys(INTENTS[:3], args.threshold) if args.threshold is not None else None
+        report = {"messages": len(records), "configs": {}}
+        report["configs"]["keywords"] = evaluate(IntentRouter(entity_router), records)
+        router = IntentRouter(entity_router, embed_texts=embed_texts, embed_query=embed_query, thresholds=thresholds)
+        fit_start = time.perf_counter()
+        router.fit()
+        report["fit_seconds"] = time.perf_counter() - fit_start
+        report["configs"]["keywords+classifier"] = evaluate(router, records)
+
+    print(f"{len(records)} labelled messages, centroids fitted in {report['fit_seconds'] * 1000:.0f} ms")
+    print(f"{'config':<20} {'accuracy':>9} {'fast path':>10} {'open→fast':>10} {'fields':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, result in report["configs"].items():
+        fields = f"{result['field_accuracy']:.2f}" if result["field_accuracy"] is not None else "-"
+        print(f"{name:<20} {result['accuracy']:>9.3f} {result['fast_path_rate']:>10.2f} "
+              f"{result['open_misrouted']:>10} {fields:>7} {result['latency_p50_ms']:>8.2f} {result['latency_p95_ms']:>8.2f}")
+    result = report["configs"]["keywords+classifier"]
+    print(f"\nkeyword decisions p50 {result['keyword_p50_ms']:.3f} ms ({result['by_source']['keywords']}), "
+          f"classifier decisions p50 {result['classifier_p50_ms']:.2f} ms / p95 {result['classifier_p95_ms']:.2f} ms "
+          f"({result['by_source']['classifier']})")
+    print("expected \\ routed".ljust(18) + "".join(f"{intent:>15}" for intent in INTENTS))
+    for expected, row in result["confusion"].items():
+        print(f"{expected:<18}" + "".join(f"{row[intent]:>15}" for intent in INTENTS))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and latency of the intent router")
+    parser.add_argument("--eval-set", default=EVAL_SET_PATH, help="JSONL of {\"query\", \"intent\"[, \"fields\"]}")
+    parser.add_argument("--per-template", type=int, default=3, help="Institutes each templated message is filled with")
+    parser.add_argument("--threshold", type=float, help="Classifier confidence threshold for every fast path")
+    parser.add_argument("--offline", action="store_true", help="Synthetic directory and hashed embeddings")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated query embedding latency (offline)")
+    parser.add_argument("--output", help="Write the report as JSON")
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+# ---------------------------
+# Offline Retrieval Evaluation: dense vs hybrid vs sparse
+# ---------------------------
+# Runs a labelled query set through each retrieval mode of the RAG core and
+# reports recall@k and latency. Without --queries, a labelled set is generated
+# from the institute payloads (names, codes, cities, websites).
+#
+#   python evaluate_retrieval.py --top-k 4 --output retrieval_eval.json
+import argparse
+import asyncio
+import json
+import time
+
+from clients import ClientConfig, create_clients
+from institute_directory import InstituteDirectory
+from rag_core import RagCore
+from sparse_index import SparseIndex
+
+MODES = ("dense", "hybrid", "sparse")
+
+
+def generated_queries(institutes):
+    """Labelled queries whose expected answer is the institute's code"""
+    for inst in institutes:
+        yield {"query": f"Tell me about {inst['name']}", "expected": inst["code"]}
+        yield {"query": f"Which institute has the code {inst['code']}?", "expected": inst["code"]}
+        yield {"query": f"Certified yoga institute in {inst['city']}, {inst['state']}", "expected": inst["code"]}
+        if inst["website"] != "N/A":
+            yield {"query": f"Whose website is {inst['website']}?", "expected": inst["code"]}
+
+
+def load_queries(path):
+    """Read {"query", "expected"} records; expected is an institute code or name"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def is_hit(points, expected):
+    return any(
+        expected in ((point.payload or {}).get("code"), (point.payload or {}).get("institute_name"))
+        for point in points
+    )
+
+
+async def evaluate_mode(core, queries, top_k):
+    hits = 0
+    latencies = []
+    for record in queries:
+        start = time.perf_counter()
+        retrieval = await core.retrieve(record["query"], top_k)
+        latencies.append(time.perf_counter() - start)
+        hits += is_hit(retrieval.points, record["expected"])
+    return {
+        "recall_at_k": hits / len(queries) if queries else 0.0,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+        "queries": len(queries),
+        "sparse_only": core.counters["sparse_only"],
+        "degraded": core.counters["degraded"],
+    }
+
+
+async def main(args):
+    clients = create_clients(ClientConfig.from_env())
+    qdrant, openai_client, async_qdrant = clients.qdrant, clients.async_openai, clients.async_qdrant
+
+    queries = load_queries(args.queries) if args.queries else list(generated_queries(InstituteDirectory(qdrant).list()))
+    sparse_index = SparseIndex(qdrant)
+    sparse_index.refresh()
+
+    report = {"top_k": args.top_k, "modes": {}}
+    for mode in args.modes:
+        # No embedding cache, so dense and hybrid both pay for the embedding call
+        core = RagCore(openai_client, async_qdrant, sparse_index=sparse_index, retrieval_mode=mode)
+        report["modes"][mode] = await evaluate_mode(core, queries, args.top_k)
+
+    print(f"{'mode':<8} {'recall@' + str(args.top_k):>10} {'p50 ms':>9} {'p95 ms':>9}")
+    for mode, result in report["modes"].items():
+        print(f"{mode:<8} {result['recall_at_k']:>10.3f} {result['latency_p50_ms']:>9.1f} {result['latency_p95_ms']:>9.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dense, hybrid and sparse retrieval")
+    parser.add_argument("--queries", help="JSONL of {\"query\", \"expected\"}; generated from payloads if omitted")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--output", help="Write the report as JSON")
+    asyncio.run(main(parser.parse_args()))
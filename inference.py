@@ -1,42 +1,36 @@
 # ---------------------------
 # Imports
 # ---------------------------
-from qdrant_client import QdrantClient
-from openai import OpenAI
+import argparse
+import asyncio
+import json
 import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import time
+from admission import BACKGROUND
+from clients import ClientConfig, create_clients, warm_up_async
+from collection_profiles import CollectionSettings
+from embedding_cache import EmbeddingCache
+from ingestion import batched
+from parent_chunks import parent_collection_name
+from rag_core import RagCore, StageError
+from rerank import RerankConfig
 
 # ---------------------------
-# API KEYS (from environment variables)
+# API KEYS (from environment variables / .env)
 # ---------------------------
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-qdrant = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY")
-)
+# Background priority: queued behind the app's live chat in the shared rate limits
+clients = create_clients(ClientConfig.from_env(), priority=BACKGROUND)
+# The sync Qdrant client reads the collection's embedding size and quantization
+rag_core = RagCore(clients.async_openai, clients.async_qdrant, embedding_cache=EmbeddingCache(),
+                   collection_settings=CollectionSettings(clients.qdrant), rerank=RerankConfig(),
+                   parent_collection=parent_collection_name())
 
 # ---------------------------
-# 1. Retrieval Function (NEW QDRANT API)
+# 1. Retrieval Function (async core with per-stage deadlines)
 # ---------------------------
-def retrieve_chunks(query: str, top_k=4):
-    # Convert query to embedding
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=query
-    )
-    query_vector = resp.data[0].embedding
-
-    # Qdrant similarity search (correct method)
-    results = qdrant.query_points(
-        collection_name="Institutes",
-        query=query_vector,
-        limit=top_k
-    )
-
-    return results.points
+async def retrieve_chunks(query: str, top_k=4):
+    retrieval = await rag_core.retrieve(query, top_k)
+    return retrieval.points
 
 
 # ---------------------------
@@ -50,14 +44,8 @@ def build_context(results):
     return context
 
 
-# ---------------------------
-# 3. Ask the RAG System
-# ---------------------------
-def ask_rag(query):
-    results = retrieve_chunks(query)
-    context = build_context(results)
-
-    prompt = f"""
+def build_prompt(query, context):
+    return f"""
 You are a yoga institute assistant. Use ONLY the context below.
 
 Context:
@@ -68,17 +56,236 @@ Question: {query}
 Answer in one clear and helpful paragraph.
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    return response.choices[0].message.content
+# ---------------------------
+# 3. Ask the RAG System
+# ---------------------------
+async def ask_rag(query):
+    results = await retrieve_chunks(query)
+    context = build_context(results)
+    prompt = build_prompt(query, context)
+
+    try:
+        answer, _ = await rag_core.complete([{"role": "user", "content": prompt}])
+    except StageError as e:
+        return f"No answer: {e}"
+    return answer
+
+
+# ---------------------------
+# 4. Bulk Question Answering
+# ---------------------------
+# Questions are read lazily, embedded with one multi-input request and searched
+# with one query_batch_points request per batch, then answered by concurrent
+# chat completions. Answers are appended to the output in input order, so a
+# rerun resumes after the last written line. Failed lines are written too (with
+# an "error"); --retry-errors answers them again and rewrites them in place. At
+# most one batch plus the in-flight answers are held in memory, however large
+# the input is.
+QUESTION_FIELDS = ("query", "question", "title")
+
+
+def read_questions(path, start_line=1, field=None, lines=None):
+    """Yield (line number, id, question) for each JSONL record from start_line on, or only the given lines"""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if line_number < start_line or not line.strip() or (lines is not None and line_number not in lines):
+                continue
+            record = json.loads(line)
+            keys = (field,) if field else QUESTION_FIELDS
+            question = next((record[key] for key in keys if record.get(key)), None)
+            yield line_number, record.get("id", record.get("request_id", line_number)), question
+
+
+def resume_point(output_path):
+    """First input line not yet answered; drops a partially written last record"""
+    if not os.path.exists(output_path):
+        return 1
+    last_line, complete_bytes = 0, 0
+    with open(output_path, "rb+") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                last_line = json.loads(raw)["line"]
+            except (ValueError, KeyError):
+                break
+            complete_bytes += len(raw)
+        f.truncate(complete_bytes)
+    return last_line + 1
+
+
+def failed_lines(output_path):
+    """Input lines whose answers failed for a reason a retry can fix, such as a stage timeout"""
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path) as f:
+        records = (json.loads(line) for line in f if line.strip())
+        # A record without a question fails the same way every time
+        return {record["line"] for record in records if "error" in record and isinstance(record.get("query"), str)}
+
+
+def merge_answers(output_path, retry_path):
+    """Replace records of output_path with the retried ones of the same input line"""
+    with open(retry_path) as f:
+        retried = {json.loads(line)["line"]: line for line in f if line.strip()}
+    merged_path = output_path + ".merging"
+    with open(output_path) as f, open(merged_path, "w") as out:
+        for line in f:
+            if line.strip():
+                out.write(retried.get(json.loads(line)["line"], line))
+    os.replace(merged_path, output_path)
+    os.remove(retry_path)
+
+
+def source_summary(points):
+    return [
+        {"institute": (p.payload or {}).get("institute_name"), "code": (p.payload or {}).get("code"),
+         "score": round(p.score, 4)}
+        for p in points
+    ]
+
+
+async def _answer_questions(core, questions, output_path, summary, started, batch_size, concurrency, top_k,
+                            progress_every):
+    """Answer (line, id, question) tuples and append them to output_path in order, counting into summary"""
+    semaphore = asyncio.Semaphore(concurrency)
+    # Finished answers wait here for the writer; bounded so a slow head-of-line answer pauses reading
+    pending = asyncio.Queue(maxsize=max(batch_size, concurrency * 2))
+
+    async def answer_one(record, points, timing, batch_started):
+        try:
+            generate_start = time.perf_counter()
+            answer, usage = await core.complete(
+                [{"role": "user", "content": build_prompt(record["query"], build_context(points))}]
+            )
+            timing["generate"] = (time.perf_counter() - generate_start) * 1000
+            record.update(answer=answer, usage=usage, sources=source_summary(points))
+        except StageError as e:
+            record["error"] = str(e)
+        finally:
+            semaphore.release()
+        timing["total"] = (time.perf_counter() - batch_started) * 1000
+        record["timing_ms"] = {stage: round(ms, 1) for stage, ms in timing.items()}
+        return record
+
+    async def failed(record):
+        semaphore.release()
+        return record
+
+    async def produce():
+        for batch in batched(questions, batch_size):
+            batch_started = time.perf_counter()
+            summary["batches"] += 1
+            records = [{"line": line, "id": record_id, "query": question} for line, record_id, question in batch]
+            answerable = [record for record in records if isinstance(record["query"], str)]
+            results, timing, error = [], {}, None
+            try:
+                vectors = await core.embed_batch([record["query"] for record in answerable])
+                timing["embed_batch"] = (time.perf_counter() - batch_started) * 1000
+                searched_at = time.perf_counter()
+                results = await core.search_batch(vectors, top_k) if vectors else []
+                timing["search_batch"] = (time.perf_counter() - searched_at) * 1000
+            except StageError as e:
+                error = str(e)
+            points_by_line = {record["line"]: points for record, points in zip(answerable, results)}
+            for record in records:
+                await semaphore.acquire()
+                if record["line"] in points_by_line:
+                    task = answer_one(record, points_by_line[record["line"]], dict(timing), batch_started)
+                else:
+                    record["error"] = error or "no question in record"
+                    task = failed(record)
+                await pending.put(asyncio.ensure_future(task))
+        await pending.put(None)
+
+    async def write():
+        with open(output_path, "a") as out:
+            while (task := await pending.get()) is not None:
+                record = await task
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if "error" in record:
+                    summary["errors"] += 1
+                else:
+                    summary["answered"] += 1
+                    summary["prompt_tokens"] += record["usage"]["prompt_tokens"]
+                    summary["completion_tokens"] += record["usage"]["completion_tokens"]
+                done = summary["answered"] + summary["errors"]
+                if progress_every and done % progress_every == 0:
+                    print(f"✓ {done} questions ({done / (time.perf_counter() - started):.1f}/s)", flush=True)
+
+    await asyncio.gather(produce(), write())
+
+
+async def answer_file(core, input_path, output_path, batch_size=128, concurrency=8, top_k=4, field=None,
+                      progress_every=100, retry_errors=False):
+    """Answer every question of a JSONL file into output_path; returns a summary dict
+
+    With retry_errors, lines that failed in earlier runs are answered again first.
+    """
+    start_line = resume_point(output_path)
+    summary = {"resumed_from_line": start_line, "retried": 0, "answered": 0, "errors": 0,
+               "prompt_tokens": 0, "completion_tokens": 0, "batches": 0}
+    started = time.perf_counter()
+    options = (batch_size, concurrency, top_k, progress_every)
+    if retry_errors and (lines := failed_lines(output_path)):
+        # Retried answers go to a side file first, so an interrupted retry leaves the output intact
+        retry_path = output_path + ".retry"
+        if os.path.exists(retry_path):
+            os.remove(retry_path)
+        await _answer_questions(core, read_questions(input_path, field=field, lines=lines), retry_path,
+                                summary, started, *options)
+        merge_answers(output_path, retry_path)
+        summary["retried"] = len(lines)
+    await _answer_questions(core, read_questions(input_path, start_line, field), output_path,
+                            summary, started, *options)
+    summary["seconds"] = time.perf_counter() - started
+    done = summary["answered"] + summary["errors"]
+    summary["questions_per_sec"] = done / summary["seconds"] if summary["seconds"] else 0.0
+    return summary
+
 
 # ---------------------------
-# 4. Run the RAG System
+# 5. Run the RAG System
 # ---------------------------
-query = "What is the Group Classes Subscription for Indiranagar of Athayog institute?"
+DEFAULT_QUERY = "What is the Group Classes Subscription for Indiranagar of Athayog institute?"
+
+
+async def main(args):
+    # Open the pooled connections before the first question
+    report = await warm_up_async(clients)
+    print(report.finish().format())
+    if not args.input:
+        print(await ask_rag(args.query))
+        return
+    output = args.output or os.path.splitext(args.input)[0] + ".answers.jsonl"
+    if args.restart and os.path.exists(output):
+        os.remove(output)
+    summary = await answer_file(rag_core, args.input, output, args.batch_size, args.concurrency, args.top_k, args.field,
+                                retry_errors=args.retry_errors)
+    print(f"✅ {summary['answered']} answered, {summary['errors']} failed in {summary['seconds']:.1f}s "
+          f"({summary['questions_per_sec']:.1f} questions/s, {summary['batches']} batches, "
+          f"resumed from line {summary['resumed_from_line']}, {summary['retried']} retried)")
+    print(f"Tokens: {summary['prompt_tokens']:,} prompt, {summary['completion_tokens']:,} completion → {output}")
+    if failed := failed_lines(output):
+        print(f"⚠️ {len(failed)} lines failed; rerun with --retry-errors to answer them again")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Answer one question, or a JSONL file of questions in bulk")
+    parser.add_argument("query", nargs="?", default=DEFAULT_QUERY, help="Single question (ignored with --input)")
+    parser.add_argument("--input", help="JSONL of questions (\"query\", \"question\" or \"title\" field)")
+    parser.add_argument("--output", help="Answers JSONL (default: <input>.answers.jsonl); reruns resume it")
+    parser.add_argument("--field", help="Record field holding the question")
+    parser.add_argument("--batch-size", type=int, default=128, help="Questions per embedding and search request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Chat completions in flight")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--restart", action="store_true", help="Discard existing output instead of resuming")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="Answer lines that failed in earlier runs again before resuming")
+    return parser
 
-print(ask_rag(query))
 
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
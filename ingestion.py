@@ -0,0 +1,179 @@
+# ---------------------------
+# Batched Ingestion Engine
+# ---------------------------
+# Embeds many texts per embeddings.create request, runs a bounded number of
+# embedding batches concurrently and streams upserts to Qdrant in chunks.
+# Progress is checkpointed so a crashed run can resume where it stopped.
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from qdrant_client.models import PointStruct
+
+from telemetry import DISABLED
+
+
+def openai_embedder(client, model="text-embedding-3-small", dimensions=None):
+    """Return an embed_texts(texts) function backed by one multi-input embeddings call;
+    dimensions requests shortened embeddings (text-embedding-3 models)"""
+    kwargs = {"dimensions": dimensions} if dimensions else {}
+
+    def embed_texts(texts):
+        response = client.embeddings.create(model=model, input=list(texts), **kwargs)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    return embed_texts
+
+
+def batched(items, size):
+    """Yield lists of up to size items from any iterable"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def with_retry(fn, max_retries=5, backoff_seconds=0.5, max_backoff_seconds=30.0):
+    """Call fn(), retrying with jittered exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == max_retries:
+                raise
+            delay = min(max_backoff_seconds, backoff_seconds * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+class Checkpoint:
+    """Append-only file of document keys that are already upserted"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+
+    def record(self, keys):
+        keys = [str(key) for key in keys]
+        self.done.update(keys)
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write("".join(f"{key}\n" for key in keys))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        self.done = set()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@dataclass
+class IngestionReport:
+    documents: int = 0
+    skipped: int = 0
+    embed_batches: int = 0
+    upsert_batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def docs_per_sec(self):
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+class IngestionEngine:
+    """Embed and upsert documents of the form {"id", "text", "payload", optional "key"}
+
+    "key" identifies a document in the checkpoint and defaults to "id".
+    """
+
+    def __init__(self, qdrant, embed_texts, collection_name="Institutes", embed_batch_size=64,
+                 max_concurrent_batches=4, upsert_batch_size=256, max_retries=5,
+                 backoff_seconds=0.5, checkpoint_path=None, on_progress=None, telemetry=None):
+        self.qdrant = qdrant
+        self.embed_texts = embed_texts
+        self.collection_name = collection_name
+        self.embed_batch_size = embed_batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self.upsert_batch_size = upsert_batch_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.on_progress = on_progress
+        self.telemetry = telemetry or DISABLED
+
+    def _retry(self, fn):
+        return with_retry(fn, self.max_retries, self.backoff_seconds)
+
+    def _embed_batch(self, docs):
+        with self.telemetry.span("ingest_embed_batch", docs=len(docs)):
+            vectors = self._retry(lambda: self.embed_texts([doc["text"] for doc in docs]))
+        if len(vectors) != len(docs):
+            raise ValueError(f"Embedder returned {len(vectors)} vectors for {len(docs)} texts")
+        return docs, vectors
+
+    def _upsert(self, docs, vectors, report):
+        points = [
+            PointStruct(id=doc["id"], vector=vector, payload=doc.get("payload", {}))
+            for doc, vector in zip(docs, vectors)
+        ]
+        for chunk in batched(points, self.upsert_batch_size):
+            with self.telemetry.span("ingest_upsert_batch", points=len(chunk)):
+                self._retry(lambda: self.qdrant.upsert(
+                    collection_name=self.collection_name,
+                    points=chunk,
+                    wait=False,
+                ))
+            report.upsert_batches += 1
+        self.checkpoint.record(doc.get("key", doc["id"]) for doc in docs)
+        report.documents += len(docs)
+        if self.on_progress:
+            self.on_progress(report)
+        return chunk
+
+    def run(self, documents):
+        """Ingest an iterable of documents and return an IngestionReport"""
+        report = IngestionReport()
+        start = time.perf_counter()
+
+        def pending_docs():
+            for doc in documents:
+                if str(doc.get("key", doc["id"])) in self.checkpoint.done:
+                    report.skipped += 1
+                    continue
+                yield doc
+
+        batches = batched(pending_docs(), self.embed_batch_size)
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_batches) as pool:
+            in_flight, last_chunk = set(), None
+            for batch in batches:
+                in_flight.add(pool.submit(self._embed_batch, batch))
+                report.embed_batches += 1
+                # Keep memory bounded: never queue more than the pool can work on
+                if len(in_flight) >= self.max_concurrent_batches:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        last_chunk = self._upsert(*future.result(), report)
+            for future in in_flight:
+                last_chunk = self._upsert(*future.result(), report)
+
+        if last_chunk:
+            # Upserts go out one after another with wait=False; waiting on an idempotent
+            # repeat of the last one returns once every earlier write is applied, so
+            # callers can announce the new data (bump_directory_version) right after run()
+            with self.telemetry.span("ingest_flush", points=len(last_chunk)):
+                self._retry(lambda: self.qdrant.upsert(collection_name=self.collection_name,
+                                                       points=last_chunk, wait=True))
+        report.seconds = time.perf_counter() - start
+        self.telemetry.observe("ingest_run", report.seconds, documents=report.documents, skipped=report.skipped)
+        # A finished run needs no resume point; the next run starts fresh
+        self.checkpoint.clear()
+        return report
@@ -0,0 +1,148 @@
+# ---------------------------
+# Payload-indexed Institute Directory
+# ---------------------------
+# Pages through every "institute_metadata" point with Qdrant scroll instead of
+# a vector search, and holds the result in a versioned in-memory cache.
+# Ingestion bumps the version file so every process reloads on its next read,
+# and appends the institutes it touched to an updates log for per-institute
+# invalidation of downstream caches.
+import os
+import threading
+import time
+
+from qdrant_client import models
+
+DIRECTORY_VERSION_PATH = os.path.join(".cache", "institutes.version")
+INSTITUTE_UPDATES_PATH = os.path.join(".cache", "institute_updates.log")
+
+
+def read_directory_version(path=DIRECTORY_VERSION_PATH):
+    """Return the current directory version marker ("0" if never written)"""
+    try:
+        with open(path) as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_directory_version(path=DIRECTORY_VERSION_PATH, updated_institutes=(),
+                           updates_path=INSTITUTE_UPDATES_PATH):
+    """Mark the directory stale; call after writing institute points.
+
+    updated_institutes (names and/or codes) are appended to the updates log.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    version = str(time.time_ns())
+    with open(path, "w") as f:
+        f.write(version)
+    if updated_institutes:
+        os.makedirs(os.path.dirname(updates_path) or ".", exist_ok=True)
+        with open(updates_path, "a") as f:
+            f.write("".join(f"{version}\t{institute}\n" for institute in updated_institutes))
+    return version
+
+
+def read_institute_updates(path=INSTITUTE_UPDATES_PATH, offset=None):
+    """Return (institutes updated since offset, new offset).
+
+    With offset=None, start from the current end of the log.
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return set(), 0
+    if offset is None or offset > size:
+        return set(), size
+    if offset == size:
+        return set(), offset
+    with open(path) as f:
+        f.seek(offset)
+        lines = f.read().splitlines()
+        offset = f.tell()
+    return {line.split("\t", 1)[1] for line in lines if "\t" in line}, offset
+
+
+class InstituteDirectory:
+    """Shared cache of unique institutes loaded from payloads"""
+
+    def __init__(self, qdrant, collection_name="Institutes", version_path=DIRECTORY_VERSION_PATH,
+                 page_size=256, ttl_seconds=600):
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.version_path = version_path
+        self.page_size = page_size
+        # The TTL catches writes made from another machine, where the version file is not shared
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._institutes = None
+        self._version = None
+        self._loaded_at = 0.0
+
+    def _fetch(self):
+        """Scroll through every institute_metadata point in the collection"""
+        metadata_filter = models.Filter(
+            must=[models.FieldCondition(key="type", match=models.MatchValue(value="institute_metadata"))]
+        )
+        institutes_dict = {}
+        offset = None
+        while True:
+            points, offset = self.qdrant.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=metadata_filter,
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for point in points:
+                payload = point.payload or {}
+                name = payload.get("institute_name")
+                if name and name not in institutes_dict:
+                    institutes_dict[name] = {
+                        "name": name,
+                        "city": payload.get("city", "N/A"),
+                        "state": payload.get("state", "N/A"),
+                        "code": payload.get("code", "N/A"),
+                        "website": payload.get("website", "N/A"),
+                        "certification": payload.get("certification", "N/A"),
+                        "validity": payload.get("validity", "N/A"),
+                    }
+            if offset is None:
+                break
+        return sorted(institutes_dict.values(), key=lambda inst: inst["name"].lower())
+
+    def _is_stale(self):
+        if self._institutes is None:
+            return True
+        if self.ttl_seconds is not None and time.time() - self._loaded_at > self.ttl_seconds:
+            return True
+        return read_directory_version(self.version_path) != self._version
+
+    def cached(self):
+        """Return the last loaded list without touching Qdrant (None if never loaded)"""
+        return self._institutes
+
+    def invalidate(self):
+        """Drop the cached list so the next read reloads it"""
+        with self._lock:
+            self._institutes = None
+
+    def list(self, state=None, city=None):
+        """Return unique institutes, optionally filtered by state and/or city (case-insensitive)"""
+        with self._lock:
+            if self._is_stale():
+                version = read_directory_version(self.version_path)
+                self._institutes = self._fetch()
+                self._version = version
+                self._loaded_at = time.time()
+            institutes = self._institutes
+
+        if state:
+            institutes = [inst for inst in institutes if inst["state"].lower() == state.lower()]
+        if city:
+            institutes = [inst for inst in institutes if inst["city"].lower() == city.lower()]
+        return list(institutes)
+
+    @property
+    def version(self):
+        return self._version
@@ -0,0 +1,187 @@
+# ---------------------------
+# Incremental Institute Sync
+# ---------------------------
+# Makes the collection's institute_metadata points match a CSV or JSONL source
+# of institute records. Point IDs are derived from the institute code, so a
+# rerun overwrites instead of duplicating, and every payload carries a hash of
+# what was embedded: records whose hash is unchanged skip embedding and upsert
+# entirely, and points whose record left the source (or that an older,
+# random-ID ingestion left behind) are deleted.
+import csv
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass, field
+
+from qdrant_client import models
+
+from institute_directory import bump_directory_version
+
+DEFAULT_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "institutes.jsonl")
+
+REQUIRED_FIELDS = ("name", "code", "certification", "city", "state", "country", "website")
+
+# Fixed namespace: the same code maps to the same point ID on every machine and run
+POINT_ID_NAMESPACE = uuid.UUID("5b0e8a4c-3f7d-4f6e-9a51-2c1d7e0b9f43")
+
+METADATA_FILTER = models.Filter(
+    must=[models.FieldCondition(key="type", match=models.MatchValue(value="institute_metadata"))]
+)
+
+
+def read_records(path):
+    """Institute records from a .csv (header row) or .jsonl file; validity defaults to "N/A" """
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    records, seen = [], set()
+    for number, row in enumerate(rows, start=1):
+        record = {key: str(value).strip() for key, value in row.items() if key and value is not None}
+        missing = [key for key in REQUIRED_FIELDS if not record.get(key)]
+        if missing:
+            raise ValueError(f"{path}: record {number} is missing {', '.join(missing)}")
+        if record["code"] in seen:
+            raise ValueError(f"{path}: record {number} repeats code {record['code']}")
+        seen.add(record["code"])
+        record.setdefault("validity", "N/A")
+        records.append(record)
+    return records
+
+
+def point_id(code):
+    """Deterministic point ID of an institute's metadata point"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"institute_metadata:{code}"))
+
+
+def build_institute_document(institute):
+    """Build the ingestion document (text + payload) for one institute"""
+    # Create a comprehensive text for embedding
+    text_for_embedding = f"""
+    Institute Name: {institute['name']}
+    Code: {institute['code']}
+    Location: {institute['city']}, {institute['state']}, {institute['country']}
+    Certification: {institute['certification']}
+    Validity: {institute.get('validity', 'N/A')}
+    Website: {institute['website']}
+
+    This is a certified yoga institute located in {institute['city']}, {institute['state']}.
+    """
+
+    return {
+        "key": institute['code'],
+        "id": point_id(institute['code']),
+        "text": text_for_embedding,
+        "payload": {
+            "institute_name": institute['name'],
+            "code": institute['code'],
+            "certification": institute['certification'],
+            "validity": institute.get('validity', 'N/A'),
+            "city": institute['city'],
+            "state": institute['state'],
+            "country": institute['country'],
+            "website": institute['website'],
+            "content": text_for_embedding.strip(),
+            "type": "institute_metadata"
+        }
+    }
+
+
+def content_hash(document, embedding_key):
+    """Hash of the embedded text, the payload and the embedding model/size that produced the vector"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([embedding_key, document["text"], document["payload"]], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def existing_points(qdrant, collection_name="Institutes", page_size=256):
+    """Payloads of every institute_metadata point, by point ID"""
+    points, offset = {}, None
+    while True:
+        page, offset = qdrant.scroll(collection_name=collection_name, scroll_filter=METADATA_FILTER,
+                                     limit=page_size, offset=offset, with_payload=True, with_vectors=False)
+        for point in page:
+            points[str(point.id)] = point.payload or {}
+        if offset is None:
+            return points
+
+
+@dataclass
+class SyncPlan:
+    added: list = field(default_factory=list)  # documents
+    changed: list = field(default_factory=list)  # (document, [changed payload keys])
+    unchanged: int = 0
+    removed: dict = field(default_factory=dict)  # point ID -> payload
+    codes: set = field(default_factory=set)  # every code in the source
+
+    @property
+    def documents(self):
+        """Documents to embed and upsert"""
+        return self.added + [document for document, _ in self.changed]
+
+    def touched_institutes(self):
+        """Names and codes whose cached answers are now stale"""
+        payloads = [document["payload"] for document in self.documents] + list(self.removed.values())
+        return sorted({payload[key] for payload in payloads for key in ("institute_name", "code") if payload.get(key)})
+
+    def has_changes(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+def plan_sync(records, existing, embedding_key, delete_missing=True):
+    """Compare source records with the existing points"""
+    plan = SyncPlan()
+    wanted = set()
+    for record in records:
+        document = build_institute_document(record)
+        document["payload"]["content_hash"] = content_hash(document, embedding_key)
+        wanted.add(document["id"])
+        plan.codes.add(record["code"])
+        current = existing.get(document["id"])
+        if current is None:
+            plan.added.append(document)
+        elif current.get("content_hash") != document["payload"]["content_hash"]:
+            changed = sorted(key for key, value in document["payload"].items()
+                             if key not in ("content", "content_hash") and current.get(key) != value)
+            plan.changed.append((document, changed or ["embedding"]))
+        else:
+            plan.unchanged += 1
+    if delete_missing:
+        plan.removed = {id_: payload for id_, payload in existing.items() if id_ not in wanted}
+    return plan
+
+
+def sync_institutes(qdrant, engine, records, embedding_key, collection_name="Institutes", delete_missing=True,
+                    dry_run=False):
+    """Embed and upsert only new or changed records, delete removed ones; returns (plan, IngestionReport or None)"""
+    plan = plan_sync(records, existing_points(qdrant, collection_name), embedding_key, delete_missing)
+    if dry_run or not plan.has_changes():
+        return plan, None
+    # run() returns once its upserts are applied, so the version bump below never races them
+    report = engine.run(plan.documents)
+    if plan.removed:
+        qdrant.delete(collection_name=collection_name,
+                      points_selector=models.PointIdsList(points=list(plan.removed)), wait=True)
+    # Tell running apps to reload their institute directory and drop cached answers
+    bump_directory_version(updated_institutes=plan.touched_institutes())
+    return plan, report
+
+
+def format_plan(plan):
+    """Diff summary: one line per added, changed or removed institute"""
+    lines = [f"+{len(plan.added)} added, ~{len(plan.changed)} changed, -{len(plan.removed)} removed, "
+             f"={plan.unchanged} unchanged"]
+    for document in plan.added:
+        lines.append(f"  + {document['payload']['code']} {document['payload']['institute_name']}")
+    for document, changed in plan.changed:
+        lines.append(f"  ~ {document['payload']['code']} {document['payload']['institute_name']} "
+                     f"({', '.join(changed)})")
+    for payload in plan.removed.values():
+        # A code still in the source under another ID: a duplicate left by a random-ID ingestion
+        duplicate = " (duplicate)" if payload.get("code") in plan.codes else ""
+        lines.append(f"  - {payload.get('code', '?')} {payload.get('institute_name', '?')}{duplicate}")
+    return "\n".join(lines)
+
@@ -0,0 +1,268 @@
+# ---------------------------
+# Local Intent Routing
+# ---------------------------
+# Decides before any retrieval or LLM call what kind of message a query is:
+# a greeting, a request for the institute directory, a fact about one named
+# institute that its directory payload answers (website, validity, ...), or an
+# open question for the full RAG path. One compiled keyword pattern settles the
+# clear cases for free; the rest go to a nearest-centroid classifier over
+# cached embeddings of labelled example utterances. The query embedding it
+# needs is the one retrieval would compute anyway, so it is reused from the
+# embedding cache. Each route has a confidence threshold; anything less
+# certain falls through to "open".
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+GREETING = "greeting"
+DIRECTORY = "directory"
+INSTITUTE_FACT = "institute_fact"
+OPEN = "open"
+INTENTS = (GREETING, DIRECTORY, INSTITUTE_FACT, OPEN)
+
+# Directory payload fields a fact lookup answers, and the words that ask for them
+FACT_FIELD_PATTERNS = {
+    "website": r"websites?|web ?sites?|urls?|home ?pages?|links?|online",
+    "validity": r"valid(?:ity)?|expir(?:e|es|ed|y|ation)|renew(?:al|ed)?",
+    "certification": r"certif(?:ied|ication|icate)(?: number)?|accredit(?:ed|ation)|affiliat(?:ed|ion)|registration number",
+    "code": r"codes?",
+    "location": r"where|located|locations?|address|city|state|based",
+}
+
+INSTITUTE_WORDS = r"(?:yoga )?(?:institutes?|institutions?|centres?|centers?|schools?|studios?|shalas?)"
+
+KEYWORD_PATTERNS = {
+    GREETING: r"hello|hi|hey|hiya|yo|howdy|greetings|namaste|good (?:morning|afternoon|evening)|what'?s up|sup",
+    DIRECTORY: (
+        r"list(?: of| all)?|directory|"
+        rf"(?:all|every|available|certified|verified) {INSTITUTE_WORDS}|"
+        rf"(?:which|what|show(?: me)?|any) {INSTITUTE_WORDS}|"
+        rf"how many {INSTITUTE_WORDS}|{INSTITUTE_WORDS} (?:in|near|around)"
+    ),
+    # Topics only the institutes' documents cover; any of them sends the query to RAG
+    OPEN: (
+        r"timings?|schedules?|class(?:es)?|batch(?:es)?|price|pricing|fees?|costs?|subscriptions?|plans?|"
+        r"programs?|programmes?|workshops?|courses?|teachers?|trainers?|instructors?|retreats?|offers?|"
+        r"teach(?:es)?|hatha|ashtanga|iyengar|vinyasa|yin|prenatal|pranayama|meditation|recommend|compare|better"
+    ),
+}
+
+# Words that may accompany a greeting without making it a question
+GREETING_FILLER = {"there", "all", "everyone", "assistant", "bot", "yoga", "friend", "again", "team"}
+
+# Directory requests come before fields so "certified institutes" is not read as a certification question
+KEYWORD_PATTERN = re.compile(
+    r"(?<!\w)(?:"
+    + "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in KEYWORD_PATTERNS.items())
+    + "|"
+    + "|".join(f"(?P<field_{name}>{pattern})" for name, pattern in FACT_FIELD_PATTERNS.items())
+    + r")(?!\w)",
+    re.IGNORECASE,
+)
+WORD_PATTERN = re.compile(r"[\w']+")
+
+# Labelled example utterances; each intent's centroid is the mean of their embeddings
+INTENT_EXAMPLES = {
+    GREETING: [
+        "hello", "hi there", "hey", "good morning", "good evening", "namaste",
+        "hello, how are you?", "hi, nice to meet you", "hey assistant", "greetings",
+    ],
+    DIRECTORY: [
+        "list all institutes", "which yoga institutes are available?", "show me the certified institutes",
+        "what institutes do you have?", "give me the full list of yoga centres",
+        "which yoga schools are in your database?", "how many institutes are registered?",
+        "yoga institutes in Karnataka", "are there any yoga centers in Kerala?",
+        "show all verified yoga studios", "what are my options for yoga institutes?",
+    ],
+    INSTITUTE_FACT: [
+        "what is the website of this institute?", "where is the institute located?",
+        "what is the institute code?", "until when is the certification valid?",
+        "what is their certification number?", "which city is the institute in?",
+        "is the institute certified?", "when does their accreditation expire?",
+        "give me the link to their site", "what is the address of the centre?",
+        "in which state is this institute?",
+    ],
+    OPEN: [
+        "what are the class timings?", "how much does a monthly subscription cost?",
+        "do they offer prenatal yoga?", "tell me about the teacher training course",
+        "which institute is best for beginners?", "are there weekend workshops?",
+        "what styles of yoga do they teach?", "can I book a private session?",
+        "do they have morning batches?", "what should I bring to my first class?",
+        "is yoga good for back pain?", "tell me about this institute",
+        "what programs are offered?", "thanks for the help",
+    ],
+}
+
+# Minimum classifier confidence for each fast path
+DEFAULT_THRESHOLDS = {GREETING: 0.6, DIRECTORY: 0.6, INSTITUTE_FACT: 0.6}
+
+
+@dataclass
+class Intent:
+    """A routing decision; institute, fields, cities and states carry what the fast path needs"""
+    name: str
+    confidence: float
+    source: str  # "keywords" or "classifier"
+    institute: dict = None
+    fields: list = field(default_factory=list)
+    cities: list = field(default_factory=list)
+    states: list = field(default_factory=list)
+
+
+def scan_keywords(query):
+    """Run the keyword pattern once; returns (matched intents, asked fact fields, greeting-only)"""
+    kinds, fields = set(), []
+    greeting_spans = []
+    for match in KEYWORD_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind.startswith("field_"):
+            if kind[6:] not in fields:
+                fields.append(kind[6:])
+        else:
+            kinds.add(kind)
+            if kind == GREETING:
+                greeting_spans.append(match.span())
+    greeting_only = False
+    if greeting_spans:
+        rest = query
+        for start, end in reversed(greeting_spans):
+            rest = rest[:start] + " " + rest[end:]
+        greeting_only = all(word.lower() in GREETING_FILLER for word in WORD_PATTERN.findall(rest))
+    return kinds, fields, greeting_only
+
+
+class IntentRouter:
+    """Keyword automaton first, nearest-centroid classifier second, "open" when neither is confident.
+
+    embed_texts(list) embeds the example utterances (once, through the embedding
+    cache); embed_query(text) embeds a query and defaults to embed_texts. Without
+    embed_texts the router only uses keywords. refresh_entities() reloads the
+    entity list (default: entity_router.refresh); use_classifier() returning
+    False skips the classifier, e.g. when retrieval would not embed the query.
+    """
+
+    def __init__(self, entity_router, embed_texts=None, embed_query=None, thresholds=None,
+                 examples=INTENT_EXAMPLES, temperature=0.05, refresh_entities=None, use_classifier=None):
+        self.entity_router = entity_router
+        self.embed_texts = embed_texts
+        self.embed_query = embed_query or (lambda text: embed_texts([text])[0])
+        self.refresh_entities = refresh_entities or entity_router.refresh
+        self.use_classifier = use_classifier or (lambda: True)
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.examples = examples
+        self.temperature = temperature
+        self._lock = threading.Lock()
+        self._labels = None
+        self._centroids = None
+        self.routes = defaultdict(int)
+        self.classifier_errors = 0
+
+    def fit(self):
+        """Embed the example utterances and compute one unit-length centroid per intent"""
+        with self._lock:
+            if self._centroids is not None:
+                return
+            labels = [intent for intent in INTENTS if self.examples.get(intent)]
+            texts = [text for intent in labels for text in self.examples[intent]]
+            vectors = np.asarray(self.embed_texts(texts), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+            centroids, start = [], 0
+            for intent in labels:
+                count = len(self.examples[intent])
+                centroid = vectors[start:start + count].mean(axis=0)
+                centroids.append(centroid / (np.linalg.norm(centroid) + 1e-12))
+                start += count
+            self._labels = labels
+            self._centroids = np.stack(centroids)
+
+    def classify(self, query):
+        """Nearest centroid of the query embedding; returns (intent, confidence)"""
+        self.fit()
+        vector = np.asarray(self.embed_query(query), dtype=np.float32)
+        if vector.shape[0] != self._centroids.shape[1]:
+            # The collection moved to another embedding size: re-embed the examples at the new size
+            with self._lock:
+                self._centroids = None
+            self.fit()
+        similarities = self._centroids @ (vector / (np.linalg.norm(vector) + 1e-12))
+        # Softmax over cosine similarities: confident only when one centroid clearly wins
+        weights = np.exp((similarities - similarities.max()) / self.temperature)
+        probabilities = weights / weights.sum()
+        best = int(np.argmax(probabilities))
+        return self._labels[best], float(probabilities[best])
+
+    def route(self, query):
+        """Return the Intent for a query"""
+        intent = self._route(query)
+        self.routes[(intent.name, intent.source)] += 1
+        return intent
+
+    def _route(self, query):
+        self.refresh_entities()
+        # Names like "Vinyasa Yoga Centre" must not read as keywords
+        kinds, fields, greeting_only = scan_keywords(self.entity_router.strip(query))
+        if greeting_only:
+            return Intent(GREETING, 1.0, "keywords")
+        if OPEN in kinds:
+            return Intent(OPEN, 1.0, "keywords")
+
+        entities = self.entity_router.match(query)
+        institutes = entities["institutes"]
+        cities, states = sorted(entities["cities"]), sorted(entities["states"])
+        if len(institutes) == 1 and fields:
+            return Intent(INSTITUTE_FACT, 1.0, "keywords", institute=institutes[0], fields=fields)
+        if DIRECTORY in kinds and not institutes:
+            return Intent(DIRECTORY, 1.0, "keywords", cities=cities, states=states)
+
+        if self.embed_texts is None or not self.use_classifier():
+            return Intent(OPEN, 0.0, "keywords")
+        try:
+            name, confidence = self.classify(query)
+        except Exception:
+            # No embedding, no fast path: the RAG path handles (and reports) the failure
+            self.classifier_errors += 1
+            return Intent(OPEN, 0.0, "keywords")
+
+        accepted = confidence >= self.thresholds.get(name, 0.0) and (
+            name == GREETING
+            or (name == DIRECTORY and not institutes)
+            or (name == INSTITUTE_FACT and len(institutes) == 1)
+        )
+        if not accepted:
+            return Intent(OPEN, confidence if name == OPEN else 1.0 - confidence, "classifier")
+        if name == INSTITUTE_FACT:
+            return Intent(name, confidence, "classifier", institute=institutes[0], fields=fields)
+        if name == DIRECTORY:
+            return Intent(name, confidence, "classifier", cities=cities, states=states)
+        return Intent(name, confidence, "classifier")
+
+    def stats(self):
+        """Routed queries per (intent, source)"""
+        return {
+            "routes": {f"{name}/{source}": count for (name, source), count in sorted(self.routes.items())},
+            "fast_paths": sum(count for (name, _), count in self.routes.items() if name != OPEN),
+            "total": sum(self.routes.values()),
+            "classifier_errors": self.classifier_errors,
+        }
+
+
+def fact_answer(institute, fields):
+    """Answer a fact lookup from the institute's directory entry; no fields gives its whole profile"""
+    values = {
+        "website": ("🌐 Website", institute["website"]),
+        "validity": ("📅 Certification validity", institute.get("validity", "N/A")),
+        "certification": ("🏅 Certification", institute.get("certification", "N/A")),
+        "code": ("🔖 Code", institute["code"]),
+        "location": ("📍 Location", f"{institute['city']}, {institute['state']}"),
+    }
+    lines = []
+    for name in fields or values:
+        label, value = values[name]
+        lines.append(f"- {label}: {value if value and value != 'N/A' else 'not on record'}")
+    return (
+        f"**{institute['name']}**\n\n" + "\n".join(lines)
+        + "\n\nYou can also ask me about its classes, schedules, subscription plans or programs."
+    )
@@ -0,0 +1,266 @@
+# ---------------------------
+# Hierarchical (Parent/Child) Chunking
+# ---------------------------
+# Long institute documents such as class schedules or subscription tables are
+# split into parent sections at blank lines, and each section into small,
+# token-bounded child chunks on line boundaries. Only the children are
+# embedded: they go into the collection like any other chunk, carrying the
+# document's payload and their parent section's ID. The sections are stored
+# without vectors in "<collection>_parents". Retrieval matches on children
+# and returns each parent section once, fetched in bulk (rag_core.py).
+# Documents that fit in one child chunk are stored whole, as before.
+#
+#   python parent_chunks.py schedules.jsonl --dry-run
+import argparse
+import json
+import re
+import uuid
+from dataclasses import dataclass
+
+from qdrant_client import models
+
+from ingestion import batched
+from prompt_assembly import TokenCounter
+
+PARENT_SUFFIX = "_parents"
+
+# Fixed namespace: re-ingesting a document overwrites its chunks instead of duplicating them
+CHUNK_ID_NAMESPACE = uuid.UUID("0f6c2d7e-8a41-4b93-b5e2-7d1a9c3e6f58")
+
+BLANK_LINES = re.compile(r"\n\s*\n")
+
+
+@dataclass
+class ChunkingConfig:
+    # Children are what gets embedded; documents up to this size are stored whole
+    child_tokens: int = 128
+    # Sections larger than this are split
+    parent_tokens: int = 512
+    # Blocks shorter than this (a title, a one-line note) join the next section
+    min_section_tokens: int = 32
+
+
+def parent_collection_name(collection_name="Institutes"):
+    return collection_name + PARENT_SUFFIX
+
+
+def chunk_id(*parts):
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, ":".join(str(part) for part in parts)))
+
+
+def document_key(document):
+    return str(document.get("key", document.get("id")))
+
+
+def _pieces(text, limit, counter):
+    """Non-empty lines of text; a line over limit tokens is cut into word runs that fit"""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if counter.count(line) <= limit:
+            yield line
+            continue
+        run = []
+        for word in line.split():
+            if run and counter.count(" ".join(run + [word])) > limit:
+                yield " ".join(run)
+                run = []
+            run.append(word)
+        if run:
+            yield " ".join(run)
+
+
+def pack(pieces, limit, counter, separator="\n"):
+    """Greedily join consecutive pieces into groups of at most limit tokens"""
+    groups, current, used = [], [], 0
+    for piece in pieces:
+        tokens = counter.count(piece)
+        if current and used + tokens > limit:
+            groups.append(separator.join(current))
+            current, used = [], 0
+        current.append(piece)
+        used += tokens
+    if current:
+        groups.append(separator.join(current))
+    return groups
+
+
+def split_sections(text, config, counter):
+    """Blank-line blocks of text, oversized blocks split and short ones merged with the next"""
+    blocks = []
+    for block in BLANK_LINES.split(text):
+        block = block.strip()
+        if not block:
+            continue
+        if counter.count(block) > config.parent_tokens:
+            blocks.extend(pack(_pieces(block, config.parent_tokens, counter), config.parent_tokens, counter))
+        else:
+            blocks.append(block)
+
+    sections, current = [], ""
+    for block in blocks:
+        merged = f"{current}\n\n{block}" if current else block
+        if current and (counter.count(current) >= config.min_section_tokens
+                        or counter.count(merged) > config.parent_tokens):
+            sections.append(current)
+            current = block
+        else:
+            current = merged
+    if current:
+        # A short last block joins the previous section when it fits
+        merged = f"{sections[-1]}\n\n{current}" if sections else current
+        if sections and counter.count(current) < config.min_section_tokens \
+                and counter.count(merged) <= config.parent_tokens:
+            sections[-1] = merged
+        else:
+            sections.append(current)
+    return sections
+
+
+def _with_heading(heading, text, separator="\n"):
+    return text if not heading or text.startswith(heading) else heading + separator + text
+
+
+def split_document(document, config=None, counter=None):
+    """Child documents to embed and parent sections to store for one {"key"/"id", "text", "payload"} document.
+
+    Every chunk repeats the document's first line (its title) so it stands on
+    its own. A document that fits in one child is returned whole with no parents.
+    """
+    config = config or ChunkingConfig()
+    counter = counter or TokenCounter()
+    key, text = document_key(document), document["text"].strip()
+    payload = dict(document.get("payload", {}), document_key=key)
+    if counter.count(text) <= config.child_tokens:
+        return [{"id": document.get("id", chunk_id("document", key)), "text": document["text"],
+                 "payload": payload}], []
+
+    first_line = text.splitlines()[0].strip()
+    heading = first_line if counter.count(first_line) <= config.child_tokens // 2 else ""
+    children, parents = [], []
+    for section_number, section in enumerate(split_sections(text, config, counter)):
+        parent_id = chunk_id("parent", key, section_number)
+        content = _with_heading(heading, section, "\n\n")
+        parents.append({"id": parent_id, "payload": dict(payload, content=content, section=section_number)})
+        limit = config.child_tokens - (counter.count(heading) if heading else 0)
+        for number, child in enumerate(pack(_pieces(section, limit, counter), limit, counter)):
+            child_text = _with_heading(heading, child)
+            children.append({
+                "id": chunk_id("child", key, section_number, number),
+                "text": child_text,
+                "payload": dict(payload, content=child_text, parent_id=parent_id),
+            })
+    return children, parents
+
+
+def ensure_parent_collection(qdrant, collection_name="Institutes"):
+    """Create the vectorless parents collection and the document_key indexes used to delete stale chunks"""
+    parents = parent_collection_name(collection_name)
+    if not qdrant.collection_exists(parents):
+        qdrant.create_collection(parents, vectors_config={})
+    for name in (collection_name, parents):
+        if "document_key" not in (qdrant.get_collection(name).payload_schema or {}):
+            qdrant.create_payload_index(collection_name=name, field_name="document_key",
+                                        field_schema=models.PayloadSchemaType.KEYWORD)
+
+
+def delete_stale(qdrant, collection_name, keys, keep_ids):
+    """Delete points of these documents whose IDs the latest split did not produce"""
+    if not keys:
+        return
+    qdrant.delete(
+        collection_name=collection_name,
+        points_selector=models.FilterSelector(filter=models.Filter(
+            must=[models.FieldCondition(key="document_key", match=models.MatchAny(any=list(keys)))],
+            must_not=[models.HasIdCondition(has_id=list(keep_ids))],
+        )),
+        wait=True,
+    )
+
+
+def ingest_documents(qdrant, engine, documents, config=None, counter=None, collection_name="Institutes"):
+    """Split documents, store their parent sections, then embed and upsert the children (and short documents).
+
+    Chunks left over from an earlier split of the same documents are deleted.
+    Returns (IngestionReport, {"documents", "split", "children", "parents"}).
+    """
+    config = config or ChunkingConfig()
+    counter = counter or TokenCounter()
+    parents_name = parent_collection_name(collection_name)
+    ensure_parent_collection(qdrant, collection_name)
+
+    children, parents, keys, split = [], [], [], 0
+    for document in documents:
+        document_children, document_parents = split_document(document, config, counter)
+        children.extend(document_children)
+        parents.extend(document_parents)
+        keys.append(document_key(document))
+        split += bool(document_parents)
+
+    # Parents first: a child is never searchable before the section it expands to
+    for chunk in batched(parents, engine.upsert_batch_size):
+        qdrant.upsert(collection_name=parents_name, wait=True, points=[
+            models.PointStruct(id=parent["id"], vector={}, payload=parent["payload"]) for parent in chunk
+        ])
+    report = engine.run(children)
+    delete_stale(qdrant, collection_name, keys, [child["id"] for child in children])
+    delete_stale(qdrant, parents_name, keys, [parent["id"] for parent in parents])
+    return report, {"documents": len(keys), "split": split, "children": len(children), "parents": len(parents)}
+
+
+def read_documents(path):
+    """{"key", "text", ...payload fields} records of a JSONL file as ingestion documents"""
+    documents = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record.get("key") or not record.get("text"):
+                raise ValueError(f"{path}: record {number} needs a key and a text")
+            payload = {name: value for name, value in record.items() if name not in ("key", "text")}
+            documents.append({"key": str(record["key"]), "text": record["text"], "payload": payload})
+    return documents
+
+
+def main(args):
+    config = ChunkingConfig(child_tokens=args.child_tokens, parent_tokens=args.parent_tokens)
+    counter = TokenCounter()
+    documents = read_documents(args.source)
+    if args.dry_run:
+        for document in documents:
+            children, parents = split_document(document, config, counter)
+            print(f"{document['key']}: {counter.count(document['text'])} tokens -> "
+                  + (f"{len(parents)} sections, {len(children)} children" if parents else "stored whole"))
+        return
+
+    from admission import BACKGROUND
+    from clients import ClientConfig, create_clients
+    from collection_profiles import collection_settings
+    from ingestion import IngestionEngine, openai_embedder
+    from institute_directory import bump_directory_version
+    from rag_core import EMBEDDING_MODEL
+
+    clients = create_clients(ClientConfig.from_env(), async_clients=False, priority=BACKGROUND)
+    dimensions = collection_settings(clients.qdrant.get_collection(args.collection))["dimensions"]
+    engine = IngestionEngine(clients.qdrant, openai_embedder(clients.openai, EMBEDDING_MODEL, dimensions),
+                             collection_name=args.collection)
+    report, stats = ingest_documents(clients.qdrant, engine, documents, config, counter, args.collection)
+    # Reload the sparse index in running apps and drop answers cached for these institutes
+    bump_directory_version(updated_institutes=sorted({
+        value for document in documents for name, value in document["payload"].items()
+        if name in ("institute_name", "code") and value
+    }))
+    print(f"✅ {stats['documents']} documents: {stats['split']} split into {stats['parents']} sections and "
+          f"{stats['children']} embedded chunks in {report.seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest long institute documents as parent sections and child chunks")
+    parser.add_argument("source", help="JSONL of {\"key\", \"text\", ...payload fields such as code, institute_name, type}")
+    parser.add_argument("--collection", default="Institutes")
+    parser.add_argument("--child-tokens", type=int, default=ChunkingConfig.child_tokens)
+    parser.add_argument("--parent-tokens", type=int, default=ChunkingConfig.parent_tokens)
+    parser.add_argument("--dry-run", action="store_true", help="Print how each document would be split")
+    main(parser.parse_args())
@@ -0,0 +1,197 @@
+# ---------------------------
+# Token-budgeted Prompt Assembly
+# ---------------------------
+# Counts tokens with the model's tokenizer, removes duplicate and near-duplicate
+# chunks, fills a context budget in score order and trims history by tokens.
+# Static system instructions always come first so the provider can reuse the
+# cached prompt prefix across requests.
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+try:
+    import tiktoken
+except ImportError:  # optional; falls back to an approximate count
+    tiktoken = None
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Static instructions go first and never change, so the provider can reuse the cached prefix
+SYSTEM_INSTRUCTIONS = """You are a professional Yoga AI Assistant for certified yoga institutes. Your role is to provide accurate, helpful, and professional information.
+
+IMPORTANT INSTRUCTIONS:
+1. Answer questions ONLY about the specific institute mentioned in the user's query
+2. Use ONLY the information provided in the context from the database
+3. Be professional, clear, and concise
+4. If the context doesn't contain information about the specific institute asked, politely say so
+5. Format pricing and schedules clearly
+6. Always maintain a helpful and welcoming tone
+7. Remember the conversation history and provide contextual responses"""
+
+# Per-message framing tokens of the chat format, and the tokens priming the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+
+
+@dataclass
+class PromptBudget:
+    context_tokens: int = 1500
+    history_tokens: int = 1200
+    near_duplicate_threshold: float = 0.9
+
+
+class TokenCounter:
+    """Token counts from tiktoken, or a word/punctuation approximation when it is unavailable"""
+
+    def __init__(self, model="gpt-4o-mini", cache_size=4096):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                # Unknown model or the encoding file cannot be downloaded
+                self.encoding = None
+        self.cache_size = cache_size
+        # One counter serves every session of the app; the LRU is not safe to reorder concurrently
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    @property
+    def exact(self):
+        return self.encoding is not None
+
+    def count(self, text):
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+        # Encode outside the lock so long texts do not serialize other sessions
+        if self.encoding is not None:
+            tokens = len(self.encoding.encode(text))
+        else:
+            tokens = len(WORD_PATTERN.findall(text))
+        with self._lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def truncate(self, text, max_tokens):
+        """Cut text down to at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+        matches = list(WORD_PATTERN.finditer(text))
+        if len(matches) <= max_tokens:
+            return text
+        return text[:matches[max_tokens].start()].rstrip()
+
+    def count_message(self, message):
+        return MESSAGE_OVERHEAD_TOKENS + self.count(message["content"])
+
+    def count_messages(self, messages):
+        return sum(self.count_message(m) for m in messages) + REPLY_PRIMING_TOKENS
+
+
+def chunks_from_points(points):
+    """Chunk texts of retrieved points ordered by score, best first"""
+    ranked = sorted(points, key=lambda point: point.score or 0.0, reverse=True)
+    return [point.payload["content"] for point in ranked if "content" in (point.payload or {})]
+
+
+def _words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _shingles(text, size=3):
+    words = _words(text)
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def dedupe_chunks(chunks, threshold=0.9):
+    """Drop exact and near-duplicate chunks (word-shingle Jaccard >= threshold), keeping the first"""
+    kept, seen_hashes, kept_shingles = [], set(), []
+    for chunk in chunks:
+        digest = hashlib.sha1(" ".join(_words(chunk)).encode()).hexdigest()
+        if digest in seen_hashes:
+            continue
+        shingles = _shingles(chunk)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        seen_hashes.add(digest)
+        kept_shingles.append(shingles)
+        kept.append(chunk)
+    return kept
+
+
+def select_context(chunks, budget_tokens, counter, threshold=0.9):
+    """Fill the budget with deduplicated chunks in the given (score) order; returns (chunks, report)"""
+    unique = dedupe_chunks(chunks, threshold)
+    selected, used = [], 0
+    for chunk in unique:
+        tokens = counter.count(chunk)
+        if used + tokens > budget_tokens:
+            if not selected:
+                # Better a truncated best chunk than no context at all
+                chunk = counter.truncate(chunk, budget_tokens)
+                tokens = counter.count(chunk)
+            else:
+                continue
+        selected.append(chunk)
+        used += tokens
+    return selected, {
+        "context_tokens": used,
+        "context_budget": budget_tokens,
+        "chunks_used": len(selected),
+        "chunks_dropped": len(unique) - len(selected),
+        "duplicates_removed": len(chunks) - len(unique),
+    }
+
+
+def trim_history(history, budget_tokens, counter):
+    """Keep the newest messages whose combined size fits the budget; returns (messages, tokens)"""
+    kept, used = [], 0
+    for msg in reversed(history):
+        tokens = counter.count_message(msg)
+        if used + tokens > budget_tokens:
+            break
+        kept.append({"role": msg["role"], "content": msg["content"]})
+        used += tokens
+    kept.reverse()
+    return kept, used
+
+
+def assemble_prompt(instructions, chunks, history, query, counter, budget=None, summary=""):
+    """Build the chat messages within budget; returns (messages, budget report).
+
+    Order: static instructions, summary of earlier turns, history, retrieved
+    context, question. The instructions never change, so every request shares
+    that cached prefix.
+    """
+    budget = budget or PromptBudget()
+    selected, report = select_context(chunks, budget.context_tokens, counter, budget.near_duplicate_threshold)
+    history_messages, history_tokens = trim_history(history, budget.history_tokens, counter)
+
+    messages = [{"role": "system", "content": instructions}]
+    if summary:
+        messages.append({"role": "system", "content": "Summary of the earlier conversation:\n" + summary})
+    messages.extend(history_messages)
+    messages.append({"role": "system", "content": "Context from database:\n" + "\n".join(selected)})
+    messages.append({"role": "user", "content": query})
+
+    report.update({
+        "history_tokens": history_tokens,
+        "history_budget": budget.history_tokens,
+        "history_messages": len(history_messages),
+        "history_dropped": len(history) - len(history_messages),
+        "summary_tokens": counter.count(summary) if summary else 0,
+        "prompt_tokens_estimate": counter.count_messages(messages),
+        "exact_count": counter.exact,
+    })
+    return messages, report
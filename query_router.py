@@ -0,0 +1,122 @@
+# ---------------------------
+# Entity-aware Query Routing
+# ---------------------------
+# Keeps a dictionary of institute names, codes, cities and states (built from
+# the institute directory payloads), matches them in a query with one
+# precompiled pattern and turns the matches into a Qdrant query_filter. The
+# core uses the filter to boost matching chunks, not to restrict the search:
+# chunks without the routed fields (pricing, schedules) still compete.
+import re
+import threading
+
+from qdrant_client import models
+
+# Keyword payload indexes backing the router's filters and the directory scroll
+PAYLOAD_INDEX_FIELDS = ("institute_name", "code", "city", "state", "type")
+
+
+def ensure_payload_indexes(qdrant, collection_name="Institutes"):
+    """Create keyword payload indexes for the routed fields (no-op for existing ones)"""
+    existing = qdrant.get_collection(collection_name).payload_schema or {}
+    for field_name in PAYLOAD_INDEX_FIELDS:
+        if field_name not in existing:
+            qdrant.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+
+
+class EntityRouter:
+    """Match known institute entities in a query and build a payload filter for them"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._source = None
+        self._pattern = None
+        self._entities = {}
+        self.routed = 0
+        self.unrouted = 0
+
+    def _build(self, institutes):
+        """Compile one alternation over every known entity, longest first"""
+        entities = {}
+        for inst in institutes:
+            for kind, value in (("institute", inst["name"]), ("institute", inst["code"]),
+                                ("city", inst["city"]), ("state", inst["state"])):
+                if value and value != "N/A":
+                    entities.setdefault(value.lower(), (kind, inst))
+        terms = sorted(entities, key=len, reverse=True)
+        pattern = None
+        if terms:
+            pattern = re.compile(
+                r"(?<!\w)(" + "|".join(re.escape(term) for term in terms) + r")(?!\w)",
+                re.IGNORECASE,
+            )
+        return pattern, entities
+
+    def refresh(self):
+        """Rebuild the matcher if the directory loaded a new institute list"""
+        self.directory.list()
+        institutes = self.directory.cached()
+        with self._lock:
+            if institutes is not self._source:
+                self._pattern, self._entities = self._build(institutes)
+                self._source = institutes
+
+    def match(self, query):
+        """Return matched entities as {"institutes": [...], "cities": {...}, "states": {...}}"""
+        matches = {"institutes": [], "cities": set(), "states": set()}
+        pattern, entities = self._pattern, self._entities
+        if pattern is None:
+            return matches
+        for found in pattern.findall(query):
+            kind, inst = entities[found.lower()]
+            if kind == "institute":
+                if inst not in matches["institutes"]:
+                    matches["institutes"].append(inst)
+            elif kind == "city":
+                matches["cities"].add(inst["city"])
+            else:
+                matches["states"].add(inst["state"])
+        return matches
+
+    def strip(self, query):
+        """The query with every matched entity blanked out"""
+        pattern = self._pattern
+        return pattern.sub(" ", query) if pattern is not None else query
+
+    def filter_for(self, query):
+        """Build a query_filter for the entities named in the query, or None"""
+        matches = self.match(query)
+        if matches["institutes"]:
+            # A named institute already pins the location; chunks may carry the name, the code or both
+            names = [inst["name"] for inst in matches["institutes"]]
+            codes = [inst["code"] for inst in matches["institutes"] if inst["code"] != "N/A"]
+            conditions = [models.FieldCondition(key="institute_name", match=models.MatchAny(any=names))]
+            if codes:
+                conditions.append(models.FieldCondition(key="code", match=models.MatchAny(any=codes)))
+            query_filter = models.Filter(should=conditions)
+        elif matches["cities"] or matches["states"]:
+            conditions = []
+            if matches["cities"]:
+                conditions.append(models.FieldCondition(key="city", match=models.MatchAny(any=sorted(matches["cities"]))))
+            if matches["states"]:
+                conditions.append(models.FieldCondition(key="state", match=models.MatchAny(any=sorted(matches["states"]))))
+            query_filter = models.Filter(should=conditions)
+        else:
+            query_filter = None
+
+        if query_filter is None:
+            self.unrouted += 1
+        else:
+            self.routed += 1
+        return query_filter
+
+    def stats(self):
+        return {
+            "routed": self.routed,
+            "unrouted": self.unrouted,
+            "entities": len(self._entities),
+        }
@@ -0,0 +1,645 @@
+# ---------------------------
+# Async RAG Core
+# ---------------------------
+# Embedding, vector search and chat completion on AsyncOpenAI / AsyncQdrantClient
+# with a deadline per stage, hedged duplicate requests for the embedding and
+# Qdrant calls once they run past their observed p95, and jittered retries.
+# When retrieval fails, the core degrades to the cached institute directory.
+# Retrieval runs in one of three modes: "dense" (vector search only), "sparse"
+# (BM25 only, no embedding call) or "hybrid" (both concurrently, fused by RRF).
+# With a local vector snapshot, vector search is served in-process and only
+# falls through to Qdrant while the snapshot is missing or stale. A shared
+# SingleFlight coalesces identical in-flight embeddings, retrievals and answers.
+# Optional collection settings (collection_profiles.py) set the embedding size
+# requested from the API and the quantization search params of each query.
+# With re-ranking on, vector search over-fetches a candidate pool with vectors
+# and MMR picks a diverse, de-duplicated top-k from it (rerank.py).
+# Child chunks of long documents (parent_chunks.py) count once per parent
+# section, and the chosen ones are swapped for their sections in one bulk fetch.
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from qdrant_client import models
+
+from admission import RateLimited
+from embedding_cache import model_key, normalize_query
+from rerank import rerank_points
+from sparse_index import reciprocal_rank_fusion
+from telemetry import DISABLED
+
+# Child candidates fetched per top-k slot, since several children can share a parent
+CHILDREN_PER_PARENT = 3
+
+# Seconds a failed query embedding is remembered, so the intent classifier and
+# retrieval of the same turn do not both wait out the embed deadline
+EMBED_FAILURE_TTL = 10.0
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4o-mini"
+
+
+class StageError(Exception):
+    """A pipeline stage failed or ran past its deadline; retry_after is set when admission rejected it"""
+
+    def __init__(self, stage, message, retry_after=None):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+@dataclass
+class StageDeadlines:
+    """Seconds each stage may take in total, retries and hedges included"""
+    embed: float = 4.0
+    search: float = 3.0
+    first_token: float = 20.0
+    stream_idle: float = 15.0
+    generate: float = 60.0
+    directory: float = 5.0
+    # One multi-input embedding or batched search request of the bulk CLI
+    batch: float = 60.0
+
+
+@dataclass
+class RetrievalResult:
+    points: list = field(default_factory=list)
+    query_vector: list = None
+    degraded: bool = False
+    # Cached directory entries used instead of points when degraded
+    institutes: list = field(default_factory=list)
+
+
+def best_child_per_parent(points):
+    """Drop every candidate whose parent section an earlier (better) candidate already stands for"""
+    seen, kept = set(), []
+    for point in points:
+        parent_id = (point.payload or {}).get("parent_id")
+        if parent_id is not None:
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+        kept.append(point)
+    return kept
+
+
+def usage_from_response(usage):
+    """Convert an OpenAI usage object into the usage_info dict"""
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens
+    }
+
+
+def messages_key(messages):
+    """Stable digest of a chat request, so identical prompts can share one completion"""
+    return hashlib.sha1(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+
+
+def directory_context(institutes):
+    """Build a fallback context from directory entries"""
+    lines = ["Institute directory (detailed documents are temporarily unavailable):"]
+    for inst in institutes:
+        lines.append(
+            f"- {inst['name']} | Location: {inst['city']}, {inst['state']} | "
+            f"Code: {inst['code']} | Website: {inst['website']}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+class LatencyTracker:
+    """Rolling latency window for one stage; its p95 decides when to hedge"""
+
+    def __init__(self, default_hedge_after, window=200, min_samples=20, min_hedge_after=0.05):
+        self.samples = deque(maxlen=window)
+        self.default_hedge_after = default_hedge_after
+        self.min_samples = min_samples
+        self.min_hedge_after = min_hedge_after
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def p95(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_after(self):
+        if len(self.samples) < self.min_samples:
+            return self.default_hedge_after
+        return max(self.min_hedge_after, self.p95())
+
+
+async def hedged(make_call, hedge_after):
+    """Run make_call(); if it is still pending after hedge_after seconds, race a duplicate.
+
+    Returns (result, hedge_fired). The loser is cancelled.
+    """
+    tasks = [asyncio.ensure_future(make_call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done:
+            return tasks[0].result(), False
+
+        tasks.append(asyncio.ensure_future(make_call()))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), True
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def retry_async(make_call, retries=2, base_delay=0.2, max_delay=2.0):
+    """Await make_call(), retrying failures with full-jitter exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return await make_call()
+        except (asyncio.CancelledError, RateLimited):
+            # Retrying a rejection would only queue again
+            raise
+        except Exception:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+class BackgroundLoop:
+    """An event loop on a daemon thread, so synchronous callers (Streamlit) can share the async core"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="rag-core-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the loop and block for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, agen):
+        """Expose an async generator as a synchronous generator"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+
+class RagCore:
+    """Async embed -> search -> generate pipeline shared by the UI and the CLI"""
+
+    def __init__(self, openai_client, qdrant_client, collection_name="Institutes",
+                 embedding_model=EMBEDDING_MODEL, chat_model=CHAT_MODEL, embedding_cache=None,
+                 directory=None, router=None, sparse_index=None, retrieval_mode="dense",
+                 embedding_budget=None, deadlines=None, retries=2, telemetry=None, local_index=None,
+                 single_flight=None, collection_settings=None, rerank=None, parent_collection=None):
+        self.openai = openai_client
+        self.qdrant = qdrant_client
+        self.collection_name = collection_name
+        self.embedding_model = embedding_model
+        self.chat_model = chat_model
+        self.embedding_cache = embedding_cache
+        self.directory = directory
+        self.router = router
+        self.sparse_index = sparse_index
+        self.local_index = local_index
+        self.single_flight = single_flight
+        self.collection_settings = collection_settings
+        # RerankConfig; None returns the plain top-k of each search
+        self.rerank = rerank
+        # Collection of parent sections (parent_chunks.py); None returns child chunks as they are
+        self.parent_collection = parent_collection
+        self.retrieval_mode = retrieval_mode if sparse_index is not None else "dense"
+        # Optional callable; when it returns False hybrid retrieval takes the sparse-only path
+        self.embedding_budget = embedding_budget
+        self.deadlines = deadlines or StageDeadlines()
+        self.retries = retries
+        self.telemetry = telemetry or DISABLED
+        self.trackers = {
+            "embed": LatencyTracker(default_hedge_after=1.0),
+            "search": LatencyTracker(default_hedge_after=0.5),
+        }
+        self.counters = {"hedges": 0, "timeouts": 0, "degraded": 0, "sparse_only": 0, "local_searches": 0,
+                         "rate_limited": 0, "parent_fallbacks": 0}
+        self._embed_failures = {}
+
+    async def _run_stage(self, stage, make_call, deadline, hedge=False):
+        """Run one stage under its deadline, with retries and optional hedging"""
+        tracker = self.trackers.get(stage)
+
+        async def timed_call():
+            start = time.perf_counter()
+            result = await make_call()
+            if tracker is not None:
+                tracker.record(time.perf_counter() - start)
+            return result
+
+        async def attempt():
+            if not hedge:
+                return await timed_call()
+            result, hedge_fired = await hedged(timed_call, tracker.hedge_after())
+            if hedge_fired:
+                self.counters["hedges"] += 1
+            return result
+
+        try:
+            with self.telemetry.span(stage):
+                return await asyncio.wait_for(retry_async(attempt, self.retries), timeout=deadline)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise StageError(stage, f"no result within {deadline:.1f}s") from None
+        except RateLimited as e:
+            self.counters["rate_limited"] += 1
+            raise StageError(stage, str(e), retry_after=e.retry_after) from e
+        except Exception as e:
+            raise StageError(stage, str(e)) from e
+
+    def embedding_dimensions(self):
+        """Size to request from the embeddings API; None for the model's native size"""
+        if self.collection_settings is None:
+            return None
+        return self.collection_settings.current()["dimensions"]
+
+    def embedding_key(self):
+        """Embedding cache key for the current model and size"""
+        return model_key(self.embedding_model, self.embedding_dimensions())
+
+    def search_params(self):
+        """Quantization search params (oversampling and rescoring) of the current collection, or None"""
+        if self.collection_settings is None:
+            return None
+        return self.collection_settings.current()["search_params"]
+
+    def _embedding_kwargs(self):
+        dimensions = self.embedding_dimensions()
+        return {"dimensions": dimensions} if dimensions else {}
+
+    async def _coalesced(self, key, make_call):
+        if self.single_flight is None:
+            return await make_call()
+        result, _ = await self.single_flight.run(key, make_call)
+        return result
+
+    def will_embed(self):
+        """Whether retrieval would embed the query now: dense mode always, hybrid while the embedding budget lasts"""
+        if self.retrieval_mode == "dense":
+            return True
+        return self.retrieval_mode == "hybrid" and (self.embedding_budget is None or self.embedding_budget())
+
+    async def refresh_router(self):
+        """Reload the entity router's institute list under the directory deadline; failures keep the old list"""
+        if self.router is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self.router.refresh), self.deadlines.directory)
+        except Exception:
+            pass  # keep routing with the entities we already know
+
+    async def embed(self, text):
+        """Embed a query, serving repeats from the embedding cache; a recent failure is raised again at once"""
+        key = self.embedding_key()
+        failure_key = (key, normalize_query(text))
+        now = time.monotonic()
+        failed = self._embed_failures.get(failure_key)
+        if failed is not None and now - failed[0] < EMBED_FAILURE_TTL:
+            raise failed[1]
+        try:
+            return await self._coalesced(("embed",) + failure_key, lambda: self._embed(text, key))
+        except StageError as e:
+            self._embed_failures = {k: v for k, v in self._embed_failures.items() if now - v[0] < EMBED_FAILURE_TTL}
+            self._embed_failures[failure_key] = (now, e)
+            raise
+
+    async def _embed(self, text, key):
+        if self.embedding_cache is not None:
+            vector = self.embedding_cache.get(text, key)
+            if vector is not None:
+                return vector
+
+        kwargs = self._embedding_kwargs()
+
+        async def call():
+            resp = await self.openai.embeddings.create(model=self.embedding_model, input=text, **kwargs)
+            return resp.data[0].embedding
+
+        vector = await self._run_stage("embed", call, self.deadlines.embed, hedge=True)
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(text, key, vector)
+        return vector
+
+    async def embed_batch(self, texts):
+        """Embed many texts, sending every cache miss in one multi-input request; returns vectors in order"""
+        cache, key = self.embedding_cache, self.embedding_key()
+        vectors = [cache.get(text, key) if cache is not None else None for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if not missing:
+            return vectors
+
+        kwargs = self._embedding_kwargs()
+
+        async def call():
+            resp = await self.openai.embeddings.create(model=self.embedding_model,
+                                                       input=[texts[i] for i in missing], **kwargs)
+            return [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+
+        for i, vector in zip(missing, await self._run_stage("embed_batch", call, self.deadlines.batch)):
+            vectors[i] = vector
+            if cache is not None:
+                cache.put(texts[i], key, vector)
+        return vectors
+
+    async def search_batch(self, query_vectors, top_k=4, query_filters=None):
+        """Search many vectors with one query_batch_points request; returns one point list per vector"""
+        query_filters = query_filters or [None] * len(query_vectors)
+        search_params = self.search_params()
+
+        async def call():
+            responses = await self.qdrant.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    models.QueryRequest(query=vector, filter=query_filter, limit=self._pool_size(top_k),
+                                        params=search_params, with_payload=True,
+                                        with_vector=self.rerank is not None)
+                    for vector, query_filter in zip(query_vectors, query_filters)
+                ]
+            )
+            return [response.points for response in responses]
+
+        results = await self._run_stage("search_batch", call, self.deadlines.batch)
+        return await self._expand_parents([self._rerank(points, top_k) for points in results])
+
+    def _pool_size(self, top_k):
+        """Candidates to fetch for a top-k: the re-ranking pool and enough children per parent"""
+        size = top_k
+        if self.rerank is not None:
+            size = max(size, self.rerank.pool_size)
+        if self.parent_collection is not None:
+            size = max(size, top_k * CHILDREN_PER_PARENT)
+        return size
+
+    def _rerank(self, points, top_k, scale_scores=False):
+        """Top-k of the candidates with one child per parent section, by MMR when re-ranking is on;
+        scale_scores for fused (non-cosine) scores"""
+        if self.parent_collection is not None:
+            points = best_child_per_parent(points)
+        if self.rerank is None:
+            return points[:top_k]
+        with self.telemetry.span("rerank", candidates=len(points)):
+            return rerank_points(points, top_k, self.rerank, scale_scores)
+
+    async def _expand_parents(self, results):
+        """Replace child chunks with their parent sections, fetched in one request for every point list.
+
+        Parents take their child's place and score. If the fetch fails, the
+        children are returned as they are.
+        """
+        parent_ids = list(dict.fromkeys(
+            (point.payload or {})["parent_id"]
+            for points in results for point in points if (point.payload or {}).get("parent_id")
+        ))
+        if not parent_ids:
+            return results
+
+        async def call():
+            return await self.qdrant.retrieve(collection_name=self.parent_collection, ids=parent_ids,
+                                              with_payload=True, with_vectors=False)
+
+        try:
+            parents = {str(record.id): record.payload for record in
+                       await self._run_stage("parents", call, self.deadlines.search)}
+        except StageError:
+            self.counters["parent_fallbacks"] += 1
+            return results
+        return [[
+            models.ScoredPoint(id=point.payload["parent_id"], version=0, score=point.score,
+                               payload=parents[point.payload["parent_id"]])
+            if (point.payload or {}).get("parent_id") in parents else point
+            for point in points
+        ] for points in results]
+
+    async def search(self, query_vector, top_k=4, query_filter=None, with_vectors=False):
+        """Nearest-neighbour search in the collection, optionally restricted by a payload filter"""
+        if self.local_index is not None:
+            with self.telemetry.span("local_search"):
+                points = self.local_index.search(query_vector, top_k, query_filter, with_vectors)
+            if points is not None:
+                self.counters["local_searches"] += 1
+                return points
+
+        search_params = self.search_params()
+
+        async def call():
+            results = await self.qdrant.query_points(
+                collection_name=self.collection_name,
+                query=query_vector,
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=top_k,
+                with_vectors=with_vectors
+            )
+            return results.points
+
+        return await self._run_stage("search", call, self.deadlines.search, hedge=True)
+
+    async def _directory_fallback(self):
+        if self.directory is None:
+            return []
+        institutes = self.directory.cached()
+        if institutes is None:
+            institutes = await asyncio.wait_for(asyncio.to_thread(self.directory.list), self.deadlines.directory)
+        return institutes
+
+    async def _dense(self, query, top_k, query_filter):
+        """Embed the query and run the vector search; returns (vector, points), with vectors when re-ranking.
+
+        An entity filter boosts rather than restricts: filtered and unfiltered
+        results are fused by RRF, so the scores are fused ones.
+        """
+        with_vectors = self.rerank is not None
+        vector = await self.embed(query)
+        if query_filter is None:
+            return vector, await self.search(vector, top_k, with_vectors=with_vectors)
+        filtered, unfiltered = await asyncio.gather(
+            self.search(vector, top_k, query_filter, with_vectors),
+            self.search(vector, top_k, with_vectors=with_vectors),
+        )
+        return vector, reciprocal_rank_fusion([filtered, unfiltered], top_k)
+
+    async def _sparse(self, query, top_k, query_filter):
+        """BM25 search over the in-process sparse index; an entity filter boosts like in _dense"""
+        async def call():
+            await asyncio.to_thread(self.sparse_index.refresh)
+            points = self.sparse_index.search(query, top_k)
+            if query_filter is None:
+                return points
+            return reciprocal_rank_fusion([self.sparse_index.search(query, top_k, query_filter), points], top_k)
+
+        return await self._run_stage("sparse", call, self.deadlines.search)
+
+    async def retrieve(self, query, top_k=4):
+        """Retrieve chunks for a query, degrading to the cached institute directory on failure"""
+        return await self._coalesced(("retrieve", self.retrieval_mode, normalize_query(query), top_k),
+                                     lambda: self._traced_retrieve(query, top_k))
+
+    async def _traced_retrieve(self, query, top_k):
+        with self.telemetry.span("retrieve", mode=self.retrieval_mode) as span:
+            result = await self._retrieve(query, top_k)
+            if result.points:
+                result.points = (await self._expand_parents([result.points]))[0]
+            span.set(points=len(result.points), degraded=result.degraded)
+            return result
+
+    async def _retrieve(self, query, top_k):
+        query_filter = None
+        if self.router is not None:
+            with self.telemetry.span("route") as span:
+                await self.refresh_router()
+                query_filter = self.router.filter_for(query)
+                span.set(filtered=query_filter is not None)
+        try:
+            if self.retrieval_mode == "dense":
+                vector, points = await self._dense(query, self._pool_size(top_k), query_filter)
+                return RetrievalResult(points=self._rerank(points, top_k, scale_scores=query_filter is not None),
+                                       query_vector=vector)
+
+            if not self.will_embed():
+                self.counters["sparse_only"] += 1
+                sparse = await self._sparse(query, self._pool_size(top_k), query_filter)
+                return RetrievalResult(points=self._rerank(sparse, top_k))
+
+            # Hybrid: both searches run concurrently over a deeper candidate pool, then fuse
+            candidates = max(top_k * 3, 10, self._pool_size(top_k))
+            dense, sparse = await asyncio.gather(
+                self._dense(query, candidates, query_filter),
+                self._sparse(query, candidates, query_filter),
+                return_exceptions=True
+            )
+            for result in (dense, sparse):
+                if isinstance(result, Exception) and not isinstance(result, StageError):
+                    raise result
+            if isinstance(dense, StageError):
+                if isinstance(sparse, StageError):
+                    raise dense
+                # Embedding or vector search unavailable: BM25 alone still answers exact-token questions
+                self.counters["sparse_only"] += 1
+                return RetrievalResult(points=self._rerank(sparse, top_k))
+            vector, dense_points = dense
+            if isinstance(sparse, StageError):
+                return RetrievalResult(points=self._rerank(dense_points, top_k, scale_scores=query_filter is not None),
+                                       query_vector=vector)
+            return RetrievalResult(
+                # Fused points keep the dense candidates' vectors; MMR ranks them by fused score
+                points=self._rerank(reciprocal_rank_fusion([dense_points, sparse], self._pool_size(top_k)), top_k,
+                                    scale_scores=True),
+                query_vector=vector
+            )
+        except StageError:
+            self.counters["degraded"] += 1
+            try:
+                institutes = await self._directory_fallback()
+            except Exception:
+                institutes = []
+            return RetrievalResult(degraded=True, institutes=institutes)
+
+    async def complete(self, messages):
+        """Non-streaming chat completion; returns (text, usage_info).
+
+        usage_info["coalesced"] is True when the answer came from an identical request already in flight.
+        """
+        async def call():
+            response = await self._run_stage(
+                "generate",
+                lambda: self.openai.chat.completions.create(model=self.chat_model, messages=messages),
+                self.deadlines.generate
+            )
+            return response.choices[0].message.content, usage_from_response(response.usage)
+
+        if self.single_flight is None:
+            return await call()
+        (text, usage), joined = await self.single_flight.run(("answer", self.chat_model, messages_key(messages)), call)
+        return text, dict(usage, coalesced=joined)
+
+    async def stream(self, messages, usage_info):
+        """Yield answer deltas; usage_info is filled from the final chunk of the stream.
+
+        The stream must open within deadlines.first_token and then never stall
+        for longer than deadlines.stream_idle. Identical prompts in flight share
+        one stream; joiners get usage_info["coalesced"] = True.
+        """
+        if self.single_flight is None:
+            async for delta in self._stream(messages, usage_info):
+                yield delta
+            return
+        deltas, joined = self.single_flight.stream(
+            ("answer", self.chat_model, messages_key(messages)),
+            lambda shared_usage: self._stream(messages, shared_usage),
+            usage_info
+        )
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+        usage_info["coalesced"] = joined
+
+    async def _stream(self, messages, usage_info):
+        async def open_stream():
+            stream = await self.openai.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            # Wait for the first chunk inside the retried call so only pre-token failures retry
+            iterator = stream.__aiter__()
+            try:
+                return stream, iterator, await iterator.__anext__()
+            except BaseException:
+                await stream.close()
+                raise
+
+        with self.telemetry.span("stream"):
+            stream, iterator, chunk = await self._run_stage("generate", open_stream, self.deadlines.first_token)
+            try:
+                while True:
+                    if chunk.usage:
+                        usage_info.update(usage_from_response(chunk.usage))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=self.deadlines.stream_idle)
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError:
+                        self.counters["timeouts"] += 1
+                        raise StageError("generate", f"stream stalled for {self.deadlines.stream_idle:.1f}s") from None
+                    except Exception as e:
+                        # Provider or network error after the first token; too late to retry
+                        raise StageError("generate", f"stream failed: {e}") from e
+            finally:
+                await stream.close()
+
+    def stats(self):
+        """Hedge/timeout/degradation counters, per-stage p95 latency and coalesced calls"""
+        stats = dict(self.counters)
+        if self.single_flight is not None:
+            stats["coalesced"] = sum(kind["coalesced"] for kind in self.single_flight.stats().values())
+        for stage, tracker in self.trackers.items():
+            stats[f"{stage}_p95"] = tracker.p95()
+        return stats
@@ -0,0 +1,80 @@
+# ---------------------------
+# MMR Re-ranking and Near-duplicate Removal
+# ---------------------------
+# Vector search over-fetches a pool of candidates with their vectors; this
+# picks the final top-k by maximal marginal relevance, so a chunk that repeats
+# one already chosen (the same institute blurb ingested twice, boilerplate
+# shared by every branch) loses to one that adds something. Candidates whose
+# cosine similarity to a chosen chunk reaches the duplicate threshold are
+# dropped outright. One matrix product gives every pairwise similarity; the
+# greedy selection only updates a running maximum per candidate. Relevance is
+# the search score, and candidates are compared on a prefix of their vectors:
+# text-embedding-3 prefixes keep the similarity structure of the full vector,
+# and converting the client's float lists is most of the cost.
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class RerankConfig:
+    # Candidates fetched (with vectors) before picking the top-k
+    pool_size: int = 12
+    # 1.0 ranks by relevance alone; lower values favour diversity
+    mmr_lambda: float = 0.7
+    # Cosine similarity at which a candidate counts as a copy of a chosen chunk
+    duplicate_threshold: float = 0.95
+    # Leading dimensions used to compare candidates (0 for the whole vector)
+    similarity_dimensions: int = 256
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def mmr_select(relevance, vectors, k, mmr_lambda=0.7, duplicate_threshold=0.95):
+    """Indices of up to k rows chosen greedily by lambda * relevance - (1 - lambda) * max similarity to the chosen.
+
+    relevance is one score per row; vectors are the rows' embeddings (zero rows
+    are never similar to anything). Rows at or above duplicate_threshold
+    similarity to a chosen row are skipped.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    if not len(relevance):
+        return []
+    unit = _unit_rows(np.asarray(vectors, dtype=np.float32))
+    similarity = unit @ unit.T
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+    chosen = []
+    for _ in range(min(k, len(relevance))):
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            break
+        chosen.append(best)
+        available[best] = False
+        available &= similarity[best] < duplicate_threshold
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return chosen
+
+
+def rerank_points(points, top_k, config, scale_scores=False):
+    """Diverse, de-duplicated top-k of scored points that carry vectors.
+
+    The points' scores are the relevance: cosine similarities for vector
+    search, or fused scores with scale_scores=True (scaled to a maximum of 1).
+    Points without a vector are ranked by relevance only.
+    """
+    if len(points) <= 1 or not any(point.vector for point in points):
+        return points[:top_k]
+    dims = config.similarity_dimensions or None
+    dim = len(next(point.vector for point in points if point.vector)[:dims])
+    vectors = np.asarray([point.vector[:dims] if point.vector else [0.0] * dim for point in points],
+                         dtype=np.float32)
+    relevance = np.asarray([point.score or 0.0 for point in points], dtype=np.float32)
+    if scale_scores:
+        relevance /= relevance.max() or 1.0
+    chosen = mmr_select(relevance, vectors, top_k, config.mmr_lambda, config.duplicate_threshold)
+    return [points[row] for row in chosen]
@@ -0,0 +1,222 @@
+# ---------------------------
+# Persistent Chat Session Store
+# ---------------------------
+# Sessions and their messages live in SQLite instead of st.session_state, so
+# they survive restarts and a browser session only holds the active session.
+# Each session row carries its preview and running token/cost totals, and the
+# owner row carries the all-session totals; both are updated incrementally as
+# messages are appended, so the sidebar never walks message bodies. The app
+# only writes signed-in users' chats to disk; anonymous chats use a ":memory:"
+# store that lives and dies with the browser session.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_SESSION_DB_PATH = os.path.join(".cache", "sessions.sqlite3")
+
+PREVIEW_LENGTH = 40
+
+# Message keys stored as columns; everything else (usage, cost, ttft, ...) goes to meta JSON
+MESSAGE_COLUMNS = ("role", "content")
+
+SESSION_FIELDS = ("id", "owner", "name", "created_at", "updated_at", "preview", "message_count",
+                  "total_tokens", "total_cost", "saved_tokens", "saved_cost", "memory")
+
+
+def new_session_id():
+    """Collision-free session ID"""
+    return uuid.uuid4().hex
+
+
+def identity_owner(identity):
+    """Owner ID of a signed-in identity, hashed so the database holds no emails"""
+    return hashlib.sha256(f"owner:{identity}".encode()).hexdigest()[:32]
+
+
+def preview_text(content):
+    return content[:PREVIEW_LENGTH] + "..." if len(content) > PREVIEW_LENGTH else content
+
+
+class SQLiteSessionStore:
+    """Thread-safe SQLite session store shared by all browser sessions of the process.
+
+    Sessions are plain dicts with the SESSION_FIELDS keys ("memory" decoded).
+    Messages are dicts with "role", "content", any stored extras and "seq",
+    their position in the session.
+    """
+
+    def __init__(self, path=DEFAULT_SESSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS owners (
+                   owner TEXT PRIMARY KEY,
+                   sessions INTEGER NOT NULL DEFAULT 0,
+                   total_tokens INTEGER NOT NULL DEFAULT 0,
+                   total_cost REAL NOT NULL DEFAULT 0,
+                   saved_tokens INTEGER NOT NULL DEFAULT 0,
+                   saved_cost REAL NOT NULL DEFAULT 0
+               );
+               CREATE TABLE IF NOT EXISTS sessions (
+                   id TEXT PRIMARY KEY,
+                   owner TEXT NOT NULL,
+                   name TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   updated_at REAL NOT NULL,
+                   preview TEXT NOT NULL DEFAULT '',
+                   message_count INTEGER NOT NULL DEFAULT 0,
+                   total_tokens INTEGER NOT NULL DEFAULT 0,
+                   total_cost REAL NOT NULL DEFAULT 0,
+                   saved_tokens INTEGER NOT NULL DEFAULT 0,
+                   saved_cost REAL NOT NULL DEFAULT 0,
+                   memory TEXT
+               );
+               CREATE INDEX IF NOT EXISTS sessions_by_owner ON sessions (owner, created_at);
+               CREATE TABLE IF NOT EXISTS messages (
+                   session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+                   seq INTEGER NOT NULL,
+                   role TEXT NOT NULL,
+                   content TEXT NOT NULL,
+                   meta TEXT,
+                   PRIMARY KEY (session_id, seq)
+               ) WITHOUT ROWID;"""
+        )
+        self._db.commit()
+
+    def _session(self, row):
+        session = {field: row[field] for field in SESSION_FIELDS}
+        session["memory"] = json.loads(row["memory"]) if row["memory"] else None
+        return session
+
+    def create_session(self, owner, name=None):
+        now = time.time()
+        session_id = new_session_id()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO owners (owner) VALUES (?)", (owner,))
+            self._db.execute("UPDATE owners SET sessions = sessions + 1 WHERE owner = ?", (owner,))
+            count = self._db.execute("SELECT sessions FROM owners WHERE owner = ?", (owner,)).fetchone()[0]
+            self._db.execute(
+                "INSERT INTO sessions (id, owner, name, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, owner, name or f"Chat {count}", now, now),
+            )
+        return self.get_session(session_id)
+
+    def get_session(self, session_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return self._session(row) if row else None
+
+    def list_sessions(self, owner, limit=50, offset=0):
+        """Newest sessions first, without message bodies; limit=None lists all"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM sessions WHERE owner = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (owner, -1 if limit is None else limit, offset),
+            ).fetchall()
+        return [self._session(row) for row in rows]
+
+    def count_sessions(self, owner):
+        with self._lock:
+            row = self._db.execute("SELECT sessions FROM owners WHERE owner = ?", (owner,)).fetchone()
+        return row[0] if row else 0
+
+    def delete_session(self, session_id):
+        with self._lock, self._db:
+            row = self._db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return
+            self._db.execute(
+                """UPDATE owners SET sessions = sessions - 1, total_tokens = total_tokens - ?,
+                       total_cost = total_cost - ?, saved_tokens = saved_tokens - ?, saved_cost = saved_cost - ?
+                   WHERE owner = ?""",
+                (row["total_tokens"], row["total_cost"], row["saved_tokens"], row["saved_cost"], row["owner"]),
+            )
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def append_message(self, session_id, message):
+        """Store a message and update the session's preview and totals; returns its seq"""
+        meta = {key: value for key, value in message.items() if key not in MESSAGE_COLUMNS and key != "seq"}
+        usage = message.get("usage") or {}
+        tokens = usage.get("total_tokens", 0)
+        cost = (message.get("cost") or {}).get("total_cost", 0.0)
+        saved_tokens = usage.get("saved_tokens", 0)
+        saved_cost = usage.get("saved_cost", 0.0)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT owner, message_count, preview FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+            seq = row["message_count"]
+            self._db.execute(
+                "INSERT INTO messages (session_id, seq, role, content, meta) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, message["role"], message["content"], json.dumps(meta) if meta else None),
+            )
+            preview = row["preview"]
+            if not preview and message["role"] == "user":
+                preview = preview_text(message["content"])
+            self._db.execute(
+                """UPDATE sessions SET message_count = message_count + 1, updated_at = ?, preview = ?,
+                       total_tokens = total_tokens + ?, total_cost = total_cost + ?,
+                       saved_tokens = saved_tokens + ?, saved_cost = saved_cost + ?
+                   WHERE id = ?""",
+                (time.time(), preview, tokens, cost, saved_tokens, saved_cost, session_id),
+            )
+            if tokens or cost or saved_tokens or saved_cost:
+                self._db.execute(
+                    """UPDATE owners SET total_tokens = total_tokens + ?, total_cost = total_cost + ?,
+                           saved_tokens = saved_tokens + ?, saved_cost = saved_cost + ?
+                       WHERE owner = ?""",
+                    (tokens, cost, saved_tokens, saved_cost, row["owner"]),
+                )
+        return seq
+
+    def load_messages(self, session_id, limit=None, before=None, since=None):
+        """Messages in order; limit keeps the newest ones below seq `before`, `since` is a minimum seq"""
+        conditions, params = ["session_id = ?"], [session_id]
+        if before is not None:
+            conditions.append("seq < ?")
+            params.append(before)
+        if since is not None:
+            conditions.append("seq >= ?")
+            params.append(since)
+        query = f"SELECT seq, role, content, meta FROM messages WHERE {' AND '.join(conditions)} ORDER BY seq DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        messages = []
+        for row in reversed(rows):
+            message = {"role": row["role"], "content": row["content"], "seq": row["seq"]}
+            if row["meta"]:
+                message.update(json.loads(row["meta"]))
+            messages.append(message)
+        return messages
+
+    def update_memory(self, session_id, memory):
+        # "pending" only describes an in-flight update of this process
+        memory = {key: value for key, value in memory.items() if key != "pending"}
+        with self._lock, self._db:
+            self._db.execute("UPDATE sessions SET memory = ? WHERE id = ?", (json.dumps(memory), session_id))
+
+    def owner_totals(self, owner):
+        """{"sessions", "total_tokens", "total_cost", "saved_tokens", "saved_cost"} for one owner"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sessions, total_tokens, total_cost, saved_tokens, saved_cost FROM owners WHERE owner = ?",
+                (owner,),
+            ).fetchone()
+        if row is None:
+            return {"sessions": 0, "total_tokens": 0, "total_cost": 0.0, "saved_tokens": 0, "saved_cost": 0.0}
+        return dict(row)
@@ -0,0 +1,137 @@
+# ---------------------------
+# Single-flight Request Coalescing
+# ---------------------------
+# Identical requests that are in flight at the same moment (the same question
+# from several sessions during a spike) share one upstream call: the first
+# caller starts it and everyone else awaits the same future. Streams are
+# shared too: late joiners replay the deltas produced so far, then follow live.
+import asyncio
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Process-wide registry of in-flight calls, keyed by (kind, ...) tuples.
+
+    run()/stream() coalesce coroutines and async generators on one event loop
+    (the RAG core's); call() coalesces blocking functions across threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.calls = defaultdict(int)
+        self.coalesced = defaultdict(int)
+
+    def _count(self, key, joined):
+        self.calls[key[0]] += 1
+        if joined:
+            self.coalesced[key[0]] += 1
+
+    async def run(self, key, make_call):
+        """Await make_call() once for all concurrent callers with the same key; returns (result, joined)"""
+        with self._lock:
+            task = self._inflight.get(key)
+            joined = task is not None
+            if not joined:
+                task = asyncio.ensure_future(make_call())
+                self._inflight[key] = task
+                task.add_done_callback(lambda t: self._forget(key, t))
+            self._count(key, joined)
+        # A caller giving up must not cancel the call for the others
+        return await asyncio.shield(task), joined
+
+    def call(self, key, fn):
+        """Blocking variant for threads (e.g. Streamlit sessions); returns (result, joined)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            joined = future is not None
+            if not joined:
+                future = Future()
+                self._inflight[key] = future
+            self._count(key, joined)
+        if joined:
+            return future.result(), True
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self._forget(key, future)
+        return future.result(), False
+
+    def stream(self, key, make_stream, result):
+        """Share make_stream(shared_result) among concurrent callers; returns (deltas, joined).
+
+        deltas is an async generator; once it is exhausted, result holds a copy
+        of what the stream wrote into its shared_result dict (e.g. usage).
+        """
+        with self._lock:
+            shared = self._inflight.get(key)
+            joined = shared is not None
+            if not joined:
+                shared = _SharedStream(make_stream, lambda: self._forget(key, shared))
+                self._inflight[key] = shared
+            shared.subscribers += 1
+            self._count(key, joined)
+        return shared.follow(result), joined
+
+    def _forget(self, key, flight):
+        with self._lock:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+
+    def stats(self):
+        """Calls and coalesced calls per kind"""
+        with self._lock:
+            return {kind: {"calls": self.calls[kind], "coalesced": self.coalesced[kind]} for kind in self.calls}
+
+
+class _SharedStream:
+    """One producer task fanning a stream's deltas out to every subscriber"""
+
+    def __init__(self, make_stream, on_finish):
+        self.deltas = []
+        self.done = False
+        self.error = None
+        self.result = {}
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._on_finish = on_finish
+        self._task = asyncio.ensure_future(self._produce(make_stream))
+
+    async def _produce(self, make_stream):
+        try:
+            async for delta in make_stream(self.result):
+                self.deltas.append(delta)
+                self._changed.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._on_finish()
+            self._changed.set()
+
+    async def follow(self, result):
+        index = 0
+        try:
+            while True:
+                while index < len(self.deltas):
+                    yield self.deltas[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    result.update(self.result)
+                    return
+                self._changed.clear()
+                if index < len(self.deltas) or self.done:
+                    continue
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # Every reader left: stop paying for the stream
+                self._on_finish()
+                self._task.cancel()
@@ -0,0 +1,177 @@
+# ---------------------------
+# In-process BM25 Sparse Index
+# ---------------------------
+# An inverted index over the "content" payloads of the collection. It needs no
+# embedding call and matches exact tokens (codes, certification numbers, place
+# names) that dense vectors blur. Rebuilt when ingestion bumps the directory version.
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from qdrant_client import models
+
+from institute_directory import DIRECTORY_VERSION_PATH, read_directory_version
+
+# Keeps "yai/ind/ker/24my2205" and "www.yogmaya.org" whole; their parts are indexed too
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[/\-.:][a-z0-9]+)*")
+SPLIT_PATTERN = re.compile(r"[/\-.:]")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me of on or the their "
+    "there this to what when where which who with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens; compound tokens also contribute their parts"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if SPLIT_PATTERN.search(token):
+            tokens.extend(part for part in SPLIT_PATTERN.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def matches_filter(payload, query_filter):
+    """Evaluate the keyword filters built by EntityRouter against a payload"""
+    if query_filter is None:
+        return True
+
+    def condition_holds(condition):
+        value = payload.get(condition.key)
+        match = condition.match
+        if isinstance(match, models.MatchAny):
+            return value in match.any
+        if isinstance(match, models.MatchValue):
+            return value == match.value
+        return True  # unsupported conditions do not narrow the sparse results
+
+    if query_filter.must and not all(condition_holds(c) for c in query_filter.must):
+        return False
+    if query_filter.must_not and any(condition_holds(c) for c in query_filter.must_not):
+        return False
+    if query_filter.should and not any(condition_holds(c) for c in query_filter.should):
+        return False
+    return True
+
+
+class BM25Index:
+    """Okapi BM25 over (point id, payload) documents"""
+
+    def __init__(self, documents=(), k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.payloads = []
+        self.lengths = []
+        self.postings = defaultdict(list)
+        for point_id, payload in documents:
+            self.add(point_id, payload)
+
+    def add(self, point_id, payload):
+        doc = len(self.ids)
+        tokens = tokenize(payload.get("content", ""))
+        self.ids.append(point_id)
+        self.payloads.append(payload)
+        self.lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings[term].append((doc, tf))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, top_k=4, query_filter=None):
+        """Return the top_k documents as ScoredPoints, best first"""
+        n_docs = len(self.ids)
+        if not n_docs:
+            return []
+        avg_length = sum(self.lengths) / n_docs or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / avg_length)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc, score in ranked:
+            if not matches_filter(self.payloads[doc], query_filter):
+                continue
+            results.append(models.ScoredPoint(id=self.ids[doc], version=0, score=score, payload=self.payloads[doc]))
+            if len(results) >= top_k:
+                break
+        return results
+
+
+class SparseIndex:
+    """BM25 index over the collection's content payloads, kept fresh from Qdrant"""
+
+    def __init__(self, qdrant, collection_name="Institutes", version_path=DIRECTORY_VERSION_PATH,
+                 page_size=256, ttl_seconds=600):
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.version_path = version_path
+        self.page_size = page_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._loaded_at = 0.0
+
+    def _fetch(self):
+        documents = []
+        offset = None
+        while True:
+            points, offset = self.qdrant.scroll(
+                collection_name=self.collection_name,
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            documents.extend((point.id, point.payload) for point in points if (point.payload or {}).get("content"))
+            if offset is None:
+                break
+        return BM25Index(documents)
+
+    def _is_stale(self):
+        if self._index is None:
+            return True
+        if self.ttl_seconds is not None and time.time() - self._loaded_at > self.ttl_seconds:
+            return True
+        return read_directory_version(self.version_path) != self._version
+
+    def refresh(self):
+        """Rebuild the index if ingestion changed the collection"""
+        with self._lock:
+            if self._is_stale():
+                version = read_directory_version(self.version_path)
+                self._index = self._fetch()
+                self._version = version
+                self._loaded_at = time.time()
+        return self._index
+
+    def search(self, query, top_k=4, query_filter=None):
+        index = self._index if self._index is not None else self.refresh()
+        return index.search(query, top_k, query_filter)
+
+
+def reciprocal_rank_fusion(rankings, top_k=4, k=60):
+    """Fuse ranked point lists: score = sum(1 / (k + rank)); the first list's point objects win"""
+    fused = {}
+    for ranking in rankings:
+        for rank, point in enumerate(ranking, start=1):
+            entry = fused.setdefault(point.id, [0.0, point])
+            entry[0] += 1.0 / (k + rank)
+    ordered = sorted(fused.values(), key=lambda entry: entry[0], reverse=True)[:top_k]
+    return [
+        models.ScoredPoint(id=point.id, version=point.version, score=score, payload=point.payload, vector=point.vector)
+        for score, point in ordered
+    ]
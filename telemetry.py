@@ -0,0 +1,189 @@
+# ---------------------------
+# Per-stage Tracing and Latency Histograms
+# ---------------------------
+# Spans time each pipeline stage (embedding, Qdrant, LLM, prompt assembly,
+# rendering, ingestion batches) into fixed-bucket histograms. The histograms
+# can be exported as Prometheus text and each span can be appended to a JSONL
+# trace. A disabled Telemetry hands out one shared no-op span, so the
+# instrumented code costs an attribute check and nothing else.
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, Prometheus style; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with count, sum and max"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class _NullSpan:
+    """Shared span handed out when telemetry is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Times one stage; attributes set on it go to the trace log"""
+
+    __slots__ = ("telemetry", "name", "attrs", "started_at")
+
+    def __init__(self, telemetry, name, attrs):
+        self.telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.attrs["error"] = exc_type.__name__
+        self.telemetry.observe(self.name, time.perf_counter() - self.started_at, **self.attrs)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Telemetry:
+    """Registry of per-stage histograms shared by every session of the process"""
+
+    def __init__(self, enabled=True, trace_path=None, prometheus_path=None, namespace="rag",
+                 buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.prometheus_path = prometheus_path
+        self.namespace = namespace
+        self.buckets = buckets
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._trace_lock = threading.Lock()
+
+    def span(self, name, **attrs):
+        """Context manager timing one stage (usable in sync and async code)"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attrs)
+
+    def observe(self, name, seconds, **attrs):
+        """Record a duration measured elsewhere"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        if self.trace_path:
+            self._trace({"ts": time.time(), "span": name, "ms": round(seconds * 1000, 3), **attrs})
+
+    def _trace(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._trace_lock:
+            with open(self.trace_path, "a") as f:
+                f.write(line)
+
+    def snapshot(self):
+        """{stage: {count, mean, p50, p95, p99, max}} in seconds"""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def prometheus_text(self):
+        """Histograms and process resource gauges in the Prometheus text exposition format.
+
+        The CPU and peak RSS gauges need the Unix-only resource module and are left out without it.
+        """
+        metric = f"{self.namespace}_stage_duration_seconds"
+        lines = [f"# HELP {metric} Duration of pipeline stages.", f"# TYPE {metric} histogram"]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {histogram.count}')
+
+        try:
+            import resource
+        except ImportError:  # Windows
+            return "\n".join(lines) + "\n"
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is KB on Linux and bytes on macOS
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        lines += [
+            f"# TYPE {self.namespace}_process_cpu_seconds_total counter",
+            f"{self.namespace}_process_cpu_seconds_total {usage.ru_utime + usage.ru_stime:.3f}",
+            f"# TYPE {self.namespace}_process_peak_rss_bytes gauge",
+            f"{self.namespace}_process_peak_rss_bytes {peak_rss}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        """Atomically write the Prometheus text to path (e.g. for node_exporter's textfile collector)"""
+        path = path or self.prometheus_path
+        if not self.enabled or not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+# Default for components built without a registry
+DISABLED = Telemetry(enabled=False)
@@ -0,0 +1,372 @@
+# ---------------------------
+# Memory-mapped Vector Snapshot
+# ---------------------------
+# Exports the collection to a float16 or int8 matrix (.npy, memory-mapped on
+# load) plus a JSONL payload sidecar with a row offset table, and answers
+# nearest-neighbour queries with one NumPy matrix product. Qdrant stays the
+# source of truth: LocalVectorIndex serves the hot read path from the newest
+# snapshot and re-exports in the background when the collection changes.
+#
+#   python vector_snapshot.py --dtype int8
+import argparse
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from qdrant_client import models
+
+from institute_directory import DIRECTORY_VERSION_PATH, read_directory_version
+from query_router import PAYLOAD_INDEX_FIELDS
+from sparse_index import matches_filter
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(".cache", "snapshots")
+SNAPSHOT_DTYPES = ("float16", "int8")
+CURRENT_FILE = "CURRENT"
+
+
+def collection_fingerprint(qdrant, collection_name, version_path=DIRECTORY_VERSION_PATH):
+    """What a snapshot must match to be fresh: point count, vector size and the ingestion version"""
+    info = qdrant.get_collection(collection_name)
+    vectors = info.config.params.vectors
+    return {
+        "points_count": info.points_count,
+        "dim": vectors.size,
+        "directory_version": read_directory_version(version_path),
+    }
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def export_snapshot(qdrant, collection_name="Institutes", root=DEFAULT_SNAPSHOT_DIR, dtype="float16",
+                    page_size=512, version_path=DIRECTORY_VERSION_PATH, keep=2):
+    """Write a new snapshot directory under root/collection_name and point CURRENT at it; returns its path"""
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"dtype must be one of {SNAPSHOT_DTYPES}")
+    fingerprint = collection_fingerprint(qdrant, collection_name, version_path)
+    base = os.path.join(root, collection_name)
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{dtype}"
+    tmp_dir = os.path.join(base, f".{name}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    vectors, offsets = [], []
+    with open(os.path.join(tmp_dir, "payloads.jsonl"), "wb") as sidecar:
+        offset = None
+        while True:
+            points, offset = qdrant.scroll(
+                collection_name=collection_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            for point in points:
+                vectors.append(point.vector)
+                offsets.append(sidecar.tell())
+                sidecar.write(json.dumps({"id": point.id, "payload": point.payload},
+                                         separators=(",", ":")).encode() + b"\n")
+            if offset is None:
+                break
+        offsets.append(sidecar.tell())
+
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), fingerprint["dim"]))
+    if dtype == "int8":
+        # Symmetric per-row quantization; scores are rescaled by the row's scale
+        scales = np.abs(matrix).max(axis=1)
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(tmp_dir, "scales.npy"), (scales / 127.0).astype(np.float32))
+        matrix = np.round(matrix / scales[:, None] * 127.0).astype(np.int8)
+    else:
+        matrix = matrix.astype(np.float16)
+    np.save(os.path.join(tmp_dir, "vectors.npy"), matrix)
+    np.save(os.path.join(tmp_dir, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"collection": collection_name, "dtype": dtype, "count": len(vectors),
+                   "exported_at": time.time(), **fingerprint}, f)
+
+    snapshot_dir = os.path.join(base, name)
+    os.replace(tmp_dir, snapshot_dir)
+    tmp_current = os.path.join(base, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_current, "w") as f:
+        f.write(name)
+    os.replace(tmp_current, os.path.join(base, CURRENT_FILE))
+
+    # Older snapshots may still be mapped by other processes; keep a few around
+    previous = sorted(d for d in os.listdir(base) if not d.startswith(".") and d != CURRENT_FILE and d != name)
+    for stale in previous[:max(0, len(previous) - (keep - 1))]:
+        shutil.rmtree(os.path.join(base, stale), ignore_errors=True)
+    return snapshot_dir
+
+
+def current_snapshot_dir(root, collection_name):
+    try:
+        with open(os.path.join(root, collection_name, CURRENT_FILE)) as f:
+            return os.path.join(root, collection_name, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+class VectorSnapshot:
+    """A loaded snapshot: memory-mapped matrix, payload sidecar and top-k search.
+
+    By default scores are computed from the mapped float16/int8 file in blocks
+    of block_rows, so the matrix stays in the page cache at its compact size.
+    resident=True keeps a float32 copy in memory instead (2-4x the file), which
+    makes each query a single BLAS matrix-vector product.
+    """
+
+    def __init__(self, path, resident=False, block_rows=8192):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = None
+        if self.meta["dtype"] == "int8":
+            self.scales = np.load(os.path.join(path, "scales.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.block_rows = block_rows
+        self._resident = self._dequantize(0, len(self.vectors)) if resident else None
+
+        self._sidecar_file = open(os.path.join(path, "payloads.jsonl"), "rb")
+        self._sidecar = mmap.mmap(self._sidecar_file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+        # Keyword columns for vectorized filtering with the router's payload filters
+        self._columns = {key: [] for key in PAYLOAD_INDEX_FIELDS}
+        self._ids = []
+        for row in range(len(self)):
+            record = self._record(row)
+            self._ids.append(record["id"])
+            for key, column in self._columns.items():
+                column.append((record["payload"] or {}).get(key))
+        self._columns = {key: np.asarray(column, dtype=object) for key, column in self._columns.items()}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def fingerprint(self):
+        return {key: self.meta[key] for key in ("points_count", "dim", "directory_version")}
+
+    def _dequantize(self, start, stop):
+        block = np.asarray(self.vectors[start:stop], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:stop, None]
+        return block
+
+    def _record(self, row):
+        return json.loads(self._sidecar[self.offsets[row]:self.offsets[row + 1]])
+
+    def _condition_mask(self, condition):
+        column = self._columns.get(condition.key)
+        match = condition.match
+        if column is None or not isinstance(match, (models.MatchAny, models.MatchValue)):
+            return None
+        values = match.any if isinstance(match, models.MatchAny) else [match.value]
+        return np.isin(column, np.asarray(values, dtype=object))
+
+    def filter_mask(self, query_filter):
+        """Boolean row mask for a payload filter, evaluated on the keyword columns"""
+        mask = np.ones(len(self), dtype=bool)
+        if query_filter is None:
+            return mask
+        fallback = False
+        for group, combine in ((query_filter.must, "all"), (query_filter.must_not, "none"),
+                               (query_filter.should, "any")):
+            if not group:
+                continue
+            masks = [self._condition_mask(c) for c in group]
+            if any(m is None for m in masks):
+                fallback = True
+                break
+            stacked = np.vstack(masks)
+            if combine == "all":
+                mask &= stacked.all(axis=0)
+            elif combine == "none":
+                mask &= ~stacked.any(axis=0)
+            else:
+                mask &= stacked.any(axis=0)
+        if fallback:
+            # Conditions on other fields: evaluate row by row like the sparse index
+            mask = np.fromiter((matches_filter(self._record(row)["payload"] or {}, query_filter)
+                                for row in range(len(self))), dtype=bool, count=len(self))
+        return mask
+
+    def scores(self, queries):
+        """Cosine scores of normalized query rows against every snapshot row"""
+        if self._resident is not None:
+            return queries @ self._resident.T
+        parts = [queries @ self._dequantize(start, start + self.block_rows).T
+                 for start in range(0, len(self), self.block_rows)]
+        return np.hstack(parts) if parts else np.zeros((len(queries), 0), dtype=np.float32)
+
+    def search_batch(self, query_vectors, top_k=4, query_filter=None, with_vectors=False):
+        """Top-k ScoredPoints for each query vector; with_vectors adds the (normalized) snapshot vectors"""
+        queries = _normalize(np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1))
+        if not len(self):
+            return [[] for _ in query_vectors]
+        scores = self.scores(queries)
+        if query_filter is not None:
+            scores[:, ~self.filter_mask(query_filter)] = -np.inf
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-row_scores[candidates], kind="stable")]
+            hits = []
+            for row in ranked:
+                if row_scores[row] == -np.inf:
+                    break
+                record = self._record(row)
+                vector = self._dequantize(row, row + 1)[0].tolist() if with_vectors else None
+                hits.append(models.ScoredPoint(id=record["id"], version=0, score=float(row_scores[row]),
+                                               payload=record["payload"], vector=vector))
+            results.append(hits)
+        return results
+
+    def search(self, query_vector, top_k=4, query_filter=None, with_vectors=False):
+        return self.search_batch([query_vector], top_k, query_filter, with_vectors)[0]
+
+    def close(self):
+        if isinstance(self._sidecar, mmap.mmap):
+            self._sidecar.close()
+        self._sidecar_file.close()
+
+
+class LocalVectorIndex:
+    """Serves searches from the newest local snapshot and keeps it in step with the collection.
+
+    Freshness is checked at most every check_interval seconds (plus on every
+    ingestion version bump) in a background thread, so searches never wait on
+    the network. search() returns None while no fresh snapshot is loaded; the
+    caller then queries Qdrant. A replaced snapshot is closed once the searches
+    still reading it finish.
+    """
+
+    def __init__(self, qdrant, collection_name="Institutes", root=DEFAULT_SNAPSHOT_DIR, dtype="float16",
+                 version_path=DIRECTORY_VERSION_PATH, check_interval=60, resident=False):
+        if dtype not in SNAPSHOT_DTYPES:
+            raise ValueError(f"dtype must be one of {SNAPSHOT_DTYPES}, got {dtype!r}")
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.root = root
+        self.dtype = dtype
+        self.version_path = version_path
+        self.check_interval = check_interval
+        self.resident = resident
+        self._lock = threading.Lock()
+        self._snapshot = None
+        # Searches in progress per snapshot, so a replaced one is closed only after its last reader
+        self._readers = {}
+        self._stale = True
+        self._checked_at = 0.0
+        self._refreshing = False
+        self.searches = 0
+        self.refreshes = 0
+        self.errors = 0
+
+        path = current_snapshot_dir(root, collection_name)
+        if path:
+            try:
+                snapshot = VectorSnapshot(path, resident=resident)
+                self._snapshot = snapshot
+                # Trust it until the first check; a changed ingestion version marks it stale right away
+                self._stale = snapshot.meta["directory_version"] != read_directory_version(version_path)
+            except (OSError, ValueError, KeyError):
+                self._snapshot = None
+
+    def _check(self):
+        """Compare the snapshot with the collection and re-export if it is stale (runs in the background)"""
+        try:
+            fingerprint = collection_fingerprint(self.qdrant, self.collection_name, self.version_path)
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.fingerprint != fingerprint or snapshot.meta["dtype"] != self.dtype:
+                with self._lock:
+                    self._stale = True
+                path = export_snapshot(self.qdrant, self.collection_name, self.root, self.dtype,
+                                       version_path=self.version_path)
+                snapshot = VectorSnapshot(path, resident=self.resident)
+                with self._lock:
+                    previous, self._snapshot = self._snapshot, snapshot
+                    self.refreshes += 1
+                    close_previous = previous is not None and previous not in self._readers
+                if close_previous:
+                    previous.close()
+            with self._lock:
+                self._stale = False
+        except Exception:
+            self.errors += 1
+        finally:
+            with self._lock:
+                self._checked_at = time.time()
+                self._refreshing = False
+
+    def maybe_refresh(self):
+        """Start a background freshness check if one is due"""
+        with self._lock:
+            if self._refreshing:
+                return
+            snapshot = self._snapshot
+            version_changed = (snapshot is not None and
+                               snapshot.meta["directory_version"] != read_directory_version(self.version_path))
+            if version_changed:
+                self._stale = True
+            due = self._stale or time.time() - self._checked_at > self.check_interval
+            if not due:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._check, name="vector-snapshot-refresh", daemon=True).start()
+
+    def search(self, query_vector, top_k=4, query_filter=None, with_vectors=False):
+        """Top-k ScoredPoints from the snapshot, or None when it is missing or stale"""
+        self.maybe_refresh()
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or self._stale:
+                return None
+            self._readers[snapshot] = self._readers.get(snapshot, 0) + 1
+            self.searches += 1
+        try:
+            return snapshot.search(query_vector, top_k, query_filter, with_vectors)
+        finally:
+            with self._lock:
+                self._readers[snapshot] -= 1
+                retired = not self._readers[snapshot] and snapshot is not self._snapshot
+                if not self._readers[snapshot]:
+                    del self._readers[snapshot]
+            if retired:
+                snapshot.close()
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "searches": self.searches,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "points": len(snapshot) if snapshot is not None else 0,
+            "dtype": snapshot.meta["dtype"] if snapshot is not None else None,
+            "fresh": snapshot is not None and not self._stale,
+        }
+
+
+if __name__ == "__main__":
+    from clients import ClientConfig, create_clients
+
+    parser = argparse.ArgumentParser(description="Snapshot a Qdrant collection for local retrieval")
+    parser.add_argument("--collection", default="Institutes")
+    parser.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default="float16")
+    parser.add_argument("--root", default=DEFAULT_SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    qdrant = create_clients(ClientConfig.from_env(), async_clients=False).qdrant
+    start = time.perf_counter()
+    path = export_snapshot(qdrant, args.collection, args.root, args.dtype)
+    snapshot = VectorSnapshot(path, resident=False)
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    print(f"✅ Snapshot of {len(snapshot)} points ({snapshot.meta['dtype']}, {size / 1024:.0f} KB) "
+          f"written to {path} in {time.perf_counter() - start:.2f}s")